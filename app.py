@@ -31,6 +31,10 @@ from utils.ping_thread import start_keep_alive_thread
 from utils.logger import setup_logger
 from routes.export import export_bp
 from services.scheduler_service import reminder_scheduler
+from services.word_plan_service import generate_word_plans
+from services.change_feed import prune as prune_change_feed
+from services.event_queue import event_queue
+from services.leader_election import background_leader
 
 # 嘗試導入新的日誌配置，如果找不到則使用原有的setup_logger
 try:
@@ -46,14 +50,11 @@ os.environ['TZ'] = 'Asia/Taipei'
 if hasattr(time, 'tzset'):
     time.tzset()  # 應用時區變更，只在 Unix/Linux 環境有效
 
-# 從 update_db.py 導入更新函數
-from db.update_db import update_database
-
 # 導入所有必要的模型用於表創建檢查
 try:
     from models import (
         User, CheckinRecord, Vocabulary, UserVocabulary,
-        ReminderSetting, GroupMessage
+        ReminderSetting, GroupMessage, Schema
     )
     print("成功導入所有模型類")
 except ImportError as e:
@@ -70,13 +71,6 @@ def check_dependencies():
     """檢查關鍵依賴項的可用性，並記錄狀態"""
     dependency_status = {}
     
-    # 檢查 pandas
-    try:
-        import pandas
-        dependency_status["pandas"] = f"可用 (版本: {pandas.__version__})"
-    except ImportError:
-        dependency_status["pandas"] = "不可用"
-    
     # 檢查 reportlab
     try:
         import reportlab
@@ -84,12 +78,12 @@ def check_dependencies():
     except ImportError:
         dependency_status["reportlab"] = "不可用"
     
-    # 檢查 openpyxl (Excel 支持)
+    # 檢查 xlsxwriter (Excel 支持)
     try:
-        import openpyxl
-        dependency_status["openpyxl"] = f"可用 (版本: {openpyxl.__version__})"
+        import xlsxwriter
+        dependency_status["xlsxwriter"] = f"可用 (版本: {xlsxwriter.__version__})"
     except ImportError:
-        dependency_status["openpyxl"] = "不可用"
+        dependency_status["xlsxwriter"] = "不可用"
     
     # 檢查 Google API
     try:
@@ -124,28 +118,17 @@ def create_app(config_class=Config):
     app.logger.info("檔案檢查完成")
     
     # --- 修改數據庫初始化流程 ---
-    # 1. 執行數據庫結構更新 (ALTER TABLE 等)
-    try:
-        update_database() # update_db.py 只應包含 ALTER TABLE 等遷移操作
-        app.logger.info("數據庫結構更新檢查完成")
-    except Exception as e:
-        app.logger.error(f"警告: 數據庫更新過程中出錯: {e}")
-        print(f"警告: 數據庫更新過程中出錯: {e}")
-        print("將繼續嘗試確保表結構存在")
-    
-    # 2. 確保所有基礎表都存在 (CREATE TABLE IF NOT EXISTS)
+    # 1. 執行版本化遷移 (db/migrations.py)，數據庫已是最新版本時只讀取 PRAGMA user_version
     try:
         print("確保所有數據庫表存在...")
         # 確保模型已被導入
-        if 'User' in globals():
-            User.create_table_if_not_exists()
-            CheckinRecord.create_table_if_not_exists()
-            Vocabulary.create_table_if_not_exists()
-            UserVocabulary.create_table_if_not_exists()
-            ReminderSetting.create_table_if_not_exists()
-            GroupMessage.create_table_if_not_exists()
-            # 添加其他表...
-            print("✅ 所有基本表結構已確認/創建")
+        if 'Schema' in globals():
+            schema_report = Schema.bootstrap()
+            if Schema.is_ready():
+                print(f"✅ 數據庫結構版本 v{schema_report['version']}，本次遷移: {schema_report['applied'] or '無'}")
+            else:
+                app.logger.error(f"❌ 數據庫結構遷移失敗: {schema_report.get('error')}")
+                print(f"❌ 數據庫結構遷移失敗: {schema_report.get('error')}")
         else:
             # 如果模型導入失敗，使用舊方法
             print("⚠️ 使用舊的init_db方法初始化數據庫")
@@ -161,7 +144,7 @@ def create_app(config_class=Config):
             app.logger.error(f"❌ 舊的初始化方法也失敗: {e2}")
             print(f"❌ 舊的初始化方法也失敗: {e2}")
     
-    # 3. 初始化詞彙數據 (包括填充默認詞彙)
+    # 2. 初始化詞彙數據 (包括填充默認詞彙)
     try:
         if 'init_vocab_db_with_data' in globals():
             init_vocab_db_with_data() # 這個函數負責創建表和填充數據
@@ -206,8 +189,8 @@ def create_app(config_class=Config):
     def ping():
         return {"status": "alive", "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, 200
     
-    # 初始化提醒系統
-    reminder_scheduler.start()
+    # 啟動 webhook 事件處理線程
+    event_queue.start()
     
     # 調試端點
     @app.route('/debug-error')
@@ -280,9 +263,33 @@ def create_app(config_class=Config):
             "available_asia_timezones": [tz for tz in available_timezones if tz.startswith('Asia/')]
         }
     
-    # 啟動保活線程
-    if not app.debug:
-        start_keep_alive_thread(app.config['APP_URL'], app.config['KEEP_ALIVE_INTERVAL'])
+    # 初始化提醒系統與保活線程
+    # 多個工作進程時通過 leader_lease 租約選出一個進程運行，其餘進程只處理請求
+    keep_alive_stop = []
+    
+    # 每晚預先生成次日的詞彙計劃（隨排程線程只在領導者進程運行）
+    reminder_scheduler.add_daily_job('word_plan', app.config['WORD_PLAN_TIME'], generate_word_plans)
+    # 每小時清理超過保留天數的打卡記錄變更日誌
+    reminder_scheduler.add_periodic_task('change_feed_prune', prune_change_feed)
+    
+    def start_background_tasks():
+        reminder_scheduler.start()
+        if not app.debug:
+            keep_alive_stop.append(
+                start_keep_alive_thread(app.config['APP_URL'], app.config['KEEP_ALIVE_INTERVAL'])
+            )
+    
+    def stop_background_tasks():
+        reminder_scheduler.stop()
+        while keep_alive_stop:
+            keep_alive_stop.pop().set()
+    
+    if app.config['LEADER_ELECTION']:
+        background_leader.on_elected(start_background_tasks)
+        background_leader.on_demoted(stop_background_tasks)
+        background_leader.start()
+    else:
+        start_background_tasks()
     
     return app
 
@@ -32,5 +32,74 @@ class Config:
     # 保活配置
     KEEP_ALIVE_INTERVAL = int(os.environ.get("KEEP_ALIVE_INTERVAL", 300))  # 默認5分鐘
     
+    # Webhook 事件隊列配置
+    EVENT_WORKERS = int(os.environ.get("EVENT_WORKERS", 4))  # 處理線程數，0 表示同步處理
+    EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", 1000))  # 所有線程隊列的總容量
+    EVENT_DRAIN_TIMEOUT = float(os.environ.get("EVENT_DRAIN_TIMEOUT", 10))  # 關閉時等待隊列清空的秒數
+    
+    # LINE API 客戶端配置
+    LINE_API_MAX_RETRIES = int(os.environ.get("LINE_API_MAX_RETRIES", 3))
+    LINE_API_BACKOFF_BASE = float(os.environ.get("LINE_API_BACKOFF_BASE", 0.5))  # 首次重試等待秒數
+    LINE_API_BACKOFF_MAX = float(os.environ.get("LINE_API_BACKOFF_MAX", 10))  # 單次重試最長等待秒數
+    LINE_API_POOL_SIZE = int(os.environ.get("LINE_API_POOL_SIZE", 10))  # 每個主機的連接池大小
+    
+    # LINE 用戶資料緩存配置
+    PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 1000))  # 內存中最多緩存的用戶數
+    PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 86400))  # 超過此秒數後在後台刷新
+    
+    # 出勤統計配置（修改後需重新回填 daily_attendance）
+    WORK_START_TIME = os.environ.get("WORK_START_TIME", "09:00:00")  # 上班打卡晚於此時間視為遲到
+    WORK_END_TIME = os.environ.get("WORK_END_TIME", "18:00:00")  # 下班打卡不早於此時間視為加班
+    
+    # 匯出配置
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 500))  # 流式匯出每批從數據庫讀取的行數
+    EXPORT_JSON_MAX_ROWS = int(os.environ.get("EXPORT_JSON_MAX_ROWS", 1000))  # /export-text 非流式 JSON 最多返回的行數
+    EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")  # 後台生成的匯出文件存放目錄
+    PDF_ROWS_PER_PAGE = int(os.environ.get("PDF_ROWS_PER_PAGE", 35))  # PDF 每頁表格的行數
+    PDF_FONT_PATH = os.environ.get("PDF_FONT_PATH")  # 可選的中文 TrueType 字體，未設置時使用內建 CID 字體
+    EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))  # 後台匯出任務的線程數
+    EXPORT_QUEUE_SIZE = int(os.environ.get("EXPORT_QUEUE_SIZE", 100))  # 排隊中的匯出任務上限
+    EXPORT_ARTIFACT_TTL = int(os.environ.get("EXPORT_ARTIFACT_TTL", 7 * 86400))  # 匯出文件緩存保留秒數
+    EXPORT_JOB_STALE_SECONDS = int(os.environ.get("EXPORT_JOB_STALE_SECONDS", 600))  # 匯出任務心跳超過此秒數視為執行進程已退出
+    
+    # Google Sheets 匯出配置
+    GOOGLE_CREDENTIALS_FILE = os.environ.get("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+    SHEETS_BATCH_ROWS = int(os.environ.get("SHEETS_BATCH_ROWS", 5000))  # 每次 batchUpdate 最多寫入的行數
+    SHEETS_MAX_PAYLOAD_BYTES = int(os.environ.get("SHEETS_MAX_PAYLOAD_BYTES", 2 * 1024 * 1024))  # 每次請求的數據大小上限
+    
+    # 變更流配置 (/api/changes)
+    CHANGE_FEED_LIMIT = int(os.environ.get("CHANGE_FEED_LIMIT", 1000))  # 未指定 limit 時每次返回的變更數
+    CHANGE_FEED_MAX_LIMIT = int(os.environ.get("CHANGE_FEED_MAX_LIMIT", 10000))  # 單次請求的變更數上限
+    CHANGE_FEED_RETENTION_DAYS = int(os.environ.get("CHANGE_FEED_RETENTION_DAYS", 30))  # 變更日誌保留天數
+    
+    # 詞彙索引配置
+    WORD_PLAN_TIME = os.environ.get("WORD_PLAN_TIME", "23:30")  # 每晚預先生成次日詞彙計劃的時間
+    WORD_PLAN_ACTIVE_DAYS = int(os.environ.get("WORD_PLAN_ACTIVE_DAYS", 30))  # 最近多少天內打過卡或學過詞彙的用戶會預先分配
+    VOCAB_IMPORT_CHUNK_SIZE = int(os.environ.get("VOCAB_IMPORT_CHUNK_SIZE", 1000))  # 批量匯入詞彙時每次 executemany 的行數
+    VOCAB_INDEX_TTL = int(os.environ.get("VOCAB_INDEX_TTL", 300))  # 進程內詞彙索引的最長有效秒數（其他進程新增的詞彙在此時間內生效）
+    
+    # 數據庫備份配置
+    BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+    BACKUP_PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", 256))  # 在線備份每步複製的頁數
+    BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP", 0.005))  # 每複製一步後休眠的秒數（在 progress 回調中讓出，0 表示不休眠）
+    BACKUP_COMPRESS = os.environ.get("BACKUP_COMPRESS", "False").lower() == "true"  # 是否 gzip 壓縮備份
+    BACKUP_KEEP_LAST = int(os.environ.get("BACKUP_KEEP_LAST", 5))  # 保留最新的備份數
+    BACKUP_KEEP_DAILY = int(os.environ.get("BACKUP_KEEP_DAILY", 7))  # 另外保留最近幾天每天最新的一個備份
+    
+    # 提醒發送配置
+    REMINDER_SEND_WORKERS = int(os.environ.get("REMINDER_SEND_WORKERS", 8))  # 併發發送請求數
+    # 提醒中是否包含用戶姓名（默認包含，每人一條 push）；設為 false 時相同內容合併為 multicast
+    REMINDER_PERSONALIZED = os.environ.get("REMINDER_PERSONALIZED", "True").lower() == "true"
+    
+    # 提醒排程配置
+    REMINDER_CATCHUP_MINUTES = int(os.environ.get("REMINDER_CATCHUP_MINUTES", 120))  # 啟動時補發已過時間不超過此分鐘數的提醒
+    REMINDER_RESYNC_INTERVAL = int(os.environ.get("REMINDER_RESYNC_INTERVAL", 3600))  # 定期從數據庫完整重建排程的秒數
+    REMINDER_CHANGE_POLL_INTERVAL = int(os.environ.get("REMINDER_CHANGE_POLL_INTERVAL", 30))  # 輪詢其他進程提醒設置變更的秒數
+    
+    # 後台任務領導者選舉：多個工作進程時只有一個運行提醒排程器與保活線程
+    LEADER_ELECTION = os.environ.get("LEADER_ELECTION", "True").lower() == "true"
+    LEADER_LEASE_TTL = int(os.environ.get("LEADER_LEASE_TTL", 30))  # 租約有效秒數，持有者死亡後最多這麼久由其他進程接手
+    LEADER_HEARTBEAT = int(os.environ.get("LEADER_HEARTBEAT", 10))  # 續約間隔秒數，須小於 LEADER_LEASE_TTL
+    
     # 時區設置 (默認為台灣時區)
     TIMEZONE = os.environ.get("TIMEZONE", "Asia/Taipei")  
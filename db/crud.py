@@ -4,6 +4,7 @@ from datetime import datetime
 from contextlib import contextmanager
 from config import Config
 from utils.timezone import get_date_string
+from db.migrations import migrate
 
 # 數據庫路徑
 DB_PATH = Config.DB_PATH
@@ -29,96 +30,15 @@ def get_db_connection(row_factory=sqlite3.Row):
             conn.close()
 
 def init_db():
-    """初始化資料庫，如果表不存在則創建"""
+    """初始化資料庫：執行版本化遷移 (db/migrations.py)，數據庫已是最新版本時不做任何修改"""
     with get_db_connection() as conn:
-        c = conn.cursor()
-        
-        # 檢查表是否已存在
-        c.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        existing_tables = [table[0] for table in c.fetchall()]
-        
-        # 建立打卡紀錄表格（如果不存在）
-        if 'checkin_records' not in existing_tables:
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS checkin_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    location TEXT,
-                    note TEXT,
-                    latitude REAL,
-                    longitude REAL,
-                    date TEXT NOT NULL,
-                    time TEXT NOT NULL,
-                    checkin_type TEXT DEFAULT '上班'
-                )
-            ''')
-            print("✅ 創建了 checkin_records 表")
-        
-        # 建立群組訊息表格（如果不存在）
-        if 'group_messages' not in existing_tables:
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS group_messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    user_name TEXT NOT NULL,
-                    message TEXT,
-                    timestamp TEXT NOT NULL
-                )
-            ''')
-            print("✅ 創建了 group_messages 表")
-        
-        # 建立用戶表（如果不存在）
-        if 'users' not in existing_tables:
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    display_name TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            print("✅ 創建了 users 表")
-        
-        # 建立提醒設置表（如果不存在）
-        if 'reminder_settings' not in existing_tables or 'reminder_logs' not in existing_tables:
-            create_reminder_tables()
-        
-        conn.commit()
+        applied = migrate(conn)
+        if applied:
+            print(f"✅ 數據庫已遷移，應用版本: {applied}")
 
 def create_reminder_tables():
-    """創建提醒相關的表格"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        
-        # 提醒設置表
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS reminder_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                enabled INTEGER DEFAULT 1,
-                morning_time TEXT DEFAULT '09:00',
-                evening_time TEXT DEFAULT '18:00',
-                weekend_enabled INTEGER DEFAULT 0,
-                holiday_enabled INTEGER DEFAULT 0,
-                created_at DATETIME,
-                updated_at DATETIME,
-                UNIQUE(user_id)
-            )
-        ''')
-        
-        # 提醒日誌表
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS reminder_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                reminder_type TEXT NOT NULL,
-                sent_at DATETIME,
-                status TEXT
-            )
-        ''')
-        
-        conn.commit()
+    """創建提醒相關的表格（由遷移統一管理，保留此函數以兼容舊調用）"""
+    init_db()
 
 def save_group_message(user_id, user_name, message, timestamp):
     """保存群組消息到數據庫"""
@@ -192,6 +112,9 @@ def insert_checkin_record(user_id, name, location, note, latitude, longitude, da
                 (user_id, name, location, note, latitude, longitude, date, time, checkin_type)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (user_id, name, location, note, latitude, longitude, date, time_str, checkin_type))
+            
+            from models import DailyAttendance
+            DailyAttendance.refresh_day(conn, user_id, date)
             conn.commit()
             return True
         except Exception as e:
@@ -240,6 +163,8 @@ def save_checkin(user_id, name, location, note=None, latitude=None, longitude=No
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (user_id, name, location, note, latitude, longitude, today, time_str, checkin_type))
 
+            from models import DailyAttendance
+            DailyAttendance.refresh_day(conn, user_id, today)
             conn.commit()
             return True, f"{checkin_type}打卡成功"
         except Exception as e:
@@ -265,12 +190,39 @@ def get_reminder_setting(user_id):
             ''', (user_id, now, now))
             conn.commit()
             
+            from models import ReminderSetting
+            ReminderSetting.notify_change(user_id)
+            
             c.execute('SELECT * FROM reminder_settings WHERE user_id = ?', (user_id,))
             row = c.fetchone()
         
         setting = dict(row) if row else None
         return setting
 
+# reminder_settings 的可更新欄位，以及舊版欄位名到現行欄位名的映射
+REMINDER_SETTING_FIELDS = [
+    'checkin_reminder', 'checkin_time', 'checkout_reminder', 'checkout_time',
+    'weekly_report', 'monthly_report', 'weekend_enabled', 'holiday_enabled'
+]
+LEGACY_REMINDER_FIELDS = {
+    'morning_time': ['checkin_time'],
+    'evening_time': ['checkout_time'],
+    'enabled': ['checkin_reminder', 'checkout_reminder'],
+}
+
+def normalize_reminder_settings(settings):
+    """過濾提醒設置中的可更新欄位，並將舊版欄位名 (morning_time 等) 轉換為現行欄位名"""
+    normalized = {}
+    for key, value in settings.items():
+        for field in LEGACY_REMINDER_FIELDS.get(key, [key]):
+            if field in REMINDER_SETTING_FIELDS:
+                normalized.setdefault(field, value)
+    # 明確給出的現行欄位優先於舊版欄位
+    for key in REMINDER_SETTING_FIELDS:
+        if key in settings:
+            normalized[key] = settings[key]
+    return normalized
+
 def update_reminder_setting(user_id, settings):
     """更新用戶的提醒設置"""
     with get_db_connection() as conn:
@@ -282,11 +234,9 @@ def update_reminder_setting(user_id, settings):
             fields = []
             values = []
             
-            for key, value in settings.items():
-                if key in ['enabled', 'morning_time', 'evening_time', 
-                          'weekend_enabled', 'holiday_enabled']:
-                    fields.append(f"{key} = ?")
-                    values.append(value)
+            for key, value in normalize_reminder_settings(settings).items():
+                fields.append(f"{key} = ?")
+                values.append(value)
             
             if not fields:
                 return False
@@ -303,11 +253,15 @@ def update_reminder_setting(user_id, settings):
             
             c.execute(query, values)
             conn.commit()
-            return True
         except Exception as e:
             conn.rollback()
             print(f"更新提醒設置時出錯: {str(e)}")
             return False
+    
+    # 通知提醒排程器重新計算該用戶的下次提醒時間
+    from models import ReminderSetting
+    ReminderSetting.notify_change(user_id)
+    return True
 
 @staticmethod # 或者創建 ReminderLog 模型
 def log_reminder(user_id, reminder_type):
@@ -322,52 +276,11 @@ def log_reminder(user_id, reminder_type):
         print(f"記錄提醒日誌時出錯: {e}")
         return False
 
-def get_users_needing_reminder(reminder_type):
-    """獲取需要發送提醒的用戶列表"""
-    with get_db_connection() as conn:
-        c = conn.cursor()
-        
-        now = datetime.now()
-        current_time = now.strftime('%H:%M')
-        today = now.strftime('%Y-%m-%d')
-        
-        # 檢查是否為週末
-        is_weekend = now.weekday() >= 5  # 5=Saturday, 6=Sunday
-        
-        # 獲取今天有特定類型提醒的用戶列表
-        time_field = 'morning_time' if reminder_type == '上班' else 'evening_time'
-        
-        c.execute(f'''
-            SELECT r.user_id, r.{time_field}, u.name, u.display_name
-            FROM reminder_settings r
-            JOIN users u ON r.user_id = u.user_id
-            WHERE r.enabled = 1 
-            AND r.{time_field} <= ?
-            AND (r.weekend_enabled = 1 OR ? = 0)
-        ''', (current_time, 1 if is_weekend else 0))
-        
-        potential_users = c.fetchall()
-        users_to_remind = []
-        
-        for user in potential_users:
-            # 檢查今天是否已經打卡
-            c.execute('''
-                SELECT * FROM checkin_records
-                WHERE user_id = ? AND date = ? AND checkin_type = ?
-            ''', (user['user_id'], today, reminder_type))
-            
-            if c.fetchone() is None:
-                # 檢查今天是否已經發送過提醒
-                c.execute('''
-                    SELECT * FROM reminder_logs
-                    WHERE user_id = ? AND reminder_type = ? AND DATE(sent_at) = ?
-                ''', (user['user_id'], reminder_type, today))
-                
-                if c.fetchone() is None:
-                    users_to_remind.append({
-                        'user_id': user['user_id'],
-                        'name': user['name'] or user['display_name'],
-                        'reminder_time': user[time_field]
-                    })
-        
-        return users_to_remind
+def get_users_needing_reminder(reminder_type, user_id=None):
+    """
+    獲取需要發送提醒的用戶列表
+    
+    由 ReminderSetting.get_users_needing_reminder 以單條反連接查詢完成
+    """
+    from models import ReminderSetting
+    return ReminderSetting.get_users_needing_reminder(reminder_type, user_id=user_id)
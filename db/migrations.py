@@ -0,0 +1,589 @@
+# db/migrations.py
+"""
+版本化數據庫遷移
+
+數據庫結構的唯一來源。每個遷移腳本有一個遞增的版本號，執行後寫入
+schema_version 表並同步到 PRAGMA user_version。啟動時若 user_version
+已是最新版本，只需讀取一次 PRAGMA 即可返回（快速路徑）。
+
+新增遷移時：在 MIGRATIONS 末尾追加 (版本號, 說明, 函數)，不要修改已發布的遷移。
+"""
+
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _table_columns(conn, table):
+    """返回表的欄位名集合（表不存在則為空集合）"""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table, column, definition, backfill_now=False):
+    """欄位不存在時添加；backfill_now 為 True 時把現有記錄的該欄位填為當前時間"""
+    if column in _table_columns(conn, table):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    if backfill_now:
+        conn.execute(f"UPDATE {table} SET {column} = DATETIME('now') WHERE {column} IS NULL")
+    logger.info(f"已為表 {table} 添加欄位 {column}")
+    return True
+
+
+# --- 遷移腳本 ---
+
+def _v1_base_tables(conn):
+    """創建所有基礎表，並為舊版本創建的 checkin_records 補齊欄位"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            display_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS checkin_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            checkin_type TEXT NOT NULL,
+            location TEXT,
+            latitude REAL,
+            longitude REAL,
+            ip TEXT,
+            device TEXT,
+            note TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS group_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            message TEXT,
+            timestamp TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            reminder_type TEXT NOT NULL,
+            sent_at DATETIME,
+            status TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vocabulary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            english_word TEXT UNIQUE NOT NULL,
+            chinese_translation TEXT NOT NULL,
+            difficulty INTEGER DEFAULT 2,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_vocabulary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            word_ids TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, date)
+        )
+    ''')
+
+    # 舊版 init_db / emergency_reset 創建的 checkin_records 缺少以下欄位
+    _add_column(conn, 'checkin_records', 'checkin_type', "TEXT DEFAULT '上班'")
+    _add_column(conn, 'checkin_records', 'ip', 'TEXT')
+    _add_column(conn, 'checkin_records', 'device', 'TEXT')
+    # ALTER TABLE 不支持 CURRENT_TIMESTAMP 默認值，先加 NULL 欄位再回填
+    _add_column(conn, 'checkin_records', 'created_at', 'DATETIME DEFAULT NULL', backfill_now=True)
+    _add_column(conn, 'checkin_records', 'updated_at', 'DATETIME DEFAULT NULL', backfill_now=True)
+
+
+REMINDER_SETTINGS_DDL = '''
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT UNIQUE NOT NULL,
+        checkin_reminder INTEGER DEFAULT 1,
+        checkin_time TEXT DEFAULT '09:00',
+        checkout_reminder INTEGER DEFAULT 1,
+        checkout_time TEXT DEFAULT '18:00',
+        weekly_report INTEGER DEFAULT 1,
+        monthly_report INTEGER DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        weekend_enabled INTEGER DEFAULT 0,
+        holiday_enabled INTEGER DEFAULT 0
+    )
+'''
+
+
+def _v2_unify_reminder_settings(conn):
+    """
+    統一 reminder_settings 結構
+
+    db/crud.init_db 創建的表使用 enabled/morning_time/evening_time，
+    ReminderSetting 模型使用 checkin_reminder/checkin_time/checkout_time。
+    統一為模型的欄位名，並保留 weekend_enabled/holiday_enabled。
+    """
+    existing = _table_columns(conn, 'reminder_settings')
+    if not existing:
+        conn.execute(REMINDER_SETTINGS_DDL.format(table='reminder_settings'))
+        return
+
+    def pick(*candidates, default):
+        """按順序選取舊表中存在的欄位，組成 COALESCE 表達式"""
+        present = [c for c in candidates if c in existing]
+        return f"COALESCE({', '.join(present + [default])})" if present else default
+
+    conn.execute(REMINDER_SETTINGS_DDL.format(table='reminder_settings_new'))
+    conn.execute(f'''
+        INSERT INTO reminder_settings_new (
+            id, user_id, checkin_reminder, checkin_time, checkout_reminder, checkout_time,
+            weekly_report, monthly_report, created_at, updated_at,
+            weekend_enabled, holiday_enabled
+        )
+        SELECT
+            id, user_id,
+            {pick('enabled', 'checkin_reminder', default='1')},
+            {pick('morning_time', 'checkin_time', default="'09:00'")},
+            {pick('enabled', 'checkout_reminder', default='1')},
+            {pick('evening_time', 'checkout_time', default="'18:00'")},
+            {pick('weekly_report', default='1')},
+            {pick('monthly_report', default='1')},
+            {pick('created_at', default='CURRENT_TIMESTAMP')},
+            {pick('updated_at', default='CURRENT_TIMESTAMP')},
+            {pick('weekend_enabled', default='0')},
+            {pick('holiday_enabled', default='0')}
+        FROM reminder_settings
+        GROUP BY user_id
+    ''')
+    conn.execute("DROP TABLE reminder_settings")
+    conn.execute("ALTER TABLE reminder_settings_new RENAME TO reminder_settings")
+
+
+def _v3_checkin_unique_index(conn):
+    """清理重複打卡記錄（保留最早一筆）並建立 (user_id, date, checkin_type) 唯一索引"""
+    removed = conn.execute('''
+        DELETE FROM checkin_records
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM checkin_records
+            GROUP BY user_id, date, checkin_type
+        )
+    ''').rowcount
+    if removed:
+        logger.warning(f"清理了 {removed} 筆重複的打卡記錄")
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_checkin_records_user_date_type
+        ON checkin_records (user_id, date, checkin_type)
+    ''')
+
+
+def _v4_checkin_covering_indexes(conn):
+    """
+    checkin_records 的查詢索引
+
+    - (user_id, date, time, checkin_type): 用戶按日期範圍查詢並按 date/time 排序（歷史、匯出），
+      同時覆蓋 SELECT checkin_type, time WHERE user_id = ? AND date = ?，無需回表
+    - (date, time): 按日期查詢當天所有記錄並按時間排序
+    """
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_checkin_records_user_date_time
+        ON checkin_records (user_id, date, time, checkin_type)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_checkin_records_date_time
+        ON checkin_records (date, time)
+    ''')
+    conn.execute("ANALYZE checkin_records")
+
+
+def _v5_user_profile_timestamp(conn):
+    """users 增加 profile_updated_at，記錄 display_name 最後一次從 LINE 獲取的時間"""
+    _add_column(conn, 'users', 'profile_updated_at', 'DATETIME DEFAULT NULL')
+
+
+def _v6_reminder_eligibility_indexes(conn):
+    """
+    提醒資格查詢的支持結構
+
+    - reminder_logs.sent_date：存儲發送日期，取代無法使用索引的 DATE(sent_at)
+    - reminder_logs (user_id, reminder_type, sent_date, status)：「今天是否已提醒」的反連接
+    - reminder_settings 上/下班的部分索引：只包含啟用提醒的用戶，按提醒時間排列
+    """
+    if _add_column(conn, 'reminder_logs', 'sent_date', 'TEXT'):
+        conn.execute("UPDATE reminder_logs SET sent_date = DATE(sent_at) WHERE sent_date IS NULL")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reminder_logs_user_type_date
+        ON reminder_logs (user_id, reminder_type, sent_date, status)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reminder_settings_checkin
+        ON reminder_settings (checkin_time, user_id) WHERE checkin_reminder = 1
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reminder_settings_checkout
+        ON reminder_settings (checkout_time, user_id) WHERE checkout_reminder = 1
+    ''')
+
+
+def _v7_leader_lease(conn):
+    """後台任務的領導者租約：多個工作進程中只有持有租約的一個運行排程器與保活線程"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            acquired_at REAL NOT NULL
+        )
+    ''')
+
+
+def _v8_daily_attendance(conn):
+    """
+    每日出勤摘要表：每個用戶每天一行，打卡時在同一事務中更新
+
+    月度統計改為對 (user_id, date) 的範圍聚合；創建後立即從現有打卡記錄回填。
+    回填 SQL 固定在此，遲到/加班按默認的 09:00:00 / 18:00:00 計算，不隨之後的模型或配置改變；
+    使用其他上下班時間的部署可在遷移後調用 POST /api/admin/attendance/backfill 重建。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            first_in TEXT,
+            last_out TEXT,
+            worked_minutes INTEGER,
+            is_late INTEGER NOT NULL DEFAULT 0,
+            is_overtime INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_attendance_user_date
+        ON daily_attendance (user_id, date)
+    ''')
+    rows = conn.execute('''
+        INSERT INTO daily_attendance
+            (user_id, date, first_in, last_out, worked_minutes, is_late, is_overtime, updated_at)
+        SELECT user_id, date, first_in, last_out,
+               CASE WHEN first_in IS NOT NULL AND last_out IS NOT NULL
+                    THEN CAST(ROUND((julianday('2000-01-01 ' || last_out)
+                                     - julianday('2000-01-01 ' || first_in)) * 1440) AS INTEGER)
+               END,
+               COALESCE(first_in > '09:00:00', 0),
+               COALESCE(last_out >= '18:00:00', 0),
+               CURRENT_TIMESTAMP
+        FROM (
+            SELECT user_id, date,
+                   MIN(CASE WHEN checkin_type = '上班' THEN time END) AS first_in,
+                   MAX(CASE WHEN checkin_type = '下班' THEN time END) AS last_out
+            FROM checkin_records
+            GROUP BY user_id, date
+        ) WHERE true
+        ON CONFLICT(user_id, date) DO UPDATE SET
+            first_in = excluded.first_in,
+            last_out = excluded.last_out,
+            worked_minutes = excluded.worked_minutes,
+            is_late = excluded.is_late,
+            is_overtime = excluded.is_overtime,
+            updated_at = excluded.updated_at
+    ''').rowcount
+    logger.info(f"已回填 {rows} 行每日出勤摘要")
+
+
+def _v9_export_jobs(conn):
+    """後台匯出任務：排隊、進度與生成的文件（按內容地址緩存）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            requested_by TEXT NOT NULL,
+            format TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total INTEGER,
+            processed INTEGER NOT NULL DEFAULT 0,
+            cache_key TEXT,
+            artifact TEXT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs (status, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_requested_by ON export_jobs (requested_by, created_at)")
+
+
+def _v10_sheets_sync(conn):
+    """Google Sheets 同步狀態：每個表格已寫入的最大打卡記錄 id，用於增量追加"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sheets_sync (
+            spreadsheet_id TEXT PRIMARY KEY,
+            sheet_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            date_from TEXT,
+            date_to TEXT,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            synced_at DATETIME
+        )
+    ''')
+
+
+def _v11_checkin_change_log(conn):
+    """
+    checkin_records 變更日誌
+
+    觸發器把每次插入、更新與刪除寫入 checkin_changes，seq 單調遞增作為增量同步的游標，
+    所有寫入路徑（包括直接使用 sqlite3 的舊代碼）都會被記錄。現有記錄按 id 順序回填為 upsert。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS checkin_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_checkin_changes_user_seq ON checkin_changes (user_id, seq)")
+    conn.execute('''
+        INSERT INTO checkin_changes (record_id, user_id, op, changed_at)
+        SELECT id, user_id, 'upsert', COALESCE(updated_at, created_at, CURRENT_TIMESTAMP)
+        FROM checkin_records ORDER BY id
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_checkin_records_insert AFTER INSERT ON checkin_records
+        BEGIN
+            INSERT INTO checkin_changes (record_id, user_id, op) VALUES (NEW.id, NEW.user_id, 'upsert');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_checkin_records_update AFTER UPDATE ON checkin_records
+        BEGIN
+            INSERT INTO checkin_changes (record_id, user_id, op) VALUES (NEW.id, NEW.user_id, 'upsert');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_checkin_records_delete AFTER DELETE ON checkin_records
+        BEGIN
+            INSERT INTO checkin_changes (record_id, user_id, op) VALUES (OLD.id, OLD.user_id, 'delete');
+        END
+    ''')
+
+
+def _v12_user_seen_words(conn):
+    """
+    用戶已見詞彙位圖：每個用戶一行 BLOB，分配詞彙時 O(1) 更新，不必再解析全部歷史記錄
+
+    創建後從 user_vocabulary 的歷史記錄回填。位圖格式（第 i 位表示詞彙ID i，
+    即第 i >> 3 個字節的第 i & 7 位）固定在此，不依賴 models.vocabulary.WordBitmap。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_seen_words (
+            user_id TEXT PRIMARY KEY,
+            bitmap BLOB NOT NULL,
+            seen_count INTEGER NOT NULL DEFAULT 0,
+            cycle INTEGER NOT NULL DEFAULT 1,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    bitmaps = {}
+    for user_id, word_ids in conn.execute("SELECT user_id, word_ids FROM user_vocabulary"):
+        bits = bitmaps.setdefault(user_id, bytearray())
+        for word_id in (word_ids or '').split(','):
+            word_id = word_id.strip()
+            if not word_id.isdigit():
+                continue
+            word_id = int(word_id)
+            index = word_id >> 3
+            if index >= len(bits):
+                bits.extend(bytes(index + 1 - len(bits)))
+            bits[index] |= 1 << (word_id & 7)
+    conn.executemany(
+        '''
+        INSERT INTO user_seen_words (user_id, bitmap, seen_count, cycle, updated_at)
+        VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            bitmap = excluded.bitmap,
+            seen_count = excluded.seen_count,
+            cycle = excluded.cycle,
+            updated_at = excluded.updated_at
+        ''',
+        [(user_id, bytes(bits), sum(bin(byte).count('1') for byte in bits)) for user_id, bits in bitmaps.items()]
+    )
+    logger.info(f"已為 {len(bitmaps)} 個用戶生成已見詞彙位圖")
+
+
+def _v13_user_vocabulary_items(conn):
+    """
+    用戶每日詞彙明細表：把 user_vocabulary.word_ids 的逗號分隔字符串規範化為每詞一行
+
+    讀取某日詞彙改為一次 JOIN 查詢；創建後從現有記錄回填（非數字的項略過，position 按有效項順序編號）。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_vocabulary_items (
+            user_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            word_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (user_id, date, position)
+        )
+    ''')
+    items = []
+    for user_id, date, word_ids in conn.execute("SELECT user_id, date, word_ids FROM user_vocabulary"):
+        word_ids = [word_id.strip() for word_id in (word_ids or '').split(',')]
+        items.extend(
+            (user_id, date, int(word_id), position)
+            for position, word_id in enumerate(word_id for word_id in word_ids if word_id.isdigit())
+        )
+    conn.executemany(
+        "INSERT OR IGNORE INTO user_vocabulary_items (user_id, date, word_id, position) VALUES (?, ?, ?, ?)",
+        items
+    )
+    logger.info(f"已回填 {len(items)} 行用戶詞彙明細")
+
+
+def _v14_reminder_setting_change_log(conn):
+    """
+    reminder_settings 變更日誌
+
+    觸發器把每次插入、更新與刪除的 user_id 寫入 reminder_setting_changes。
+    提醒排程只在領導者進程運行，其他 gunicorn worker 處理的設置變更由領導者輪詢此表後重新排程，
+    所有寫入路徑（包括 db/crud 中直接使用 sqlite3 的舊代碼）都會被記錄。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_setting_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_settings_insert AFTER INSERT ON reminder_settings
+        BEGIN
+            INSERT INTO reminder_setting_changes (user_id) VALUES (NEW.user_id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_settings_update AFTER UPDATE ON reminder_settings
+        BEGIN
+            INSERT INTO reminder_setting_changes (user_id) VALUES (NEW.user_id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reminder_settings_delete AFTER DELETE ON reminder_settings
+        BEGIN
+            INSERT INTO reminder_setting_changes (user_id) VALUES (OLD.user_id);
+        END
+    ''')
+
+
+
+def _v15_export_job_claims(conn):
+    """
+    export_jobs 的執行者與心跳
+
+    多個 worker 進程通過條件更新 (status = 'queued') 原子地認領任務，只有認領成功的進程生成文件；
+    執行中的任務定期更新 heartbeat，只有心跳過期（執行的進程已退出）的任務才會重新排隊。
+    """
+    _add_column(conn, 'export_jobs', 'owner', 'TEXT')
+    _add_column(conn, 'export_jobs', 'heartbeat', 'DATETIME')
+
+
+
+def _v16_sheets_sync_cursor(conn):
+    """
+    sheets_sync 記錄已同步到的 checkin_changes 序號
+
+    同步改為按變更日誌更新、刪除與追加表格中的行；現有表格從 0 開始，
+    第一次同步會按記錄的當前狀態覆蓋一遍。
+    """
+    _add_column(conn, 'sheets_sync', 'last_seq', 'INTEGER NOT NULL DEFAULT 0')
+
+
+MIGRATIONS = [
+    (1, "基礎表結構", _v1_base_tables),
+    (2, "統一 reminder_settings 欄位", _v2_unify_reminder_settings),
+    (3, "checkin_records 唯一索引", _v3_checkin_unique_index),
+    (4, "checkin_records 覆蓋索引", _v4_checkin_covering_indexes),
+    (5, "users 資料更新時間", _v5_user_profile_timestamp),
+    (6, "提醒資格查詢索引", _v6_reminder_eligibility_indexes),
+    (7, "領導者租約", _v7_leader_lease),
+    (8, "每日出勤摘要", _v8_daily_attendance),
+    (9, "匯出任務", _v9_export_jobs),
+    (10, "Google Sheets 同步狀態", _v10_sheets_sync),
+    (11, "打卡記錄變更日誌", _v11_checkin_change_log),
+    (12, "用戶已見詞彙位圖", _v12_user_seen_words),
+    (13, "用戶每日詞彙明細", _v13_user_vocabulary_items),
+    (14, "提醒設置變更日誌", _v14_reminder_setting_change_log),
+    (15, "匯出任務認領與心跳", _v15_export_job_claims),
+    (16, "Google Sheets 同步游標", _v16_sheets_sync_cursor),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """讀取數據庫當前的結構版本 (PRAGMA user_version)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """
+    將數據庫遷移到目標版本（默認最新）
+
+    快速路徑：user_version 已是目標版本時只讀一次 PRAGMA 並返回。
+    否則在 BEGIN IMMEDIATE 事務中重新讀取版本（防止多個進程同時遷移），
+    依次執行尚未應用的遷移。任一遷移失敗則整體回滾。
+
+    Args:
+        conn: sqlite3 連接，調用時不能處於事務中
+        target: 目標版本，默認為 LATEST_VERSION
+
+    Returns:
+        list: 本次應用的版本號列表
+    """
+    target = LATEST_VERSION if target is None else target
+    if get_version(conn) >= target:
+        return []
+
+    applied = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        ''')
+        current = get_version(conn)
+        for version, description, func in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+            logger.info(f"執行數據庫遷移 v{version}: {description}")
+            func(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            applied.append(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if applied:
+        logger.info(f"數據庫已遷移到 v{applied[-1]}")
+    return applied
@@ -2,6 +2,7 @@
 import sqlite3
 import os
 from config import Config
+from db.migrations import migrate, get_version
 
 def update_database():
     """檢查並更新數據庫結構，保留現有數據"""
@@ -29,73 +30,17 @@ def update_database():
             print(f"❌ 創建空數據庫文件 {db_path} 失敗: {e}")
         # 不再 return，讓後續的 Model 檢查來創建表
     
+    conn = None
     try:
-        # 連接到數據庫
+        # 結構修改統一由 db/migrations.py 的版本化遷移負責
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 獲取現有表列表
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        existing_tables = [table[0] for table in cursor.fetchall()]
-        print(f"現有表: {existing_tables}")
-        
-        # --- 只保留結構修改 (ALTER TABLE) 的邏輯 ---
-        # 檢查並更新 checkin_records 表
-        if 'checkin_records' in existing_tables:
-            print("檢查 checkin_records 表結構...")
-            cursor.execute("PRAGMA table_info(checkin_records)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            # 如果缺少 checkin_type 列，添加它
-            if 'checkin_type' not in columns:
-                print("添加 checkin_type 列到 checkin_records 表...")
-                try:
-                    cursor.execute("ALTER TABLE checkin_records ADD COLUMN checkin_type TEXT DEFAULT '上班'")
-                    print("✅ 已添加 checkin_type 列")
-                except sqlite3.OperationalError as alter_err:
-                    # 如果並發執行，可能另一進程已添加
-                    if "duplicate column name" in str(alter_err):
-                        print("⚠️ checkin_type 列已存在")
-                    else:
-                        print(f"❌ 添加 checkin_type 列失敗: {alter_err}")
-                        raise alter_err # 拋出以便上層知道
-            
-            # 添加 created_at 和 updated_at (如果不存在)
-            # SQLite在ALTER TABLE時不支持CURRENT_TIMESTAMP等非常量默認值
-            # 改為使用NULL默認值，再用單獨的UPDATE語句更新現有記錄
-            if 'created_at' not in columns:
-                print("添加 created_at 列到 checkin_records 表...")
-                try:
-                    cursor.execute("ALTER TABLE checkin_records ADD COLUMN created_at DATETIME DEFAULT NULL")
-                    # 更新現有記錄的created_at為當前時間
-                    cursor.execute("UPDATE checkin_records SET created_at = DATETIME('now') WHERE created_at IS NULL")
-                    print("✅ 已添加並更新 created_at 列")
-                except sqlite3.OperationalError as alter_err:
-                    print(f"⚠️ 添加 created_at 列時出錯: {alter_err}")
-            
-            if 'updated_at' not in columns:
-                print("添加 updated_at 列到 checkin_records 表...")
-                try:
-                    cursor.execute("ALTER TABLE checkin_records ADD COLUMN updated_at DATETIME DEFAULT NULL")
-                    # 更新現有記錄的updated_at為當前時間
-                    cursor.execute("UPDATE checkin_records SET updated_at = DATETIME('now') WHERE updated_at IS NULL")
-                    print("✅ 已添加並更新 updated_at 列")
-                except sqlite3.OperationalError as alter_err:
-                    print(f"⚠️ 添加 updated_at 列時出錯: {alter_err}")
-        
-        # --- 移除所有 CREATE TABLE 語句 ---
-        # if 'users' not in existing_tables: ... (刪除)
-        # if 'reminder_settings' not in existing_tables: ... (刪除)
-        # if 'reminder_logs' not in existing_tables: ... (刪除)
-        # if 'vocabulary' not in existing_tables: ... (刪除)
-        # if 'word_usage' not in existing_tables: ... (刪除)
-        # ---
-        
-        conn.commit()
-        print("✅ 數據庫結構*更新*檢查完成")
-        
-        conn.close()
-        print("數據庫連接已關閉 (來自 update_db)")
+        applied = migrate(conn)
+        version = get_version(conn)
+        if applied:
+            print(f"✅ 數據庫已遷移到 v{version}，本次應用: {applied}")
+        else:
+            print(f"✅ 數據庫結構已是最新版本 v{version}")
+        return {"version": version, "applied": applied}
         
     except Exception as e:
         print(f"❌ 更新數據庫結構時出錯: {e}")
@@ -103,3 +48,6 @@ def update_database():
         print(traceback.format_exc())
         # 考慮是否需要拋出異常，讓 app 啟動失敗
         # raise e
+    finally:
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,36 @@
+"""
+批量匯入詞彙
+
+用法:
+    python import_vocabulary.py words.csv [more.ndjson ...] [--format csv|json|ndjson] [--chunk-size 1000]
+
+已存在的單詞會更新翻譯與難度；格式按副檔名判斷（.csv / .json / .ndjson / .jsonl）。
+"""
+
+import argparse
+import sys
+from services.vocabulary_import import import_file, FORMATS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量匯入詞彙到 vocabulary 表")
+    parser.add_argument('files', nargs='+', help="詞彙文件路徑")
+    parser.add_argument('--format', choices=FORMATS, help="文件格式，默認按副檔名判斷")
+    parser.add_argument('--chunk-size', type=int, help="每次 executemany 的行數")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for path in args.files:
+        try:
+            result = import_file(path, args.format, args.chunk_size)
+        except (OSError, ValueError) as e:
+            print(f"❌ {path}: {e}")
+            failed = True
+            continue
+        print(f"✅ {path}: 共 {result['total']} 個，新增 {result['inserted']}，更新 {result['updated']}，"
+              f"未變 {result['unchanged']}，跳過 {result['skipped']}（{result['duration']} 秒）")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,30 @@
 
 from models.base import Database, Model
 from models.user import User
+from models.daily_attendance import DailyAttendance
 from models.checkin_record import CheckinRecord
-from models.vocabulary import Vocabulary, UserVocabulary
+from models.vocabulary import Vocabulary, UserVocabulary, UserVocabularyItem, UserSeenWords, WordBitmap
+from models.vocabulary_index import VocabularyIndex, vocabulary_index
 from models.reminder_setting import ReminderSetting
 from models.group_message import GroupMessage
+from models.export_job import ExportJob
+from models.schema import Schema
 
 __all__ = [
     'Database',
     'Model',
     'User',
     'CheckinRecord', 
+    'DailyAttendance',
     'Vocabulary',
     'UserVocabulary',
+    'UserVocabularyItem',
+    'UserSeenWords',
+    'WordBitmap',
+    'VocabularyIndex',
+    'vocabulary_index',
     'ReminderSetting',
-    'GroupMessage'
+    'GroupMessage',
+    'ExportJob',
+    'Schema'
 ] 
\ No newline at end of file
@@ -5,20 +5,122 @@
 import os
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
 
 class Database:
-    """數據庫連接管理類"""
+    """數據庫連接管理類
     
-    DB_PATH = os.environ.get('DATABASE_PATH', 'checkin.db')
+    每個線程持有一個長期連接（線程本地連接池），避免每條語句都重新 connect/close。
+    連接啟用 WAL 日誌模式與 synchronous=NORMAL，並使用 sqlite3 內建的預編譯語句快取。
+    """
+    
+    # 與 config.Config.DB_PATH 使用同一個數據庫文件（DATABASE_PATH 優先，兼容舊配置）
+    DB_PATH = os.environ.get('DATABASE_PATH', os.environ.get('DB_PATH', 'checkin.db'))
+    
+    # 連接池配置
+    BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))  # 毫秒
+    STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+    
+    _local = threading.local()
+    # 連接代數：reset_connections() 遞增後，各線程在下次使用時重新建立連接
+    _generation = 0
+    
+    @staticmethod
+    def _open_connection(db_path):
+        """打開並配置一個新的數據庫連接"""
+        conn = sqlite3.connect(
+            db_path,
+            timeout=Database.BUSY_TIMEOUT / 1000.0,
+            cached_statements=Database.STATEMENT_CACHE_SIZE
+        )
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(Database.BUSY_TIMEOUT)}")
+        except sqlite3.Error as e:
+            logging.warning(f"設置數據庫連接參數失敗: {e}")
+        return conn
     
     @staticmethod
     def get_connection():
-        """獲取數據庫連接"""
+        """獲取當前線程的數據庫連接（不存在或數據庫路徑變更時重新建立）"""
+        local = Database._local
+        conn = getattr(local, 'conn', None)
+        if (conn is not None and local.db_path == Database.DB_PATH
+                and local.generation == Database._generation):
+            return conn
+        
+        Database.close_connection()
         try:
-            return sqlite3.connect(Database.DB_PATH)
+            conn = Database._open_connection(Database.DB_PATH)
         except sqlite3.Error as e:
             logging.error(f"數據庫連接失敗: {e}")
             raise
+        local.conn = conn
+        local.db_path = Database.DB_PATH
+        local.generation = Database._generation
+        return conn
+    
+    @staticmethod
+    def close_connection():
+        """關閉當前線程持有的數據庫連接"""
+        local = Database._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.warning(f"關閉數據庫連接失敗: {e}")
+        local.conn = None
+        local.db_path = None
+        local.tx_depth = 0
+    
+    @staticmethod
+    def reset_connections():
+        """讓所有線程在下次查詢時重新建立連接（數據庫文件被替換後調用）"""
+        Database._generation += 1
+        Database.close_connection()
+    
+    @staticmethod
+    def in_transaction():
+        """當前線程是否處於 Database.transaction() 顯式事務中"""
+        return getattr(Database._local, 'tx_depth', 0) > 0
+    
+    @staticmethod
+    @contextmanager
+    def transaction(immediate=True):
+        """
+        在當前線程的連接上開啟一個顯式事務
+        
+        默認使用 BEGIN IMMEDIATE，在事務開始時就取得寫鎖，避免併發寫入時的升級死鎖。
+        嵌套調用會加入外層事務，由最外層負責提交或回滾。
+        事務內的 execute_query 不會自行提交。
+        
+        Yields:
+            sqlite3.Connection: 當前線程的數據庫連接
+        """
+        conn = Database.get_connection()
+        local = Database._local
+        
+        if Database.in_transaction():
+            local.tx_depth += 1
+            try:
+                yield conn
+            finally:
+                local.tx_depth -= 1
+            return
+        
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        local.tx_depth = 1
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            local.tx_depth = 0
 
     @staticmethod
     def execute_query(query, params=None, fetch_type=None):
@@ -33,9 +135,10 @@ class Database:
         Returns:
             結果, 或在INSERT操作時返回last_row_id
         """
-        conn = None
+        conn = Database.get_connection()
+        in_transaction = Database.in_transaction()
+        cursor = None
         try:
-            conn = Database.get_connection()
             cursor = conn.cursor()
             
             if params:
@@ -51,7 +154,8 @@ class Database:
                 else:
                     result = None
             else:
-                conn.commit()
+                if not in_transaction:
+                    conn.commit()
                 if query.strip().upper().startswith("INSERT"):
                     result = cursor.lastrowid
                 else:
@@ -59,13 +163,58 @@ class Database:
                     
             return result
         except sqlite3.Error as e:
-            if conn:
+            if not in_transaction:
                 conn.rollback()
             logging.error(f"數據庫查詢失敗: {query}, 錯誤: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            if cursor is not None:
+                cursor.close()
+
+    @staticmethod
+    def execute_many(query, seq_of_params):
+        """
+        以單個事務批量執行同一條語句 (executemany)
+        
+        Parameters:
+            query (str): SQL語句
+            seq_of_params (iterable): 每一行的參數
+        
+        Returns:
+            int: 受影響的行數
+        """
+        with Database.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany(query, seq_of_params)
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                logging.error(f"數據庫批量執行失敗: {query}, 錯誤: {e}")
+                raise
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def iter_query(query, params=None, chunk_size=500):
+        """
+        以 fetchmany 分批讀取查詢結果（生成器）
+
+        使用獨立連接，長時間的流式讀取不會佔用本線程的池化連接；
+        生成器結束或被關閉時連接隨之關閉。
+
+        Yields:
+            list: 每批最多 chunk_size 行
+        """
+        conn = Database._open_connection(Database.DB_PATH)
+        try:
+            cursor = conn.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
 
     @staticmethod
     def table_exists(table_name):
@@ -74,6 +223,13 @@ class Database:
         result = Database.execute_query(query, (table_name,), 'one')
         return result is not None
         
+    @staticmethod
+    def index_exists(index_name):
+        """檢查索引是否存在"""
+        query = "SELECT name FROM sqlite_master WHERE type='index' AND name=?"
+        result = Database.execute_query(query, (index_name,), 'one')
+        return result is not None
+    
     @staticmethod
     def create_table(table_name, columns_definition):
         """創建表"""
@@ -86,15 +242,32 @@ class Model:
     table_name = None
     columns = {}
     primary_key = "id"
+    # 索引定義: {索引名: {"columns": "col1, col2", "unique": bool}}
+    indexes = {}
+    # 進程內快取：本進程已確認過表結構則不再查詢 sqlite_master
+    _schema_checked = False
     
     @classmethod
     def create_table_if_not_exists(cls):
-        """如果表不存在，則創建表"""
+        """如果表不存在，則創建表，並確保索引存在"""
+        if cls._schema_checked:
+            return
         if cls.table_name and cls.columns:
             if not Database.table_exists(cls.table_name):
                 columns_def = ", ".join([f"{col} {datatype}" for col, datatype in cls.columns.items()])
                 Database.create_table(cls.table_name, columns_def)
                 logging.info(f"創建表 {cls.table_name}")
+            cls.create_indexes()
+        cls._schema_checked = True
+    
+    @classmethod
+    def create_indexes(cls):
+        """創建模型聲明的索引（已存在則跳過）"""
+        for index_name, definition in cls.indexes.items():
+            unique = "UNIQUE " if definition.get("unique") else ""
+            query = (f"CREATE {unique}INDEX IF NOT EXISTS {index_name} "
+                     f"ON {cls.table_name} ({definition['columns']})")
+            Database.execute_query(query)
     
     @classmethod
     def find_by_id(cls, id_value):
@@ -4,6 +4,7 @@
 
 from datetime import datetime
 from models.base import Model, Database
+from models.daily_attendance import DailyAttendance
 
 class CheckinRecord(Model):
     """打卡記錄模型類"""
@@ -25,6 +26,61 @@ class CheckinRecord(Model):
         "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP",
         "updated_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"
     }
+    # 由 db/migrations.py 創建，這裡的聲明供 Schema 與查詢計劃診斷核對
+    indexes = {
+        "idx_checkin_records_user_date_type": {"columns": "user_id, date, checkin_type", "unique": True},
+        "idx_checkin_records_user_date_time": {"columns": "user_id, date, time, checkin_type"},
+        "idx_checkin_records_date_time": {"columns": "date, time"}
+    }
+    
+    # checkin_once 的返回狀態
+    CHECKIN_OK = "ok"
+    CHECKIN_DUPLICATE = "duplicate"
+    CHECKIN_OUT_OF_ORDER = "out_of_order"
+    
+    @classmethod
+    def checkin_once(cls, data):
+        """
+        在單個 BEGIN IMMEDIATE 事務中寫入打卡記錄
+        
+        依靠 (user_id, date, checkin_type) 唯一索引與 INSERT ... ON CONFLICT DO NOTHING 去重，
+        下班打卡要求當天已有上班打卡，這個檢查與插入在同一條語句中完成。
+        
+        Returns:
+            str: CHECKIN_OK, CHECKIN_DUPLICATE 或 CHECKIN_OUT_OF_ORDER
+        """
+        required_fields = ['user_id', 'name', 'date', 'time', 'checkin_type']
+        for field in required_fields:
+            if field not in data:
+                raise ValueError(f"缺少必要字段: {field}")
+        
+        columns = ", ".join(data.keys())
+        placeholders = ", ".join(["?" for _ in data])
+        query = f"""
+            INSERT INTO {cls.table_name} ({columns})
+            SELECT {placeholders}
+            WHERE ? != '下班' OR EXISTS (
+                SELECT 1 FROM {cls.table_name}
+                WHERE user_id = ? AND date = ? AND checkin_type = '上班'
+            )
+            ON CONFLICT(user_id, date, checkin_type) DO NOTHING
+        """
+        params = tuple(data.values()) + (data['checkin_type'], data['user_id'], data['date'])
+        
+        with Database.transaction() as conn:
+            cursor = conn.execute(query, params)
+            if cursor.rowcount == 1:
+                DailyAttendance.refresh_day(conn, data['user_id'], data['date'])
+                return cls.CHECKIN_OK
+            
+            # 未插入：區分重複打卡與順序錯誤
+            cursor = conn.execute(
+                f"SELECT 1 FROM {cls.table_name} WHERE user_id = ? AND date = ? AND checkin_type = ? LIMIT 1",
+                (data['user_id'], data['date'], data['checkin_type'])
+            )
+            if cursor.fetchone() is not None:
+                return cls.CHECKIN_DUPLICATE
+            return cls.CHECKIN_OUT_OF_ORDER
     
     @classmethod
     def has_checkin_today(cls, user_id, checkin_type, date):
@@ -74,88 +130,31 @@ class CheckinRecord(Model):
             if field not in data:
                 raise ValueError(f"缺少必要字段: {field}")
         
-        # 檢查是否已有同類型的打卡記錄
-        existing_record = cls.get_user_record_by_date_type(
-            data['user_id'], data['date'], data['checkin_type']
-        )
+        # 同類型記錄已存在時更新，否則插入（依靠唯一索引）
+        update_data = {k: v for k, v in data.items() if k != 'user_id' and k != 'date' and k != 'checkin_type'}
+        update_data['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        columns = ", ".join(data.keys())
+        placeholders = ", ".join(["?" for _ in data])
+        set_clause = ", ".join([f"{col} = ?" for col in update_data.keys()])
+        query = f"""
+            INSERT INTO {cls.table_name} ({columns}) VALUES ({placeholders})
+            ON CONFLICT(user_id, date, checkin_type) DO UPDATE SET {set_clause}
+        """
+        params = tuple(data.values()) + tuple(update_data.values())
         
-        if existing_record:
-            # 更新現有記錄
-            update_data = {k: v for k, v in data.items() if k != 'user_id' and k != 'date' and k != 'checkin_type'}
-            update_data['updated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cls.update(existing_record['id'], update_data)
+        with Database.transaction() as conn:
+            conn.execute(query, params)
+            DailyAttendance.refresh_day(conn, data['user_id'], data['date'])
             return cls.get_user_record_by_date_type(data['user_id'], data['date'], data['checkin_type'])
-        else:
-            # 創建新記錄
-            record_id = cls.insert(data)
-            return cls.find_by_id(record_id)
     
     @classmethod
     def get_statistics(cls, user_id, month=None):
-        """獲取用戶打卡統計數據"""
-        if not month:
-            month = datetime.now().strftime("%Y-%m")
-            
-        start_date = f"{month}-01"
-        
-        # 計算下個月的第一天
-        year, month_num = map(int, month.split('-'))
-        if month_num == 12:
-            next_year = year + 1
-            next_month = 1
-        else:
-            next_year = year
-            next_month = month_num + 1
-            
-        end_date = f"{next_year}-{next_month:02d}-01"
-        
-        # 獲取該月的所有打卡記錄
-        query = f"""
-            SELECT date, checkin_type, time
-            FROM {cls.table_name}
-            WHERE user_id = ? AND date >= ? AND date < ?
-            ORDER BY date, time
-        """
-        
-        results = Database.execute_query(query, (user_id, start_date, end_date), 'all')
-        
-        # 處理統計數據
-        daily_records = {}
-        for record in results:
-            date, checkin_type, time = record
-            if date not in daily_records:
-                daily_records[date] = {"上班": None, "下班": None}
-            daily_records[date][checkin_type] = time
-        
-        # 計算統計指標
-        total_days = len(daily_records)
-        on_time_days = 0
-        late_days = 0
-        no_checkin_days = 0
-        overtime_days = 0
-        
-        for date, times in daily_records.items():
-            if times["上班"] and times["下班"]:
-                # 有上下班記錄，計算是否遲到和加班
-                if times["上班"] <= "09:00:00":
-                    on_time_days += 1
-                else:
-                    late_days += 1
-                
-                # 假設18:00為下班時間
-                if times["下班"] >= "18:00:00":
-                    overtime_days += 1
-            elif not times["上班"] or not times["下班"]:
-                no_checkin_days += 1
-        
-        return {
-            "total_days": total_days,
-            "on_time_days": on_time_days,
-            "late_days": late_days,
-            "no_checkin_days": no_checkin_days,
-            "overtime_days": overtime_days,
-            "daily_records": daily_records
-        }
+        """獲取用戶打卡統計數據（讀取 daily_attendance 摘要表）"""
+        start_date, end_date = DailyAttendance.month_range(month)
+        stats = DailyAttendance.get_month_summary(user_id, start_date, end_date)
+        stats["daily_records"] = DailyAttendance.get_daily_records(user_id, start_date, end_date)
+        return stats
     
     @staticmethod
     def _row_to_dict(row):
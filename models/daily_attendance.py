@@ -0,0 +1,167 @@
+"""
+每日出勤摘要模型，對應數據庫中的daily_attendance表
+
+每個用戶每天一行，由 checkin_records 彙總而來：首次上班、最後下班、工作分鐘數、
+遲到與加班標記。打卡寫入時在同一事務中調用 refresh_day 更新，
+月度統計只需對 (user_id, date) 索引做一次範圍聚合。
+"""
+
+from datetime import datetime
+from config import Config
+from models.base import Model, Database
+
+
+class DailyAttendance(Model):
+    """每日出勤摘要模型類"""
+
+    table_name = "daily_attendance"
+    columns = {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "user_id": "TEXT NOT NULL",
+        "date": "TEXT NOT NULL",
+        "first_in": "TEXT",
+        "last_out": "TEXT",
+        "worked_minutes": "INTEGER",
+        "is_late": "INTEGER NOT NULL DEFAULT 0",
+        "is_overtime": "INTEGER NOT NULL DEFAULT 0",
+        "updated_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"
+    }
+    # 由 db/migrations.py 創建
+    indexes = {
+        "idx_daily_attendance_user_date": {"columns": "user_id, date", "unique": True}
+    }
+
+    @classmethod
+    def _summary_sql(cls, where):
+        """從 checkin_records 彙總並 UPSERT 到摘要表的語句，where 篩選 checkin_records"""
+        return f"""
+            INSERT INTO {cls.table_name}
+                (user_id, date, first_in, last_out, worked_minutes, is_late, is_overtime, updated_at)
+            SELECT user_id, date, first_in, last_out,
+                   CASE WHEN first_in IS NOT NULL AND last_out IS NOT NULL
+                        THEN CAST(ROUND((julianday('2000-01-01 ' || last_out)
+                                         - julianday('2000-01-01 ' || first_in)) * 1440) AS INTEGER)
+                   END,
+                   COALESCE(first_in > ?, 0),
+                   COALESCE(last_out >= ?, 0),
+                   CURRENT_TIMESTAMP
+            FROM (
+                SELECT user_id, date,
+                       MIN(CASE WHEN checkin_type = '上班' THEN time END) AS first_in,
+                       MAX(CASE WHEN checkin_type = '下班' THEN time END) AS last_out
+                FROM checkin_records
+                WHERE {where}
+                GROUP BY user_id, date
+            ) WHERE true
+            ON CONFLICT(user_id, date) DO UPDATE SET
+                first_in = excluded.first_in,
+                last_out = excluded.last_out,
+                worked_minutes = excluded.worked_minutes,
+                is_late = excluded.is_late,
+                is_overtime = excluded.is_overtime,
+                updated_at = excluded.updated_at
+        """
+
+    @staticmethod
+    def _thresholds():
+        return (Config.WORK_START_TIME, Config.WORK_END_TIME)
+
+    @classmethod
+    def refresh_day(cls, conn, user_id, date):
+        """
+        重新計算單個用戶單天的摘要
+
+        必須在寫入 checkin_records 的同一連接、同一事務中調用，
+        使摘要與原始記錄一起提交或回滾。
+        """
+        cursor = conn.execute(
+            cls._summary_sql("user_id = ? AND date = ?"),
+            cls._thresholds() + (user_id, date)
+        )
+        if cursor.rowcount == 0:
+            # 當天已沒有打卡記錄
+            conn.execute(f"DELETE FROM {cls.table_name} WHERE user_id = ? AND date = ?", (user_id, date))
+
+    @classmethod
+    def backfill(cls, conn=None, start_date=None, end_date=None):
+        """
+        從 checkin_records 重建摘要（修改上下班時間配置後使用）
+
+        Args:
+            conn: 數據庫連接；為 None 時使用連接池並在獨立事務中執行
+            start_date, end_date: 只重建此日期範圍（含兩端），默認全部
+
+        Returns:
+            int: 寫入的摘要行數
+        """
+        conditions = ["1 = 1"]
+        params = []
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        where = " AND ".join(conditions)
+
+        def run(connection):
+            connection.execute(
+                f"DELETE FROM {cls.table_name} WHERE {where}", tuple(params)
+            )
+            cursor = connection.execute(cls._summary_sql(where), cls._thresholds() + tuple(params))
+            return cursor.rowcount
+
+        if conn is not None:
+            return run(conn)
+        with Database.transaction() as connection:
+            return run(connection)
+
+    @staticmethod
+    def month_range(month=None):
+        """把 'YYYY-MM' 轉為 (本月第一天, 下月第一天)，默認為當前月份"""
+        if not month:
+            month = datetime.now().strftime("%Y-%m")
+        year, month_num = map(int, month.split('-'))
+        if month_num == 12:
+            year, month_num = year + 1, 1
+        else:
+            month_num += 1
+        return f"{month}-01", f"{year}-{month_num:02d}-01"
+
+    @classmethod
+    def get_month_summary(cls, user_id, start_date, end_date):
+        """
+        單次範圍聚合獲取區間 [start_date, end_date) 的出勤統計
+
+        只有上下班都打卡的日子計入準時/遲到/加班，缺少任一打卡的日子計入未完成打卡。
+        """
+        query = f"""
+            SELECT COUNT(*),
+                   COALESCE(SUM(first_in IS NOT NULL AND last_out IS NOT NULL AND is_late = 0), 0),
+                   COALESCE(SUM(first_in IS NOT NULL AND last_out IS NOT NULL AND is_late = 1), 0),
+                   COALESCE(SUM(first_in IS NULL OR last_out IS NULL), 0),
+                   COALESCE(SUM(first_in IS NOT NULL AND last_out IS NOT NULL AND is_overtime = 1), 0),
+                   COALESCE(SUM(worked_minutes), 0)
+            FROM {cls.table_name}
+            WHERE user_id = ? AND date >= ? AND date < ?
+        """
+        row = Database.execute_query(query, (user_id, start_date, end_date), 'one')
+        return {
+            "total_days": row[0],
+            "on_time_days": row[1],
+            "late_days": row[2],
+            "no_checkin_days": row[3],
+            "overtime_days": row[4],
+            "worked_minutes": row[5]
+        }
+
+    @classmethod
+    def get_daily_records(cls, user_id, start_date, end_date):
+        """區間 [start_date, end_date) 內每天的首次上班與最後下班時間"""
+        query = f"""
+            SELECT date, first_in, last_out FROM {cls.table_name}
+            WHERE user_id = ? AND date >= ? AND date < ?
+            ORDER BY date
+        """
+        rows = Database.execute_query(query, (user_id, start_date, end_date), 'all') or []
+        return {date: {"上班": first_in, "下班": last_out} for date, first_in, last_out in rows}
@@ -0,0 +1,180 @@
+"""
+匯出任務模型，對應數據庫中的export_jobs表
+"""
+
+import json
+import uuid
+from datetime import datetime
+from models.base import Model, Database
+
+
+class ExportJob(Model):
+    """匯出任務模型類"""
+
+    table_name = "export_jobs"
+    columns = {
+        "id": "TEXT PRIMARY KEY",
+        "requested_by": "TEXT NOT NULL",
+        "format": "TEXT NOT NULL",
+        "params": "TEXT NOT NULL",
+        "status": "TEXT NOT NULL DEFAULT 'queued'",
+        "total": "INTEGER",
+        "processed": "INTEGER NOT NULL DEFAULT 0",
+        "cache_key": "TEXT",
+        "artifact": "TEXT",
+        "error": "TEXT",
+        "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP",
+        "started_at": "DATETIME",
+        "finished_at": "DATETIME",
+        "owner": "TEXT",
+        "heartbeat": "DATETIME"
+    }
+    # 由 db/migrations.py 創建
+    indexes = {
+        "idx_export_jobs_status": {"columns": "status, created_at"},
+        "idx_export_jobs_requested_by": {"columns": "requested_by, created_at"}
+    }
+
+    # 任務狀態
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    EMPTY = "empty"
+    FAILED = "failed"
+    FINISHED = (DONE, EMPTY, FAILED)
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def create(cls, requested_by, export_format, params, status=None, **fields):
+        """
+        創建任務
+
+        Args:
+            params: 匯出參數字典（user_id、日期範圍、分組方式等）
+            fields: 其他欄位，如已命中緩存時的 artifact、cache_key
+
+        Returns:
+            dict: 新任務
+        """
+        data = {
+            "id": uuid.uuid4().hex,
+            "requested_by": requested_by,
+            "format": export_format,
+            "params": json.dumps(params, ensure_ascii=False, sort_keys=True),
+            "status": status or cls.QUEUED,
+            "created_at": cls._now(),
+        }
+        if data["status"] in cls.FINISHED:
+            data["finished_at"] = data["created_at"]
+        data.update(fields)
+        cls.insert(data)
+        return cls.get(data["id"])
+
+    @classmethod
+    def get(cls, job_id):
+        """通過任務ID獲取任務，不存在時返回 None"""
+        row = cls.find_by_id(job_id)
+        return cls._row_to_dict(row) if row else None
+
+    @classmethod
+    def claim(cls, job_id, owner):
+        """
+        原子地認領排隊中的任務
+
+        多個進程可能同時處理同一任務（例如重新排隊後），只有把狀態從 queued 改為 running 的那個
+        進程認領成功。
+
+        Returns:
+            bool: 是否認領成功
+        """
+        now = cls._now()
+        updated = Database.execute_query(
+            f"""
+            UPDATE {cls.table_name}
+            SET status = ?, owner = ?, heartbeat = ?, started_at = ?, processed = 0, total = NULL
+            WHERE id = ? AND status = ?
+            """,
+            (cls.RUNNING, owner, now, now, job_id, cls.QUEUED)
+        )
+        return updated == 1
+
+    @classmethod
+    def _update_owned(cls, job_id, owner, data):
+        """只在任務仍由 owner 執行時更新，返回是否更新成功"""
+        set_clause = ", ".join(f"{column} = ?" for column in data)
+        updated = Database.execute_query(
+            f"UPDATE {cls.table_name} SET {set_clause} WHERE id = ? AND status = ? AND owner = ?",
+            tuple(data.values()) + (job_id, cls.RUNNING, owner)
+        )
+        return updated == 1
+
+    @classmethod
+    def set_total(cls, job_id, owner, total):
+        return cls._update_owned(job_id, owner, {"total": total, "heartbeat": cls._now()})
+
+    @classmethod
+    def set_progress(cls, job_id, owner, processed):
+        """更新進度並刷新心跳"""
+        return cls._update_owned(job_id, owner, {"processed": processed, "heartbeat": cls._now()})
+
+    @classmethod
+    def finish(cls, job_id, status, owner=None, **fields):
+        """
+        標記任務結束（done、empty 或 failed）
+
+        指定 owner 時只在任務仍由該進程執行時更新（心跳過期後已被其他進程重新認領則不覆蓋）。
+        """
+        data = {"status": status, "finished_at": cls._now(), **fields}
+        if owner:
+            return cls._update_owned(job_id, owner, data)
+        cls.update(job_id, data)
+        return True
+
+    @classmethod
+    def requeue_stale(cls, cutoff):
+        """
+        找出需要重新放入隊列的任務
+
+        心跳早於 cutoff 的執行中任務（執行的進程已退出）改回排隊狀態；排隊時間早於 cutoff 的任務
+        （放入隊列的進程可能已退出）刷新心跳。每個任務都以條件更新認領，
+        多個進程同時恢復時同一任務只會被其中一個重新排隊；之後仍由 claim 保證只生成一次。
+
+        Returns:
+            list: 本進程應重新放入隊列的任務
+        """
+        rows = cls.find_all(
+            "status IN (?, ?) AND COALESCE(heartbeat, started_at, created_at) < ?",
+            (cls.QUEUED, cls.RUNNING, cutoff), "created_at ASC"
+        ) or []
+        jobs = []
+        for job in (cls._row_to_dict(row) for row in rows):
+            updated = Database.execute_query(
+                f"""
+                UPDATE {cls.table_name} SET status = ?, owner = NULL, heartbeat = ?
+                WHERE id = ? AND status = ? AND COALESCE(heartbeat, started_at, created_at) < ?
+                """,
+                (cls.QUEUED, cls._now(), job["id"], job["status"], cutoff)
+            )
+            if updated == 1:
+                jobs.append(job)
+        return jobs
+
+    @classmethod
+    def delete_finished_before(cls, cutoff):
+        """刪除在 cutoff 之前結束的任務記錄"""
+        return Database.execute_query(
+            f"DELETE FROM {cls.table_name} WHERE status IN (?, ?, ?) AND finished_at < ?",
+            cls.FINISHED + (cutoff,)
+        )
+
+    @classmethod
+    def _row_to_dict(cls, row):
+        """將數據庫結果轉換為字典"""
+        if not row:
+            return None
+        job = {column: row[i] for i, column in enumerate(cls.columns) if i < len(row)}
+        job["params"] = json.loads(job["params"]) if job.get("params") else {}
+        return job
@@ -4,6 +4,7 @@
 
 from datetime import datetime
 from models.base import Model, Database
+from utils.timezone import get_current_time
 
 class ReminderSetting(Model):
     """提醒設置模型類，用於管理用戶的簽到提醒設定"""
@@ -19,9 +20,75 @@ class ReminderSetting(Model):
         "weekly_report": "BOOLEAN DEFAULT 1",
         "monthly_report": "BOOLEAN DEFAULT 1",
         "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP",
-        "updated_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"
+        "updated_at": "DATETIME DEFAULT CURRENT_TIMESTAMP",
+        "weekend_enabled": "BOOLEAN DEFAULT 0",
+        "holiday_enabled": "BOOLEAN DEFAULT 0"
     }
     
+    # 設置變更的監聽器（如提醒排程器），參數為 user_id
+    _change_listeners = []
+    
+    @classmethod
+    def add_change_listener(cls, listener):
+        """註冊設置變更監聽器"""
+        if listener not in cls._change_listeners:
+            cls._change_listeners.append(listener)
+    
+    @classmethod
+    def notify_change(cls, user_id):
+        """通知監聽器某個用戶的提醒設置已改變"""
+        for listener in list(cls._change_listeners):
+            try:
+                listener(user_id)
+            except Exception as e:
+                print(f"提醒設置變更通知失敗: {e}")
+    
+    @staticmethod
+    def latest_change_seq():
+        """reminder_setting_changes 中最新的序號（沒有變更時為 0）"""
+        row = Database.execute_query(
+            "SELECT COALESCE(MAX(seq), 0) FROM reminder_setting_changes", None, 'one'
+        )
+        return row[0] if row else 0
+    
+    @staticmethod
+    def get_changes_since(seq):
+        """
+        讀取序號大於 seq 的設置變更（觸發器寫入，包括其他進程的修改）
+        
+        Returns:
+            tuple: (最新序號, 變更過的 user_id 集合)
+        """
+        rows = Database.execute_query(
+            "SELECT seq, user_id FROM reminder_setting_changes WHERE seq > ? ORDER BY seq", (seq,), 'all'
+        ) or []
+        if not rows:
+            return seq, set()
+        return rows[-1][0], {row[1] for row in rows}
+    
+    @staticmethod
+    def prune_changes(upto_seq):
+        """刪除已處理的設置變更"""
+        Database.execute_query("DELETE FROM reminder_setting_changes WHERE seq <= ?", (upto_seq,))
+    
+    @classmethod
+    def get_schedule_rows(cls, user_id=None):
+        """
+        讀取排程所需的欄位
+        
+        Returns:
+            list: [(user_id, checkin_reminder, checkin_time, checkout_reminder, checkout_time, weekend_enabled), ...]
+        """
+        query = f"""
+            SELECT user_id, checkin_reminder, checkin_time, checkout_reminder, checkout_time, weekend_enabled
+            FROM {cls.table_name}
+        """
+        params = None
+        if user_id:
+            query += " WHERE user_id = ?"
+            params = (user_id,)
+        return Database.execute_query(query, params, 'all') or []
+    
     @classmethod
     def get_by_user_id(cls, user_id):
         """通過用戶ID獲取提醒設置"""
@@ -48,7 +115,8 @@ class ReminderSetting(Model):
         }
         
         setting_id = cls.insert(data)
-        return cls.find_by_id(setting_id)
+        cls.notify_change(user_id)
+        return cls._row_to_dict(cls.find_by_id(setting_id))
     
     @classmethod
     def update_settings(cls, user_id, settings):
@@ -62,7 +130,80 @@ class ReminderSetting(Model):
         # 更新設置
         settings['updated_at'] = 'CURRENT_TIMESTAMP'
         updated = cls.update(existing['id'], settings)
-        return cls.find_by_id(existing['id'])
+        cls.notify_change(user_id)
+        return cls._row_to_dict(cls.find_by_id(existing['id']))
+    
+    # 提醒類型對應的設置欄位
+    REMINDER_FIELDS = {
+        '上班': ('checkin_reminder', 'checkin_time'),
+        '下班': ('checkout_reminder', 'checkout_time'),
+    }
+    
+    @classmethod
+    def get_users_needing_reminder(cls, reminder_type, now=None, user_id=None, user_ids=None):
+        """
+        獲取現在應該收到提醒的用戶
+        
+        一條反連接查詢：啟用了該提醒、提醒時間已到、週末設置允許、
+        今天還沒有該類型打卡、今天還沒有成功發送過該提醒。
+        
+        reminder_type: '上班' 或 '下班'
+        now: 帶時區的當前時間，默認為 utils.timezone.get_current_time()
+        user_id: 只檢查指定用戶
+        user_ids: 只檢查這些用戶（排程器只傳入當前到期的用戶）
+        """
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            users = []
+            # 分批避免超過 SQLite 的參數數量上限
+            for start in range(0, len(user_ids), 500):
+                users.extend(cls._query_users_needing_reminder(
+                    reminder_type, now, user_ids[start:start + 500]
+                ))
+            return users
+        return cls._query_users_needing_reminder(reminder_type, now, [user_id] if user_id else None)
+    
+    @classmethod
+    def _query_users_needing_reminder(cls, reminder_type, now, user_ids):
+        enabled_field, time_field = cls.REMINDER_FIELDS[reminder_type]
+        now = now or get_current_time()
+        today = now.strftime('%Y-%m-%d')
+        is_weekend = 1 if now.weekday() >= 5 else 0
+        
+        conditions = [
+            f"rs.{enabled_field} = 1",
+            f"rs.{time_field} <= ?",
+            "(rs.weekend_enabled = 1 OR ? = 0)",
+        ]
+        params = [now.strftime('%H:%M'), is_weekend]
+        if user_ids:
+            conditions.append(f"rs.user_id IN ({', '.join('?' for _ in user_ids)})")
+            params.extend(user_ids)
+        
+        query = f"""
+            SELECT rs.user_id, COALESCE(u.name, u.display_name), rs.{time_field}
+            FROM {cls.table_name} rs
+            JOIN users u ON u.user_id = rs.user_id
+            WHERE {' AND '.join(conditions)}
+              AND NOT EXISTS (
+                  SELECT 1 FROM checkin_records cr
+                  WHERE cr.user_id = rs.user_id AND cr.date = ? AND cr.checkin_type = ?
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM reminder_logs rl
+                  WHERE rl.user_id = rs.user_id AND rl.reminder_type = ?
+                    AND rl.sent_date = ? AND rl.status = 'sent'
+              )
+        """
+        params += [today, reminder_type, reminder_type, today]
+        
+        results = Database.execute_query(query, tuple(params), 'all')
+        return [dict(zip(['user_id', 'name', 'reminder_time'], row)) for row in results] if results else []
+    
+    @classmethod
+    def is_user_eligible(cls, user_id, reminder_type, now=None):
+        """用戶現在是否應該收到該提醒"""
+        return bool(cls.get_users_needing_reminder(reminder_type, now=now, user_id=user_id))
     
     @classmethod
     def get_users_for_reminder(cls, reminder_type, reminder_time=None):
@@ -73,24 +214,24 @@ class ReminderSetting(Model):
         """
         time_field = f"{reminder_type.split('_')[0]}_time"
         
-        conditions = [f"{reminder_type} = 1"]
+        conditions = [f"rs.{reminder_type} = 1"]
         params = []
         
         if reminder_time:
-            conditions.append(f"{time_field} = ?")
+            conditions.append(f"rs.{time_field} = ?")
             params.append(reminder_time)
             
         where_clause = " AND ".join(conditions)
         
         query = f"""
-            SELECT rs.user_id, u.name, u.line_user_id, rs.{time_field} as reminder_time
+            SELECT rs.user_id, u.name, rs.{time_field} as reminder_time
             FROM {cls.table_name} rs
-            JOIN users u ON rs.user_id = u.id
-            WHERE {where_clause} AND u.is_active = 1
+            JOIN users u ON rs.user_id = u.user_id
+            WHERE {where_clause}
         """
         
         results = Database.execute_query(query, tuple(params), 'all')
-        return [dict(zip(['user_id', 'name', 'line_user_id', 'reminder_time'], row)) for row in results] if results else []
+        return [dict(zip(['user_id', 'name', 'reminder_time'], row)) for row in results] if results else []
     
     @classmethod
     def get_users_for_report(cls, report_type):
@@ -99,35 +240,40 @@ class ReminderSetting(Model):
         report_type: weekly_report, monthly_report
         """
         query = f"""
-            SELECT rs.user_id, u.name, u.line_user_id
+            SELECT rs.user_id, u.name
             FROM {cls.table_name} rs
-            JOIN users u ON rs.user_id = u.id
-            WHERE rs.{report_type} = 1 AND u.is_active = 1
+            JOIN users u ON rs.user_id = u.user_id
+            WHERE rs.{report_type} = 1
         """
         
         results = Database.execute_query(query, None, 'all')
-        return [dict(zip(['user_id', 'name', 'line_user_id'], row)) for row in results] if results else []
+        return [dict(zip(['user_id', 'name'], row)) for row in results] if results else []
     
     @staticmethod
-    def log_reminder(user_id, reminder_type):
+    def log_reminder(user_id, reminder_type, status='sent'):
         """記錄已發送的提醒"""
-        # 確認reminder_logs表存在
-        query = """
-            CREATE TABLE IF NOT EXISTS reminder_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                reminder_type TEXT NOT NULL,
-                sent_at DATETIME,
-                status TEXT
-            )
+        return ReminderSetting.log_reminders([(user_id, reminder_type, status)])
+    
+    @staticmethod
+    def log_reminders(entries):
         """
-        Database.execute_query(query)
+        在一個事務中批量記錄提醒
         
-        # 記錄提醒
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        insert_query = "INSERT INTO reminder_logs (user_id, reminder_type, sent_at, status) VALUES (?, ?, ?, ?)"
+        entries: [(user_id, reminder_type, status), ...]
+        """
+        now = get_current_time()
+        sent_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        sent_date = now.strftime('%Y-%m-%d')
+        insert_query = """
+            INSERT INTO reminder_logs (user_id, reminder_type, sent_at, sent_date, status)
+            VALUES (?, ?, ?, ?, ?)
+        """
         try:
-            Database.execute_query(insert_query, (user_id, reminder_type, now, 'sent'))
+            Database.execute_many(
+                insert_query,
+                [(user_id, reminder_type, sent_at, sent_date, status)
+                 for user_id, reminder_type, status in entries]
+            )
             return True
         except Exception as e:
             print(f"記錄提醒日誌時出錯: {e}")
@@ -142,13 +288,15 @@ class ReminderSetting(Model):
         columns = [
             'id', 'user_id', 'checkin_reminder', 'checkin_time',
             'checkout_reminder', 'checkout_time', 'weekly_report',
-            'monthly_report', 'created_at', 'updated_at'
+            'monthly_report', 'created_at', 'updated_at',
+            'weekend_enabled', 'holiday_enabled'
         ]
         
         result = {columns[i]: row[i] for i in range(len(columns)) if i < len(row)}
         
         # 將布爾值從整數轉換為布爾
-        bool_fields = ['checkin_reminder', 'checkout_reminder', 'weekly_report', 'monthly_report']
+        bool_fields = ['checkin_reminder', 'checkout_reminder', 'weekly_report', 'monthly_report',
+                       'weekend_enabled', 'holiday_enabled']
         for field in bool_fields:
             if field in result:
                 result[field] = bool(result[field])
@@ -0,0 +1,72 @@
+"""
+表結構註冊表：在進程啟動時通過版本化遷移 (db.migrations) 一次性確認所有模型的表結構，
+結果快取在進程內存中，熱路徑只需檢查一個標誌
+"""
+
+import logging
+import threading
+from models.base import Database, Model
+from db.migrations import migrate, get_version, LATEST_VERSION
+
+
+class Schema:
+    """模型表結構註冊表"""
+    
+    _ready = False
+    _attempted = False
+    _lock = threading.Lock()
+    report = {}
+    
+    @staticmethod
+    def models():
+        """返回所有聲明了表名和欄位的 Model 子類"""
+        found = []
+        pending = list(Model.__subclasses__())
+        while pending:
+            model = pending.pop(0)
+            if model.table_name and model.columns and model not in found:
+                found.append(model)
+            pending.extend(model.__subclasses__())
+        return found
+    
+    @staticmethod
+    def is_ready():
+        """表結構是否已在本進程中確認完成"""
+        return Schema._ready
+    
+    @staticmethod
+    def ensure_ready():
+        """熱路徑使用：本進程尚未做過結構檢查時才執行一次"""
+        if not Schema._attempted:
+            Schema.bootstrap()
+        return Schema._ready
+    
+    @staticmethod
+    def bootstrap(force=False):
+        """
+        執行版本化遷移並標記所有模型的表結構為已確認
+        
+        數據庫已是最新版本時只讀取一次 PRAGMA user_version。
+        
+        Returns:
+            dict: {"version": 當前版本, "applied": 本次應用的遷移版本列表}，失敗時包含 "error"
+        """
+        with Schema._lock:
+            if Schema._attempted and not force:
+                return Schema.report
+            
+            try:
+                conn = Database.get_connection()
+                applied = migrate(conn)
+                report = {"version": get_version(conn), "applied": applied}
+                for model in Schema.models():
+                    model._schema_checked = True
+                Schema._ready = True
+            except Exception as e:
+                logging.error(f"數據庫結構遷移失敗: {e}")
+                report = {"version": None, "applied": [], "error": str(e)}
+                Schema._ready = False
+            
+            Schema.report = report
+            Schema._attempted = True
+            return report
@@ -14,8 +14,8 @@ class User(Model):
         "user_id": "TEXT PRIMARY KEY",                # 使用user_id作為主鍵，而不是line_user_id
         "name": "TEXT NOT NULL",
         "display_name": "TEXT",                       # 匹配實際表結構
-        "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"
-        # 移除不存在的欄位
+        "created_at": "DATETIME DEFAULT CURRENT_TIMESTAMP",
+        "profile_updated_at": "DATETIME"             # display_name 最後一次從 LINE 獲取的時間
     }
     primary_key = "user_id"  # 覆蓋基類的primary_key設置
     
@@ -67,6 +67,42 @@ class User(Model):
             
             return cls.find_by_line_id(user_id)
     
+    @classmethod
+    def upsert(cls, user_id, name, display_name=None):
+        """以單條 INSERT ... ON CONFLICT 語句創建或更新用戶"""
+        query = f"""
+            INSERT INTO {cls.table_name} (user_id, name, display_name) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                name = excluded.name,
+                display_name = COALESCE(excluded.display_name, display_name)
+        """
+        Database.execute_query(query, (user_id, name, display_name))
+    
+    @classmethod
+    def get_profile(cls, user_id):
+        """讀取緩存的 LINE 資料，返回 (display_name, profile_updated_at)，用戶不存在時返回 None"""
+        query = f"SELECT display_name, profile_updated_at FROM {cls.table_name} WHERE user_id = ?"
+        result = Database.execute_query(query, (user_id,), 'one')
+        return (result[0], result[1]) if result else None
+    
+    @classmethod
+    def save_profile(cls, user_id, display_name):
+        """保存從 LINE 獲取的 display_name；新用戶同時以它作為 name"""
+        query = f"""
+            INSERT INTO {cls.table_name} (user_id, name, display_name, profile_updated_at)
+            VALUES (?, ?, ?, DATETIME('now'))
+            ON CONFLICT(user_id) DO UPDATE SET
+                display_name = excluded.display_name,
+                profile_updated_at = excluded.profile_updated_at
+        """
+        Database.execute_query(query, (user_id, display_name, display_name))
+    
+    @classmethod
+    def expire_profile(cls, user_id):
+        """標記緩存的 LINE 資料已過期，下次讀取時刷新"""
+        query = f"UPDATE {cls.table_name} SET profile_updated_at = NULL WHERE user_id = ?"
+        Database.execute_query(query, (user_id,))
+    
     @classmethod
     def get_active_users(cls):
         """獲取所有用戶"""
@@ -84,6 +120,6 @@ class User(Model):
             return None
         
         # 更新列名以匹配實際表結構
-        columns = ['user_id', 'name', 'display_name', 'created_at']
+        columns = ['user_id', 'name', 'display_name', 'created_at', 'profile_updated_at']
         
         return {columns[i]: row[i] for i in range(len(columns)) if i < len(row)} 
\ No newline at end of file
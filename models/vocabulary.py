@@ -1,10 +1,12 @@
 """
-詞彙模型，對應數據庫中的vocabulary和user_vocabulary表
+詞彙模型，對應數據庫中的vocabulary、user_vocabulary和user_vocabulary_items表
 """
 
 import random
 from datetime import datetime
+from itertools import islice
 from models.base import Model, Database
+from models.vocabulary_index import vocabulary_index
 
 # 預設詞彙列表，用於初始化詞彙表
 DEFAULT_VOCABULARY = [
@@ -59,22 +61,38 @@ class Vocabulary(Model):
         return cls._row_to_dict(result) if result else None
     
     @classmethod
-    def get_random_words(cls, count=3, difficulty=None):
-        """獲取隨機詞彙"""
-        conditions = None
-        params = None
-        
-        if difficulty:
-            conditions = "difficulty = ?"
-            params = (difficulty,)
-            
-        query = f"SELECT * FROM {cls.table_name}"
-        if conditions:
-            query += f" WHERE {conditions}"
-        query += f" ORDER BY RANDOM() LIMIT {count}"
+    def get_words_by_ids(cls, word_ids):
+        """
+        一次查詢獲取多個詞彙
         
-        results = Database.execute_query(query, params, 'all')
-        return [cls._row_to_dict(row) for row in results] if results else []
+        Returns:
+            list: 詞彙字典，順序與 word_ids 一致（不存在的ID被略過）
+        """
+        word_ids = [int(word_id) for word_id in word_ids]
+        if not word_ids:
+            return []
+        placeholders = ", ".join("?" for _ in word_ids)
+        query = f"SELECT * FROM {cls.table_name} WHERE id IN ({placeholders})"
+        rows = Database.execute_query(query, tuple(word_ids), 'all') or []
+        words = {row[0]: cls._row_to_dict(row) for row in rows}
+        return [words[word_id] for word_id in word_ids if word_id in words]
+    
+    @classmethod
+    def get_random_words(cls, count=3, difficulty=None, exclude=None):
+        """
+        獲取隨機詞彙
+        
+        從進程內的詞彙索引中抽取ID（不對整張表排序），再一次查詢取出詳情。
+        
+        Args:
+            exclude: 不應抽中的詞彙ID（支持 in 運算的容器）
+        """
+        word_ids = vocabulary_index.sample(count, difficulty, exclude)
+        words = cls.get_words_by_ids(word_ids)
+        if len(words) < len(word_ids):
+            # 索引中有已被刪除的詞彙，下次重新載入
+            vocabulary_index.invalidate()
+        return words
     
     @classmethod
     def add_word(cls, english, chinese, difficulty=2):
@@ -92,8 +110,55 @@ class Vocabulary(Model):
         }
         
         word_id = cls.insert(data)
+        vocabulary_index.invalidate()
         return cls.get_by_id(word_id)
     
+    @classmethod
+    def bulk_upsert(cls, rows, chunk_size=1000):
+        """
+        批量寫入詞彙：在一個事務中分批 executemany，已存在的單詞更新翻譯與難度
+        
+        每批先 UPDATE 內容有變化的已有單詞，再 INSERT 不存在的單詞。
+        不使用 INSERT ... ON CONFLICT：在 AUTOINCREMENT 表上每次衝突都會消耗一個ID，
+        重複匯入會讓ID（即已見詞彙位圖的位號）不斷增大。
+        
+        Args:
+            rows: (english, chinese, difficulty) 的可迭代對象，可以是生成器
+            chunk_size: 每次 executemany 的行數
+        
+        Returns:
+            dict: {"total", "inserted", "updated", "unchanged"}
+        """
+        update_query = f'''
+            UPDATE {cls.table_name} SET chinese_translation = ?2, difficulty = ?3
+            WHERE english_word = ?1 AND (chinese_translation IS NOT ?2 OR difficulty IS NOT ?3)
+        '''
+        insert_query = f'''
+            INSERT INTO {cls.table_name} (english_word, chinese_translation, difficulty)
+            SELECT ?1, ?2, ?3 WHERE NOT EXISTS (SELECT 1 FROM {cls.table_name} WHERE english_word = ?1)
+        '''
+        rows = iter(rows)
+        total = inserted = updated = 0
+        with Database.transaction() as conn:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                total += len(chunk)
+                # 同一批中重複的單詞以最後一次出現為準
+                chunk = list({row[0]: row for row in chunk}.values())
+                updated += conn.executemany(update_query, chunk).rowcount
+                inserted += conn.executemany(insert_query, chunk).rowcount
+        
+        if inserted or updated:
+            vocabulary_index.invalidate()
+        return {
+            "total": total,
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": total - inserted - updated
+        }
+    
     @staticmethod
     def _row_to_dict(row):
         """將數據庫結果轉換為字典"""
@@ -104,6 +169,155 @@ class Vocabulary(Model):
         return {columns[i]: row[i] for i in range(len(columns)) if i < len(row)}
 
 
+class WordBitmap:
+    """
+    已見詞彙位圖：第 i 位表示詞彙ID i 已分配過
+    
+    以 BLOB 存入 user_seen_words，9,000 個詞彙約 1.1KB；查詢與標記都是 O(1)。
+    """
+    
+    __slots__ = ('_bits', 'count')
+    
+    def __init__(self, data=None, count=None):
+        self._bits = bytearray(data or b'')
+        self.count = sum(bin(byte).count('1') for byte in self._bits) if count is None else count
+    
+    def __contains__(self, word_id):
+        word_id = int(word_id)
+        index = word_id >> 3
+        return index < len(self._bits) and bool(self._bits[index] & (1 << (word_id & 7)))
+    
+    def add(self, word_id):
+        """標記詞彙為已見"""
+        word_id = int(word_id)
+        index = word_id >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(index + 1 - len(self._bits)))
+        mask = 1 << (word_id & 7)
+        if not self._bits[index] & mask:
+            self._bits[index] |= mask
+            self.count += 1
+    
+    def clear(self):
+        self._bits = bytearray()
+        self.count = 0
+    
+    def to_bytes(self):
+        return bytes(self._bits)
+
+
+class UserSeenWords(Model):
+    """用戶已見詞彙模型類，每個用戶一行位圖，學完全部詞彙後開始新一輪"""
+    
+    table_name = "user_seen_words"
+    columns = {
+        "user_id": "TEXT PRIMARY KEY",
+        "bitmap": "BLOB NOT NULL",
+        "seen_count": "INTEGER NOT NULL DEFAULT 0",
+        "cycle": "INTEGER NOT NULL DEFAULT 1",
+        "updated_at": "DATETIME DEFAULT CURRENT_TIMESTAMP"
+    }
+    primary_key = "user_id"
+    
+    _UPSERT_SQL = f'''
+        INSERT INTO {table_name} (user_id, bitmap, seen_count, cycle, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id) DO UPDATE SET
+            bitmap = excluded.bitmap,
+            seen_count = excluded.seen_count,
+            cycle = excluded.cycle,
+            updated_at = excluded.updated_at
+    '''
+    
+    @classmethod
+    def load(cls, user_id):
+        """
+        讀取用戶的已見詞彙
+        
+        Returns:
+            tuple: (WordBitmap, 當前輪次)
+        """
+        row = Database.execute_query(
+            f"SELECT bitmap, seen_count, cycle FROM {cls.table_name} WHERE user_id = ?", (user_id,), 'one'
+        )
+        if not row:
+            return WordBitmap(), 1
+        return WordBitmap(row[0], row[1]), row[2]
+    
+    @classmethod
+    def load_many(cls, user_ids, batch_size=500):
+        """
+        一次讀取多個用戶的已見詞彙
+        
+        Returns:
+            dict: user_id -> (WordBitmap, 當前輪次)，沒有記錄的用戶為空位圖、第 1 輪
+        """
+        user_ids = list(user_ids)
+        result = {user_id: (WordBitmap(), 1) for user_id in user_ids}
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            placeholders = ", ".join("?" for _ in batch)
+            rows = Database.execute_query(
+                f"SELECT user_id, bitmap, seen_count, cycle FROM {cls.table_name} WHERE user_id IN ({placeholders})",
+                tuple(batch), 'all'
+            ) or []
+            for user_id, bitmap, seen_count, cycle in rows:
+                result[user_id] = (WordBitmap(bitmap, seen_count), cycle)
+        return result
+    
+    @staticmethod
+    def pick(seen, cycle, count):
+        """
+        從本輪尚未見過的詞彙中抽取 count 個，並標記為已見
+        
+        本輪剩餘的詞彙不足一天的量時先用完剩餘的，再清空位圖開始新一輪。
+        
+        Returns:
+            tuple: (詞彙ID列表, 輪次)；seen 被原地更新
+        """
+        word_ids = vocabulary_index.sample(count, exclude=seen)
+        if len(word_ids) < count:
+            seen.clear()
+            cycle += 1
+            word_ids += vocabulary_index.sample(count - len(word_ids), exclude=set(word_ids))
+        for word_id in word_ids:
+            seen.add(word_id)
+        return word_ids, cycle
+    
+    @classmethod
+    def save(cls, user_id, bitmap, cycle):
+        Database.execute_query(cls._UPSERT_SQL, (user_id, bitmap.to_bytes(), bitmap.count, cycle))
+    
+    @classmethod
+    def save_many(cls, entries):
+        """批量保存 [(user_id, WordBitmap, 輪次), ...]"""
+        Database.execute_many(
+            cls._UPSERT_SQL,
+            [(user_id, bitmap.to_bytes(), bitmap.count, cycle) for user_id, bitmap, cycle in entries]
+        )
+
+
+class UserVocabularyItem(Model):
+    """用戶每日詞彙明細，每個詞彙一行（取代 user_vocabulary.word_ids 的逗號分隔字符串）"""
+    
+    table_name = "user_vocabulary_items"
+    columns = {
+        "user_id": "TEXT NOT NULL",
+        "date": "TEXT NOT NULL",
+        "word_id": "INTEGER NOT NULL",
+        "position": "INTEGER NOT NULL",
+        "PRIMARY KEY": "(user_id, date, position)"
+    }
+    
+    @classmethod
+    def add_items(cls, user_id, date, word_ids):
+        """按順序寫入某日的詞彙"""
+        Database.execute_many(
+            f"INSERT INTO {cls.table_name} (user_id, date, word_id, position) VALUES (?, ?, ?, ?)",
+            [(user_id, date, int(word_id), position) for position, word_id in enumerate(word_ids)]
+        )
+
+
 class UserVocabulary(Model):
     """用戶詞彙模型類，記錄用戶每日學習的詞彙"""
     
@@ -119,31 +333,23 @@ class UserVocabulary(Model):
     
     @classmethod
     def get_user_daily_words(cls, user_id, date):
-        """獲取用戶某日的詞彙學習記錄"""
-        query = f"SELECT * FROM {cls.table_name} WHERE user_id = ? AND date = ?"
-        result = Database.execute_query(query, (user_id, date), 'one')
-        if not result:
+        """獲取用戶某日的詞彙學習記錄（一次 JOIN 查詢取出全部詞彙詳情）"""
+        query = f'''
+            SELECT v.english_word, v.chinese_translation, v.difficulty
+            FROM {UserVocabularyItem.table_name} i
+            JOIN {Vocabulary.table_name} v ON v.id = i.word_id
+            WHERE i.user_id = ? AND i.date = ?
+            ORDER BY i.position
+        '''
+        rows = Database.execute_query(query, (user_id, date), 'all')
+        if not rows:
             return None
-            
-        # 解析word_ids
-        user_vocab = cls._row_to_dict(result)
-        if not user_vocab:
-            return None
-            
-        word_ids = user_vocab['word_ids'].split(',')
         
-        # 獲取詞彙詳情
-        words = []
-        for word_id in word_ids:
-            word = Vocabulary.get_by_id(word_id)
-            if word:
-                words.append({
-                    'english': word['english_word'],
-                    'chinese': word['chinese_translation'],
-                    'difficulty': word['difficulty']
-                })
-                
-        return words
+        return [{
+            'english': english,
+            'chinese': chinese,
+            'difficulty': difficulty
+        } for english, chinese, difficulty in rows]
     
     @classmethod
     def assign_daily_words(cls, user_id, date, count=3):
@@ -153,20 +359,26 @@ class UserVocabulary(Model):
         if existing:
             return existing
             
-        # 獲取隨機詞彙
-        random_words = Vocabulary.get_random_words(count)
-        if not random_words:
-            return []
+        with Database.transaction():
+            # 從本輪尚未見過的詞彙中抽取
+            seen, cycle = UserSeenWords.load(user_id)
+            word_ids, cycle = UserSeenWords.pick(seen, cycle, count)
             
-        # 保存用戶詞彙記錄
-        word_ids = [str(word['id']) for word in random_words]
-        data = {
-            'user_id': user_id,
-            'date': date,
-            'word_ids': ','.join(word_ids)
-        }
-        
-        cls.insert(data)
+            random_words = Vocabulary.get_words_by_ids(word_ids)
+            if len(random_words) < len(word_ids):
+                vocabulary_index.invalidate()
+            if not random_words:
+                return []
+            
+            # 保存用戶詞彙記錄，並在同一事務中標記為已見
+            data = {
+                'user_id': user_id,
+                'date': date,
+                'word_ids': ','.join(str(word['id']) for word in random_words)
+            }
+            cls.insert(data)
+            UserVocabularyItem.add_items(user_id, date, [word['id'] for word in random_words])
+            UserSeenWords.save(user_id, seen, cycle)
         
         # 轉換為前端格式
         return [{
@@ -175,6 +387,53 @@ class UserVocabulary(Model):
             'difficulty': word['difficulty']
         } for word in random_words]
     
+    @classmethod
+    def assign_many(cls, user_ids, date, count=3):
+        """
+        為多個用戶預先分配某日的詞彙（每晚的詞彙計劃任務使用）
+        
+        已有該日記錄的用戶被略過；抽詞在內存中完成，三張表各一次 executemany，
+        全部在同一個事務中寫入。
+        
+        Returns:
+            int: 本次分配的用戶數
+        """
+        with Database.transaction():
+            planned = set()
+            user_ids = list(dict.fromkeys(user_ids))
+            for start in range(0, len(user_ids), 500):
+                batch = user_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = Database.execute_query(
+                    f"SELECT user_id FROM {cls.table_name} WHERE date = ? AND user_id IN ({placeholders})",
+                    (date, *batch), 'all'
+                ) or []
+                planned.update(row[0] for row in rows)
+            user_ids = [user_id for user_id in user_ids if user_id not in planned]
+            if not user_ids:
+                return 0
+            
+            plans = []
+            items = []
+            seen_entries = []
+            for user_id, (seen, cycle) in UserSeenWords.load_many(user_ids).items():
+                word_ids, cycle = UserSeenWords.pick(seen, cycle, count)
+                if not word_ids:
+                    continue
+                plans.append((user_id, date, ','.join(str(word_id) for word_id in word_ids)))
+                items.extend((user_id, date, word_id, position) for position, word_id in enumerate(word_ids))
+                seen_entries.append((user_id, seen, cycle))
+            
+            Database.execute_many(
+                f"INSERT INTO {cls.table_name} (user_id, date, word_ids) VALUES (?, ?, ?)", plans
+            )
+            Database.execute_many(
+                f"INSERT INTO {UserVocabularyItem.table_name} (user_id, date, word_id, position) VALUES (?, ?, ?, ?)",
+                items
+            )
+            UserSeenWords.save_many(seen_entries)
+        return len(plans)
+    
     @staticmethod
     def _row_to_dict(row):
         """將數據庫結果轉換為字典"""
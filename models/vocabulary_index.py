@@ -0,0 +1,109 @@
+"""
+詞彙的進程內索引
+
+把 vocabulary 表的詞彙ID按難度存放在緊湊的 array 中，首次使用時載入一次，
+之後隨機抽詞只在內存中進行：拒絕採樣抽取 k 個不重複的ID，期望 O(k)，
+取代每次對整張表排序的 ORDER BY RANDOM()。
+
+本進程寫入詞彙（add_word、批量匯入）後調用 invalidate()；
+其他進程的寫入在 VOCAB_INDEX_TTL 秒內生效。
+"""
+
+import random
+import threading
+import time
+from array import array
+from config import Config
+from models.base import Database
+
+
+class VocabularyIndex:
+    """按難度分組的詞彙ID索引"""
+
+    # 拒絕採樣的嘗試次數上限為 k * 此倍數 + 常數，超過時（可選詞彙已很少）改為線性篩選
+    MAX_ATTEMPT_FACTOR = 4
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # (全部ID, {難度: ID}) 整體替換，讀取方無需加鎖
+        self._arrays = (array('q'), {})
+        self._loaded_at = None
+        self._stale = True
+
+    @property
+    def ttl(self):
+        return Config.VOCAB_INDEX_TTL if self._ttl is None else self._ttl
+
+    def invalidate(self):
+        """標記索引過期，下次使用時重新載入"""
+        self._stale = True
+
+    def _needs_reload(self):
+        return self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def reload(self):
+        """從數據庫重新載入索引"""
+        rows = Database.execute_query("SELECT id, difficulty FROM vocabulary ORDER BY id", None, 'all') or []
+        all_ids = array('q')
+        by_difficulty = {}
+        for word_id, difficulty in rows:
+            all_ids.append(word_id)
+            by_difficulty.setdefault(difficulty, array('q')).append(word_id)
+        self._arrays = (all_ids, by_difficulty)
+        self._loaded_at = time.monotonic()
+        self._stale = False
+
+    def _ids(self, difficulty=None):
+        if self._needs_reload():
+            with self._lock:
+                if self._needs_reload():
+                    self.reload()
+        all_ids, by_difficulty = self._arrays
+        if difficulty is None:
+            return all_ids
+        return by_difficulty.get(difficulty, array('q'))
+
+    def size(self, difficulty=None):
+        """索引中的詞彙數"""
+        return len(self._ids(difficulty))
+
+    def sample(self, k, difficulty=None, exclude=None):
+        """
+        隨機抽取 k 個不重複的詞彙ID
+
+        Args:
+            k: 數量，可選詞彙不足時返回全部可選詞彙
+            difficulty: 只從此難度中抽取，默認不限
+            exclude: 支持 in 運算的容器，其中的ID不會被抽中
+
+        Returns:
+            list: 詞彙ID（隨機順序）
+        """
+        ids = self._ids(difficulty)
+        n = len(ids)
+        if k <= 0 or n == 0:
+            return []
+
+        chosen = []
+        picked = set()
+        attempts = 0
+        max_attempts = self.MAX_ATTEMPT_FACTOR * k + 32
+        while len(chosen) < k and attempts < max_attempts:
+            attempts += 1
+            word_id = ids[random.randrange(n)]
+            if word_id in picked or (exclude is not None and word_id in exclude):
+                continue
+            picked.add(word_id)
+            chosen.append(word_id)
+
+        if len(chosen) < k:
+            # 可選詞彙所剩無幾，拒絕率過高：線性篩選剩餘詞彙後抽取
+            remaining = [word_id for word_id in ids
+                         if word_id not in picked and (exclude is None or word_id not in exclude)]
+            chosen.extend(random.sample(remaining, min(k - len(chosen), len(remaining))))
+        return chosen
+
+
+# 全局實例
+vocabulary_index = VocabularyIndex()
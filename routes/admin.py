@@ -1,10 +1,10 @@
 # routes/admin.py
 from flask import Blueprint, jsonify, request, render_template, redirect, url_for
 from datetime import datetime
+import io
 import os
 import sqlite3
 import json
-import shutil
 from config import Config
 from services.notification_service import send_line_message_to_group
 
@@ -78,6 +78,121 @@ def system_info():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@admin_bp.route('/api/admin/query-advisor')
+def query_advisor():
+    """熱點查詢的 EXPLAIN QUERY PLAN 診斷，標記大表上的全表掃描"""
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"error": "權限不足"}), 403
+
+    # 可選：自定義大表閾值與要額外分析的查詢（只允許 SELECT，EXPLAIN 不會執行查詢）
+    threshold = request.args.get('threshold', type=int)
+    extra_sql = request.args.get('sql')
+    if extra_sql and not extra_sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return jsonify({"error": "只能分析 SELECT 查詢"}), 400
+
+    try:
+        from services.query_advisor_service import run_advisor
+        return jsonify(run_advisor(large_table_rows=threshold, extra_sql=extra_sql))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route('/api/admin/event-queue')
+def event_queue_stats():
+    """webhook 事件隊列的背壓指標"""
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"error": "權限不足"}), 403
+
+    from services.event_queue import event_queue
+    return jsonify(event_queue.stats())
+
+@admin_bp.route('/api/admin/line-api')
+def line_api_stats():
+    """LINE API 各端點的請求、錯誤、重試次數與耗時"""
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"error": "權限不足"}), 403
+
+    from services.line_api import line_api
+    from services.profile_cache import profile_cache
+    return jsonify({**line_api.stats(), "profile_cache": profile_cache.stats()})
+
+@admin_bp.route('/api/admin/scheduler')
+def scheduler_stats():
+    """提醒排程器狀態"""
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"error": "權限不足"}), 403
+
+    from services.scheduler_service import reminder_scheduler
+    from services.leader_election import background_leader
+    return jsonify({**reminder_scheduler.stats(), "leader": background_leader.status()})
+
+@admin_bp.route('/api/admin/attendance/backfill', methods=['POST'])
+def attendance_backfill():
+    """從打卡記錄重建每日出勤摘要（修改上下班時間配置或修復數據後使用）"""
+    data = request.json or {}
+    user_id = data.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"error": "權限不足"}), 403
+
+    try:
+        from models import DailyAttendance, Schema
+        Schema.ensure_ready()
+        rows = DailyAttendance.backfill(start_date=data.get('startDate'), end_date=data.get('endDate'))
+        return jsonify({"success": True, "rows": rows})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@admin_bp.route('/api/admin/vocabulary/import', methods=['POST'])
+def import_vocabulary():
+    """
+    批量匯入詞彙
+    
+    multipart 上傳：file 為 CSV / JSON / NDJSON 文件，userId 與可選的 format 放在表單中；
+    或 JSON 請求：{"userId": ..., "words": [...]}
+    """
+    data = request.form if request.files else (request.get_json(silent=True) or {})
+    user_id = data.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"success": False, "message": "權限不足"}), 403
+    
+    from services.vocabulary_import import import_upload, import_stream, detect_format, FORMATS
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            file_format = data.get('format') or detect_format(upload.filename)
+            if file_format not in FORMATS:
+                return jsonify({"success": False, "message": "無法判斷文件格式，請指定 format (csv/json/ndjson)"}), 400
+            result = import_upload(upload.stream, file_format)
+        elif isinstance(data.get('words'), list):
+            result = import_stream(io.StringIO(json.dumps(data['words'], ensure_ascii=False)), 'json')
+        else:
+            return jsonify({"success": False, "message": "請上傳 file 或提供 words 數組"}), 400
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"文件格式錯誤: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "message": f"匯入失敗: {str(e)}"}), 500
+    
+    return jsonify({"success": True, **result})
+
+@admin_bp.route('/api/admin/vocabulary/plan', methods=['POST'])
+def generate_vocabulary_plan():
+    """立即生成詞彙計劃（默認明天，可指定 date）"""
+    data = request.json or {}
+    user_id = data.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"success": False, "message": "權限不足"}), 403
+    
+    try:
+        from services.word_plan_service import generate_word_plans
+        return jsonify({"success": True, **generate_word_plans(data.get('date'))})
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"日期格式錯誤: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"success": False, "message": f"生成詞彙計劃失敗: {str(e)}"}), 500
+
 @admin_bp.route('/api/admin/backup-db', methods=['POST'])
 def backup_db():
     """備份數據庫"""
@@ -86,30 +201,65 @@ def backup_db():
         return jsonify({"success": False, "message": "權限不足"}), 403
     
     try:
-        # 創建備份目錄
-        backup_dir = 'backups'
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-        
-        # 生成備份文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"{backup_dir}/checkin_backup_{timestamp}.db"
+        from services.backup_service import backup_engine
         
-        # 複製數據庫文件
-        shutil.copy2(Config.DB_PATH, backup_file)
+        # 在線備份（不阻塞寫入），完成後還原驗證
+        backup = backup_engine.backup()
+        verification = backup.get("verification", {})
+        if not backup.get("verified"):
+            return jsonify({
+                "success": False,
+                "message": f"備份驗證失敗: {verification.get('integrity')}",
+                "backup_file": backup["backup_file"],
+                "verification": verification
+            }), 500
         
-        # 發送通知
-        message = f"✅ 數據庫備份成功\n📂 備份文件: {backup_file}\n🕒 時間: {timestamp}"
+        message = (f"✅ 數據庫備份成功\n📂 備份文件: {backup['backup_file']}\n"
+                   f"📦 大小: {backup['size']} bytes\n🕒 時間: {backup['timestamp']}")
         
         return jsonify({
             "success": True,
             "message": message,
-            "backup_file": backup_file,
-            "timestamp": timestamp
+            "backup_file": backup["backup_file"],
+            "timestamp": backup["timestamp"],
+            "size": backup["size"],
+            "duration": backup["duration"],
+            "compressed": backup["compressed"],
+            "verification": verification
         })
     except Exception as e:
         return jsonify({"success": False, "message": f"備份失敗: {str(e)}"}), 500
 
+@admin_bp.route('/api/admin/backups')
+def list_backups():
+    """列出數據庫備份"""
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"success": False, "message": "權限不足"}), 403
+    
+    from services.backup_service import backup_engine
+    backups = [
+        {"file": b["file"], "created": b["created"].strftime("%Y-%m-%d %H:%M:%S"), "size": b["size"]}
+        for b in backup_engine.list_backups()
+    ]
+    return jsonify({"success": True, "backups": backups})
+
+@admin_bp.route('/api/admin/backups/verify', methods=['POST'])
+def verify_backup():
+    """還原驗證指定的備份文件"""
+    data = request.json or {}
+    user_id = data.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({"success": False, "message": "權限不足"}), 403
+    
+    from services.backup_service import backup_engine
+    backup = next((b for b in backup_engine.list_backups() if b["file"] == data.get('file')), None)
+    if not backup:
+        return jsonify({"success": False, "message": "備份文件不存在"}), 404
+    
+    verification = backup_engine.verify(backup["path"])
+    return jsonify({"success": verification["ok"], "file": backup["file"], "verification": verification})
+
 @admin_bp.route('/api/admin/broadcast', methods=['POST'])
 def broadcast_message():
     """發送全群廣播消息"""
@@ -159,23 +309,17 @@ def clear_cache():
                     os.remove(os.path.join(root, file))
                     temp_files += 1
         
-        # 清理過期備份
-        backup_limit = 5  # 保留最近5個備份
-        backup_dir = 'backups'
-        if os.path.exists(backup_dir):
-            backups = [os.path.join(backup_dir, f) for f in os.listdir(backup_dir) if f.endswith('.db')]
-            backups.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            
-            if len(backups) > backup_limit:
-                for old_backup in backups[backup_limit:]:
-                    os.remove(old_backup)
+        # 按保留策略清理過期備份
+        from services.backup_service import backup_engine
+        retention = backup_engine.apply_retention()
         
         return jsonify({
             "success": True,
-            "message": f"缓存清理完成，已刪除 {temp_files} 個臨時文件",
+            "message": f"缓存清理完成，已刪除 {temp_files} 個臨時文件、{len(retention['removed'])} 個過期備份",
             "details": {
                 "temp_files_removed": temp_files,
-                "backups_kept": backup_limit
+                "backups_kept": len(retention["kept"]),
+                "backups_removed": retention["removed"]
             }
         })
     except Exception as e:
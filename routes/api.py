@@ -1,12 +1,16 @@
 # routes/api.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from services.checkin_service import process_checkin as process_checkin_logic
 from services.group_service import save_group_message, get_recent_messages
 from services.notification_service import send_line_message_to_group, send_line_notification
 from datetime import datetime
 from utils.validator import validate_checkin_input
 from db.crud import get_reminder_setting, update_reminder_setting
+from models import ReminderSetting
+from routes.admin import is_admin
+from services.change_feed import ndjson_changes, cursor_expired, latest_cursor
+from services.export_stream import gzip_stream
 
 api_bp = Blueprint('api', __name__)
 
@@ -14,6 +18,41 @@ import sqlite3
 from datetime import datetime
 from config import Config
 
+@api_bp.route('/api/changes', methods=['GET'])
+def get_changes():
+    """
+    打卡記錄的增量變更流 (NDJSON)
+
+    參數: userId, since（上次返回的 cursor，默認 0 表示從頭開始）, limit
+    since 早於變更日誌的保留範圍時返回 410 與當前 cursor，客戶端需重新匯出全部記錄。
+    管理員獲取所有用戶的變更，其他用戶只能獲取自己的變更。
+    """
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID'}), 400
+
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    if since < 0 or (limit is not None and limit <= 0):
+        return jsonify({'success': False, 'message': 'since 與 limit 必須是正整數'}), 400
+
+    scope = None if is_admin(user_id) else user_id
+    if cursor_expired(since):
+        # 游標之後的部分變更已被清理：重新匯出全部記錄，之後從返回的 cursor 繼續
+        return jsonify({
+            'success': False,
+            'expired': True,
+            'message': '游標已過期，請重新匯出全部記錄後從 cursor 繼續同步',
+            'cursor': latest_cursor(scope)
+        }), 410
+    pieces = ndjson_changes(since, limit, scope)
+    headers = {'Cache-Control': 'no-store'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        pieces = gzip_stream(pieces)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(stream_with_context(pieces), mimetype='application/x-ndjson', headers=headers)
+
 # 修復版 API 路由函數
 @api_bp.route('/api/check-today-status', methods=['GET'])
 def check_today_status():
@@ -144,9 +183,17 @@ def test_reminder():
     
     success = send_line_notification(user_id, message)
     
+    # 同時返回該用戶此刻是否符合排程提醒的條件，便於排查收不到提醒的原因
+    try:
+        eligible = ReminderSetting.is_user_eligible(user_id, reminder_type)
+    except Exception as e:
+        print(f"檢查提醒資格時出錯: {str(e)}")
+        eligible = None
+    
     return jsonify({
         'success': success,
-        'message': '測試提醒已發送' if success else '發送測試提醒失敗'
+        'message': '測試提醒已發送' if success else '發送測試提醒失敗',
+        'eligible': eligible
     })
 # 在 routes/api.py 中添加新的API端點來檢查今日打卡狀態
 
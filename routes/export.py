@@ -1,30 +1,45 @@
 # routes/export.py
-from flask import Blueprint, request, send_file, jsonify, render_template, Response
+from flask import Blueprint, request, send_file, jsonify, render_template, Response, stream_with_context, url_for
 from services.export_service import (
-    export_checkin_records_to_excel, 
-    export_checkin_records_to_pdf,
     prepare_google_sheets_export,
-    create_google_sheets_export,
+    EXCEL_GROUP_KEYS,
+    XLSXWRITER_AVAILABLE,
     REPORTLAB_AVAILABLE,
     GOOGLE_API_AVAILABLE
 )
+from services.sheets_sink import sheets_sink
+from services.export_jobs import export_jobs, make_spec, SCOPE_USER, SCOPE_ORGANIZATION, FORMATS as EXPORT_FORMATS
+from models import ExportJob
+from services.export_stream import (
+    EXPORT_COLUMNS,
+    iter_checkin_chunks,
+    csv_stream,
+    ndjson_stream,
+    gzip_stream,
+    peek
+)
 from datetime import datetime, timedelta
 import os
-import sqlite3
-import io
-import csv
-import json
 from config import Config
 from utils.timezone import get_date_string
+from routes.admin import is_admin
 
 export_bp = Blueprint('export', __name__)
 
 # 原有的路由函數
 @export_bp.route('/export/checkin-records', methods=['GET'])
 def export_checkin_records():
+    # 檢查 xlsxwriter 是否可用
+    if not XLSXWRITER_AVAILABLE:
+        return jsonify({'success': False, 'message': 'Excel 匯出功能不可用。缺少 xlsxwriter 庫。'}), 503
+    
     user_id = request.args.get('userId')
     date_range = request.args.get('dateRange', '7')
     
+    # 只匯出請求者本人的記錄；全體匯出請使用 /export/organization（管理員）
+    if not user_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID'}), 400
+    
     # 處理日期範圍
     date_to = get_date_string()
     
@@ -34,21 +49,57 @@ def export_checkin_records():
         days = int(date_range)
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
-    # 生成Excel檔案到內存
-    excel_buffer = export_checkin_records_to_excel(user_id, date_from, date_to)
+    # 生成Excel檔案（數據未變時直接使用已緩存的文件）
+    _, excel_path = export_jobs.build('excel', make_spec(user_id, date_from, date_to))
     
-    if not excel_buffer:
+    if not excel_path:
         return jsonify({'success': False, 'message': '沒有找到符合條件的打卡記錄'}), 404
     
-    # 返回內存中的Excel文件
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     return send_file(
-        excel_buffer,
+        os.path.abspath(excel_path),
         as_attachment=True,
         download_name=f"checkin_records_{timestamp}.xlsx",
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
 
+# 全體打卡記錄的多工作表 Excel 導出（管理員）
+@export_bp.route('/export/organization', methods=['GET'])
+def export_organization():
+    if not XLSXWRITER_AVAILABLE:
+        return jsonify({'success': False, 'message': 'Excel 匯出功能不可用。缺少 xlsxwriter 庫。'}), 503
+    
+    user_id = request.args.get('userId')
+    if not user_id or not is_admin(user_id):
+        return jsonify({'success': False, 'message': '權限不足'}), 403
+    
+    group_by = request.args.get('groupBy', 'user')  # 'user' 每人一個工作表，'month' 每月一個工作表
+    if group_by not in EXCEL_GROUP_KEYS:
+        return jsonify({'success': False, 'message': 'groupBy 只能是 user 或 month'}), 400
+    
+    date_range = request.args.get('dateRange', '30')
+    date_to = get_date_string()
+    
+    if date_range == 'all':
+        date_from = None
+    else:
+        days = int(date_range)
+        date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    
+    # 全體匯出較慢，可改用 POST /export/jobs 在後台生成
+    _, excel_path = export_jobs.build('excel', make_spec(None, date_from, date_to, group_by, scope=SCOPE_ORGANIZATION))
+    
+    if not excel_path:
+        return jsonify({'success': False, 'message': '沒有找到符合條件的打卡記錄'}), 404
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return send_file(
+        os.path.abspath(excel_path),
+        as_attachment=True,
+        download_name=f"checkin_records_all_{group_by}_{timestamp}.xlsx",
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
 @export_bp.route('/export-form')
 def export_form():
     user_id = request.args.get('userId')
@@ -71,6 +122,10 @@ def export_pdf():
     user_id = request.args.get('userId')
     date_range = request.args.get('dateRange', '7')
     
+    # 前台與後台（background=1）匯出都只包含請求者本人的記錄
+    if not user_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID'}), 400
+    
     # 處理日期範圍
     date_to = get_date_string()
     
@@ -80,21 +135,128 @@ def export_pdf():
         days = int(date_range)
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
-    # 生成PDF檔案到內存
-    pdf_buffer = export_checkin_records_to_pdf(user_id, date_from, date_to)
+    spec = make_spec(user_id, date_from, date_to)
+    
+    # 大範圍匯出可在後台生成，之後通過 /export/jobs/<id> 查詢並下載
+    if request.args.get('background') == '1':
+        job = export_jobs.submit(user_id, 'pdf', spec)
+        return jsonify(_job_response(job)), 200 if job['status'] == ExportJob.DONE else 202
     
-    if not pdf_buffer:
+    # 生成PDF檔案（數據未變時直接使用已緩存的文件）
+    _, pdf_path = export_jobs.build('pdf', spec)
+    
+    if not pdf_path:
         return jsonify({'success': False, 'message': '沒有找到符合條件的打卡記錄'}), 404
     
-    # 返回內存中的PDF文件
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     return send_file(
-        pdf_buffer,
+        os.path.abspath(pdf_path),
         as_attachment=True,
         download_name=f"checkin_records_{timestamp}.pdf",
         mimetype='application/pdf'
     )
 
+# 後台匯出任務
+def _job_response(job):
+    """任務狀態的 JSON 表示"""
+    total = job.get('total')
+    processed = job.get('processed') or 0
+    response = {
+        'success': job['status'] != ExportJob.FAILED,
+        'jobId': job['id'],
+        'status': job['status'],
+        'format': job['format'],
+        'processed': processed,
+        'total': total,
+        'progress': 100 if job['status'] == ExportJob.DONE else (
+            int(processed * 100 / total) if total else 0
+        ),
+        'statusUrl': url_for('export.export_job_status', job_id=job['id'], userId=job['requested_by']),
+        'createdAt': job.get('created_at'),
+        'finishedAt': job.get('finished_at')
+    }
+    if job['status'] == ExportJob.DONE:
+        response['downloadUrl'] = url_for('export.export_job_download', job_id=job['id'], userId=job['requested_by'])
+    elif job['status'] == ExportJob.EMPTY:
+        response['message'] = '沒有找到符合條件的打卡記錄'
+    elif job['status'] == ExportJob.FAILED:
+        response['message'] = job.get('error')
+    return response
+
+def _load_job(job_id):
+    """讀取任務並檢查請求者是本人或管理員，返回 (任務, 錯誤響應)"""
+    user_id = request.args.get('userId')
+    job = export_jobs.get(job_id)
+    if not job:
+        return None, (jsonify({'success': False, 'message': '找不到匯出任務'}), 404)
+    if not user_id or (user_id != job['requested_by'] and not is_admin(user_id)):
+        return None, (jsonify({'success': False, 'message': '權限不足'}), 403)
+    return job, None
+
+@export_bp.route('/export/jobs', methods=['POST'])
+def create_export_job():
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('userId')
+    if not user_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID'}), 400
+    
+    export_format = data.get('format', 'excel')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f"format 只能是 {', '.join(EXPORT_FORMATS)}"}), 400
+    if not EXPORT_FORMATS[export_format]['available']:
+        return jsonify({'success': False, 'message': f'{export_format} 匯出功能不可用。缺少相關庫。'}), 503
+    
+    # scope=organization 匯出全體用戶（管理員），可按用戶或月份分工作表
+    scope = SCOPE_USER
+    group_by = None
+    if data.get('scope') == SCOPE_ORGANIZATION:
+        if not is_admin(user_id):
+            return jsonify({'success': False, 'message': '權限不足'}), 403
+        scope = SCOPE_ORGANIZATION
+        group_by = data.get('groupBy') if export_format == 'excel' else None
+        if group_by and group_by not in EXCEL_GROUP_KEYS:
+            return jsonify({'success': False, 'message': 'groupBy 只能是 user 或 month'}), 400
+    
+    date_range = str(data.get('dateRange', '7'))
+    date_to = get_date_string()
+    
+    if date_range == 'all':
+        date_from = None
+    else:
+        days = int(date_range)
+        date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    
+    job = export_jobs.submit(user_id, export_format, make_spec(user_id, date_from, date_to, group_by, scope))
+    return jsonify(_job_response(job)), 200 if job['status'] == ExportJob.DONE else 202
+
+@export_bp.route('/export/jobs/<job_id>', methods=['GET'])
+def export_job_status(job_id):
+    job, error = _load_job(job_id)
+    if error:
+        return error
+    return jsonify(_job_response(job))
+
+@export_bp.route('/export/jobs/<job_id>/download', methods=['GET'])
+def export_job_download(job_id):
+    job, error = _load_job(job_id)
+    if error:
+        return error
+    
+    path = export_jobs.file_for(job)
+    if not path:
+        if job['status'] == ExportJob.DONE:
+            return jsonify({'success': False, 'message': '匯出文件已過期，請重新匯出'}), 410
+        return jsonify(_job_response(job)), 409
+    
+    fmt = EXPORT_FORMATS[job['format']]
+    created = (job.get('created_at') or '').replace('-', '').replace(':', '').replace(' ', '_')
+    return send_file(
+        os.path.abspath(path),
+        as_attachment=True,
+        download_name=f"checkin_records_{created}.{fmt['ext']}",
+        mimetype=fmt['mimetype']
+    )
+
 # 新增 Google Sheets 導出路由（直接導出方式）
 @export_bp.route('/export/google-sheets', methods=['GET'])
 def export_google_sheets():
@@ -105,6 +267,9 @@ def export_google_sheets():
     user_id = request.args.get('userId')
     date_range = request.args.get('dateRange', '7')
     
+    if not user_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID'}), 400
+    
     # 處理日期範圍
     date_to = get_date_string()
     
@@ -114,17 +279,40 @@ def export_google_sheets():
         days = int(date_range)
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
-    # 獲取數據
-    sheets_data = prepare_google_sheets_export(user_id, date_from, date_to)
+    # 創建 Google Sheets：不設結束日期，之後的新增、修改與刪除可通過 /export/google-sheets/sync 同步
+    try:
+        result = sheets_sink.export(user_id, date_from, None, f"打卡記錄 - {user_id}")
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
     
-    if not sheets_data:
+    if not result:
         return jsonify({'success': False, 'message': '沒有找到符合條件的打卡記錄'}), 404
     
-    # 創建 Google Sheets
-    result = create_google_sheets_export(sheets_data, f"打卡記錄 - {user_id}")
-    
     return jsonify(result)
 
+# 把上次同步之後的打卡記錄變更（新增、修改、刪除）同步到已匯出的 Google Sheets
+@export_bp.route('/export/google-sheets/sync', methods=['POST'])
+def sync_google_sheets():
+    if not GOOGLE_API_AVAILABLE:
+        return jsonify({'success': False, 'message': 'Google Sheets 匯出功能不可用。缺少 Google API 庫。'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('userId')
+    spreadsheet_id = data.get('spreadsheetId')
+    if not user_id or not spreadsheet_id:
+        return jsonify({'success': False, 'message': '缺少用戶ID或表格ID'}), 400
+    
+    state = sheets_sink.get_state(spreadsheet_id)
+    if not state:
+        return jsonify({'success': False, 'message': '找不到此表格的同步記錄'}), 404
+    if state['user_id'] != user_id and not is_admin(user_id):
+        return jsonify({'success': False, 'message': '權限不足'}), 403
+    
+    try:
+        return jsonify(sheets_sink.sync(spreadsheet_id))
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
 # 新增 Google Sheets 數據準備路由（前端導出方式）
 @export_bp.route('/export/google-sheets-data', methods=['GET'])
 def export_google_sheets_data():
@@ -171,53 +359,44 @@ def export_text():
         days = int(date_range)
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
-    # 從數據庫獲取打卡記錄
-    conn = sqlite3.connect(Config.DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    if date_from:
-        c.execute('''
-            SELECT * FROM checkin_records 
-            WHERE user_id = ? AND date >= ? 
-            ORDER BY date DESC, time DESC
-        ''', (user_id, date_from))
-    else:
-        c.execute('''
-            SELECT * FROM checkin_records 
-            WHERE user_id = ? 
-            ORDER BY date DESC, time DESC
-        ''', (user_id,))
-    
-    results = c.fetchall()
-    conn.close()
-    
-    # 將記錄轉換為列表
-    records = []
-    for row in results:
-        record = {}
-        for key in row.keys():
-            record[key] = row[key]
-        records.append(record)
-    
-    if not records:
+    # 分批讀取打卡記錄，先取出第一批判斷是否有數據
+    has_records, chunks = peek(iter_checkin_chunks(user_id, date_from, date_to))
+    if not has_records:
         return jsonify({'success': False, 'message': '沒有找到符合條件的打卡記錄'})
     
-    # 根據格式類型返回
-    if format_type == 'json':
+    # 兼容舊的 JSON 格式：不帶 stream 參數時一次返回 {'success', 'records'}，
+    # 最多 EXPORT_JSON_MAX_ROWS 行，超過時要求改用流式的 CSV/NDJSON
+    if format_type == 'json' and request.args.get('stream') != '1':
+        max_rows = Config.EXPORT_JSON_MAX_ROWS
+        records = []
+        for rows in chunks:
+            records.extend(dict(zip(EXPORT_COLUMNS, row)) for row in rows)
+            if len(records) > max_rows:
+                chunks.close()
+                return jsonify({
+                    'success': False,
+                    'message': f'記錄超過 {max_rows} 筆，請改用 format=ndjson 或 format=csv 流式匯出'
+                }), 413
         return jsonify({
             'success': True,
             'records': records
         })
-    else:  # CSV
-        # 構建 CSV 字符串
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=records[0].keys())
-        writer.writeheader()
-        writer.writerows(records)
-        
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-disposition": f"attachment; filename=checkin_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
+    
+    # 流式輸出：CSV 或 NDJSON（format=ndjson，或 format=json&stream=1）
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if format_type == 'csv':
+        pieces = csv_stream(chunks)
+        mimetype = 'text/csv'
+        filename = f"checkin_records_{timestamp}.csv"
+    else:
+        pieces = ndjson_stream(chunks)
+        mimetype = 'application/x-ndjson'
+        filename = f"checkin_records_{timestamp}.ndjson"
+    
+    headers = {"Content-disposition": f"attachment; filename={filename}"}
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and request.args.get('gzip') != '0':
+        pieces = gzip_stream(pieces)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    
+    return Response(stream_with_context(pieces), mimetype=mimetype, headers=headers)
@@ -3,7 +3,6 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 import json
-import requests
 import re
 from services.notification_service import send_reply, send_reply_raw, send_checkin_notification, send_line_message_to_group
 from services.checkin_service import quick_checkin
@@ -13,9 +12,14 @@ import traceback
 from config import Config
 from utils.timezone import get_datetime_string, get_current_time, get_date_string
 from db.crud import get_reminder_setting, update_reminder_setting
+from db.migrations import migrate, get_version
+from models import Database
 import sqlite3
 import logging
 from services import EventService, get_daily_words, format_daily_words
+from services.event_queue import event_queue
+from services.line_api import line_api
+from services.user_service import UserService
 
 # 設置日誌
 logger = logging.getLogger(__name__)
@@ -40,11 +44,13 @@ def webhook():
             logger.warning("沒有事件需要處理")
             return 'OK'
         
-        # 使用事件服務處理事件
-        results = EventService.process_events(events)
+        # 放入事件隊列後立即返回，事件由後台線程按用戶順序處理
+        accepted = event_queue.submit_many(events)
         
-        # 記錄處理結果
-        logger.info(f"處理了 {len(events)} 個事件")
+        # 記錄入隊結果
+        if accepted < len(events):
+            logger.error(f"事件隊列已滿，{len(events) - accepted} 個事件未能處理")
+        logger.info(f"已將 {accepted} 個事件放入隊列")
         
         return 'OK'
         
@@ -292,10 +298,7 @@ def webhook_test():
 @webhook_bp.route('/test-line-api', methods=['GET'])
 def test_line_api():
     try:
-        response = requests.get(
-            'https://api.line.me/v2/bot/info',
-            headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-        )
+        response = line_api.get_bot_info()
         return jsonify({
             "status": response.status_code,
             "response": response.text
@@ -387,17 +390,16 @@ def handle_set_reminder(event, reply_token, reminder_type, time_str):
     try:
         new_settings = dict(settings)
         
-        # 更新對應類型的時間
+        # 更新對應類型的時間，並確保該提醒開啟
         if reminder_type == "morning":
-            new_settings['morning_time'] = formatted_time
+            new_settings['checkin_time'] = formatted_time
+            new_settings['checkin_reminder'] = 1
             time_type = "上班提醒"
         else:  # evening
-            new_settings['evening_time'] = formatted_time
+            new_settings['checkout_time'] = formatted_time
+            new_settings['checkout_reminder'] = 1
             time_type = "下班提醒"
         
-        # 確保提醒功能開啟
-        new_settings['enabled'] = 1
-        
         # 更新設置
         success = update_reminder_setting(user_id, new_settings)
         
@@ -420,21 +422,10 @@ def handle_quick_checkin(event, reply_token, checkin_type=None):
         display_name = "未知用戶" # 設置預設值
         
         # 獲取用戶資料 - 添加詳細日誌                                                                                                                            
-        try:
-            profile_response = requests.get(
-                f'https://api.line.me/v2/bot/profile/{user_id}',
-                headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-            )
-            
-            if profile_response.status_code == 200:
-                profile = profile_response.json()
-                display_name = profile.get('displayName', '未知用戶')
-                print(f"獲取到用戶名稱: {display_name}")
-            else:
-                print(f"獲取用戶資料失敗: {profile_response.text}")
-        except Exception as e:
-            print(f"獲取用戶資料錯誤: {str(e)}", exc_info=True)
-            print(traceback.format_exc())
+        profile = UserService.get_line_profile(user_id)
+        if profile:
+            display_name = profile.get('displayName', '未知用戶')
+            print(f"獲取到用戶名稱: {display_name}")
         
         # 獲取今天日期
         current_time = get_current_time()
@@ -749,12 +740,8 @@ def system_diagnostic():
     
     # 3. 測試 LINE API
     try:
-        headers = {
-            'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-        }
-        
         # 測試 Bot 信息
-        bot_response = requests.get('https://api.line.me/v2/bot/info', headers=headers)
+        bot_response = line_api.get_bot_info()
         
         diagnostic["LINE API"] = {
             "狀態碼": bot_response.status_code,
@@ -845,46 +832,34 @@ def emergency_reset():
     
     # 重建數據庫
     try:
-        # 備份現有數據庫
+        # 備份現有數據庫，再刪除數據庫及其 WAL 文件
         if os.path.exists(Config.DB_PATH):
-            backup_path = f"{Config.DB_PATH}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            os.rename(Config.DB_PATH, backup_path)
-            result["備份"] = f"數據庫已備份為 {backup_path}"
-        
-        # 創建新數據庫
+            from services.backup_service import backup_engine
+            try:
+                backup = backup_engine.backup(label="emergency_reset", db_path=Config.DB_PATH)
+                result["備份"] = f"數據庫已備份為 {backup['backup_file']}"
+            except Exception as e:
+                # 數據庫已損壞、無法在線備份時保留原文件；
+                # -wal/-shm 中可能有尚未寫回主文件的事務，隨主文件一起改名
+                backup_path = f"{Config.DB_PATH}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(Config.DB_PATH + suffix):
+                        os.rename(Config.DB_PATH + suffix, backup_path + suffix)
+                result["備份"] = f"在線備份失敗（{str(e)}），原文件已重命名為 {backup_path}"
+            
+            Database.reset_connections()
+            for path in (Config.DB_PATH, f"{Config.DB_PATH}-wal", f"{Config.DB_PATH}-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        # 創建新數據庫，表結構由版本化遷移建立
         conn = sqlite3.connect(Config.DB_PATH)
-        c = conn.cursor()
-        
-        # 建立打卡紀錄表格
-        c.execute('''
-            CREATE TABLE checkin_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                location TEXT,
-                note TEXT,
-                latitude REAL,
-                longitude REAL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                checkin_type TEXT DEFAULT '上班'
-            )
-        ''')
-        
-        # 建立群組訊息表格
-        c.execute('''
-            CREATE TABLE group_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                user_name TEXT NOT NULL,
-                message TEXT,
-                timestamp TEXT NOT NULL
-            )
-        ''')
-        
-        conn.commit()
+        migrate(conn)
         conn.close()
         
+        # 已有線程的連接仍指向舊文件，讓它們重新連接
+        Database.reset_connections()
+        
         result["數據庫"] = "重建成功"
         
         # 創建測試記錄
@@ -978,40 +953,19 @@ def emergency_db_fix():
         # 檢查數據庫是否存在
         if os.path.exists(Config.DB_PATH):
             # 備份數據庫
-            backup_path = f"{Config.DB_PATH}.bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            import shutil
-            shutil.copy2(Config.DB_PATH, backup_path)
-            result["備份"] = f"數據庫已備份為 {backup_path}"
+            from services.backup_service import backup_engine
+            backup = backup_engine.backup(label="emergency_db_fix", db_path=Config.DB_PATH)
+            result["備份"] = f"數據庫已備份為 {backup['backup_file']}"
             
-            # 連接數據庫
+            # 通過版本化遷移修復結構
             conn = sqlite3.connect(Config.DB_PATH)
-            c = conn.cursor()
-            
-            # 檢查表結構
-            c.execute("PRAGMA table_info(checkin_records)")
-            columns = c.fetchall()
-            column_names = [col[1] for col in columns]
-            result["現有欄位"] = column_names
-            
-            # 檢查是否有 checkin_type 欄位
-            if "checkin_type" not in column_names:
-                # 添加 checkin_type 欄位
-                try:
-                    c.execute("ALTER TABLE checkin_records ADD COLUMN checkin_type TEXT DEFAULT '上班'")
-                    conn.commit()
-                    result["修改"] = "成功添加 checkin_type 欄位"
-                except sqlite3.OperationalError as e:
-                    if "duplicate column name" in str(e):
-                        result["修改"] = "欄位已存在，無需添加"
-                    else:
-                        raise
-            else:
-                result["修改"] = "欄位已存在，無需添加"
+            result["修復前版本"] = get_version(conn)
+            applied = migrate(conn)
+            result["修改"] = f"已應用遷移: {applied}" if applied else "結構已是最新版本，無需修改"
+            result["修復後版本"] = get_version(conn)
             
             # 驗證修改
-            c.execute("PRAGMA table_info(checkin_records)")
-            updated_columns = c.fetchall()
-            result["更新後欄位"] = [col[1] for col in updated_columns]
+            result["更新後欄位"] = [col[1] for col in conn.execute("PRAGMA table_info(checkin_records)")]
             
             # 關閉連接
             conn.close()
@@ -1019,37 +973,9 @@ def emergency_db_fix():
             # 創建新數據庫
             result["狀態"] = "數據庫不存在，創建新數據庫"
             conn = sqlite3.connect(Config.DB_PATH)
-            c = conn.cursor()
-            
-            # 建立打卡紀錄表格
-            c.execute('''
-                CREATE TABLE checkin_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    location TEXT,
-                    note TEXT,
-                    latitude REAL,
-                    longitude REAL,
-                    date TEXT NOT NULL,
-                    time TEXT NOT NULL,
-                    checkin_type TEXT DEFAULT '上班'
-                )
-            ''')
-            
-            # 建立群組訊息表格
-            c.execute('''
-                CREATE TABLE group_messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id TEXT NOT NULL,
-                    user_name TEXT NOT NULL,
-                    message TEXT,
-                    timestamp TEXT NOT NULL
-                )
-            ''')
-            
-            conn.commit()
+            migrate(conn)
             conn.close()
+            Database.reset_connections()
             result["創建"] = "數據庫和表格創建成功"
         
         # 測試記錄
@@ -3,6 +3,7 @@ import sqlite3
 from datetime import datetime, timedelta
 from config import Config
 from services.user_service import UserService
+from models import DailyAttendance, Schema
 import json
 
 logger = logging.getLogger(__name__)
@@ -68,6 +69,8 @@ class ApiService:
                 record_id = cursor.lastrowid
                 message = "打卡成功"
             
+            # 在同一事務中更新每日出勤摘要
+            DailyAttendance.refresh_day(conn, user_id, date)
             conn.commit()
             conn.close()
             
@@ -158,79 +161,22 @@ class ApiService:
             if not user_id:
                 return {"success": False, "error": "缺少用戶ID"}
             
-            # 設置月份範圍
             if not month:
                 month = datetime.now().strftime("%Y-%m")
             
-            start_date = f"{month}-01"
-            if month.endswith("12"):
-                next_year = str(int(month.split('-')[0]) + 1)
-                next_month = f"{next_year}-01"
-            else:
-                year = month.split('-')[0]
-                month_num = int(month.split('-')[1])
-                next_month = f"{year}-{month_num+1:02d}"
-            
-            end_date = f"{next_month}-01"
-            
-            # 連接數據庫
-            conn = sqlite3.connect(Config.DB_PATH)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 查詢該月的打卡記錄
-            cursor.execute(
-                """
-                SELECT date, checkin_type, time
-                FROM checkin_records 
-                WHERE user_id = ? AND date >= ? AND date < ? 
-                ORDER BY date, time
-                """,
-                (user_id, start_date, end_date)
-            )
-            
-            records = cursor.fetchall()
-            conn.close()
-            
-            # 處理統計數據
-            daily_records = {}
-            for record in records:
-                date = record["date"]
-                checkin_type = record["checkin_type"]
-                time = record["time"]
-                
-                if date not in daily_records:
-                    daily_records[date] = {"上班": None, "下班": None}
-                
-                daily_records[date][checkin_type] = time
-            
-            # 計算統計指標
-            total_days = len(daily_records)
-            on_time_days = 0
-            late_days = 0
-            no_checkin_days = 0
-            overtime_days = 0
-            
-            for date, times in daily_records.items():
-                if times["上班"] and times["下班"]:
-                    # 有上下班記錄，計算是否遲到和加班
-                    if times["上班"] <= "09:00:00":
-                        on_time_days += 1
-                    else:
-                        late_days += 1
-                    
-                    # 假設18:00為下班時間
-                    if times["下班"] >= "18:00:00":
-                        overtime_days += 1
-                elif not times["上班"] or not times["下班"]:
-                    no_checkin_days += 1
+            # 對每日出勤摘要做一次範圍聚合
+            Schema.ensure_ready()
+            start_date, end_date = DailyAttendance.month_range(month)
+            summary = DailyAttendance.get_month_summary(user_id, start_date, end_date)
+            daily_records = DailyAttendance.get_daily_records(user_id, start_date, end_date)
             
             statistics = {
-                "totalDays": total_days,
-                "onTimeDays": on_time_days,
-                "lateDays": late_days,
-                "noCheckinDays": no_checkin_days,
-                "overtimeDays": overtime_days,
+                "totalDays": summary["total_days"],
+                "onTimeDays": summary["on_time_days"],
+                "lateDays": summary["late_days"],
+                "noCheckinDays": summary["no_checkin_days"],
+                "overtimeDays": summary["overtime_days"],
+                "workedMinutes": summary["worked_minutes"],
                 "dailyRecords": daily_records
             }
             
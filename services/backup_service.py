@@ -0,0 +1,251 @@
+# services/backup_service.py
+"""
+數據庫在線備份
+
+使用 sqlite3 的 backup API 逐步複製頁面（每步 BACKUP_PAGES_PER_STEP 頁，每步完成後在 progress 回調中
+休眠 BACKUP_STEP_SLEEP 秒讓出 CPU 與磁盤；backup() 的 sleep 參數只在源數據庫忙碌時生效），
+備份期間在源連接上持有一個讀事務：WAL 模式下寫入不受阻塞，備份得到的是開始時刻的一致快照，
+不會像直接複製文件那樣得到寫到一半的數據庫，也不會因為併發寫入而反覆重新開始。
+
+備份完成後可選 gzip 壓縮，並通過「還原驗證」確認文件可用：把備份還原到臨時數據庫，
+執行 integrity_check 並核對各表行數與備份時的快照一致。保留策略取代原先固定保留 5 個的做法。
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from config import Config
+from models import Database
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = 'checkin_backup_'
+_BACKUP_NAME_RE = re.compile(r'^checkin_backup_(\d{8}_\d{6})(?:_[\w-]+)?\.db(?:\.gz)?$')
+
+
+class BackupEngine:
+    """SQLite 在線備份、驗證與保留策略"""
+
+    def __init__(self, backup_dir=None):
+        self._backup_dir = backup_dir
+        # 同一進程內同時只運行一個備份
+        self._lock = threading.Lock()
+
+    @property
+    def backup_dir(self):
+        return self._backup_dir or Config.BACKUP_DIR
+
+    # --- 備份 ---
+
+    @staticmethod
+    def _table_counts(conn):
+        """各用戶表的行數（用於驗證）"""
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+    def backup(self, label=None, compress=None, verify=True, db_path=None):
+        """
+        在線備份數據庫
+
+        Args:
+            label: 附加在文件名中的標籤，如 'emergency_reset'
+            compress: 是否 gzip 壓縮，默認 Config.BACKUP_COMPRESS
+            verify: 是否執行還原驗證
+            db_path: 要備份的數據庫，默認 Database.DB_PATH
+
+        Returns:
+            dict: 備份結果，包括 backup_file、size、pages、duration、verified
+        """
+        compress = Config.BACKUP_COMPRESS if compress is None else compress
+        db_path = db_path or Database.DB_PATH
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = "_" + re.sub(r'[^\w-]', '_', label) if label else ""
+        backup_file = os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{timestamp}{suffix}.db")
+        tmp_file = f"{backup_file}.tmp"
+
+        with self._lock:
+            started = time.monotonic()
+            progress = {"pages": 0, "steps": 0}
+
+            def on_progress(status, remaining, total):
+                progress["pages"] = total
+                progress["steps"] += 1
+                if remaining and Config.BACKUP_STEP_SLEEP > 0:
+                    time.sleep(Config.BACKUP_STEP_SLEEP)
+
+            source = Database._open_connection(db_path)
+            target = sqlite3.connect(tmp_file)
+            try:
+                # 持有讀事務：備份與計數都基於同一個快照
+                source.execute("BEGIN")
+                counts = self._table_counts(source)
+                source.backup(
+                    target,
+                    pages=Config.BACKUP_PAGES_PER_STEP,
+                    progress=on_progress
+                )
+                source.rollback()
+                # 備份文件獨立使用，不需要 WAL
+                target.execute("PRAGMA journal_mode=DELETE")
+            except Exception:
+                target.close()
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                raise
+            finally:
+                source.close()
+            target.close()
+
+            if compress:
+                with open(tmp_file, 'rb') as src, gzip.open(f"{backup_file}.gz.tmp", 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.remove(tmp_file)
+                tmp_file = f"{backup_file}.gz.tmp"
+                backup_file = f"{backup_file}.gz"
+            os.replace(tmp_file, backup_file)
+
+        result = {
+            "backup_file": backup_file,
+            "timestamp": timestamp,
+            "size": os.path.getsize(backup_file),
+            "pages": progress["pages"],
+            "steps": progress["steps"],
+            "duration": round(time.monotonic() - started, 3),
+            "compressed": bool(compress),
+            "tables": counts,
+        }
+        if verify:
+            result["verification"] = self.verify(backup_file, expected_counts=counts)
+            result["verified"] = result["verification"]["ok"]
+        logger.info(f"數據庫備份完成: {backup_file} ({result['size']} bytes, {result['duration']}s)")
+        return result
+
+    # --- 驗證 ---
+
+    def verify(self, backup_file, expected_counts=None):
+        """
+        還原驗證：把備份還原到臨時數據庫並檢查完整性
+
+        Args:
+            expected_counts: 備份時各表的行數，提供時逐表核對
+
+        Returns:
+            dict: {"ok", "integrity", "version", "tables", "mismatches"}
+        """
+        fd, restore_path = tempfile.mkstemp(suffix='.db', prefix='restore_verify_')
+        os.close(fd)
+        try:
+            if backup_file.endswith('.gz'):
+                with gzip.open(backup_file, 'rb') as src, open(restore_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                source = sqlite3.connect(restore_path)
+            else:
+                source = sqlite3.connect(f"file:{backup_file}?mode=ro", uri=True)
+
+            try:
+                if not backup_file.endswith('.gz'):
+                    # 通過 backup API 還原到臨時文件，與真正的還原步驟相同
+                    restored = sqlite3.connect(restore_path)
+                    source.backup(restored)
+                    source.close()
+                    source = restored
+                integrity = source.execute("PRAGMA integrity_check").fetchone()[0]
+                version = source.execute("PRAGMA user_version").fetchone()[0]
+                counts = self._table_counts(source)
+            finally:
+                source.close()
+        except sqlite3.Error as e:
+            return {"ok": False, "integrity": str(e), "version": None, "tables": {}, "mismatches": {}}
+        finally:
+            if os.path.exists(restore_path):
+                os.remove(restore_path)
+
+        mismatches = {}
+        for table, expected in (expected_counts or {}).items():
+            if counts.get(table) != expected:
+                mismatches[table] = {"expected": expected, "actual": counts.get(table)}
+
+        return {
+            "ok": integrity == 'ok' and not mismatches,
+            "integrity": integrity,
+            "version": version,
+            "tables": counts,
+            "mismatches": mismatches,
+        }
+
+    # --- 保留策略 ---
+
+    def list_backups(self):
+        """
+        列出備份文件（新的在前）
+
+        Returns:
+            list: [{"file", "path", "created", "size"}]
+        """
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            match = _BACKUP_NAME_RE.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.backup_dir, name)
+            backups.append({
+                "file": name,
+                "path": path,
+                "created": datetime.strptime(match.group(1), "%Y%m%d_%H%M%S"),
+                "size": os.path.getsize(path),
+            })
+        backups.sort(key=lambda backup: backup["created"], reverse=True)
+        return backups
+
+    def apply_retention(self, keep_last=None, keep_daily=None):
+        """
+        按保留策略刪除舊備份
+
+        保留最新的 keep_last 個備份，以及最近 keep_daily 天中每天最新的一個備份。
+
+        Returns:
+            dict: {"kept": [...], "removed": [...]}
+        """
+        keep_last = Config.BACKUP_KEEP_LAST if keep_last is None else keep_last
+        keep_daily = Config.BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+
+        backups = self.list_backups()
+        keep = {backup["file"] for backup in backups[:keep_last]}
+        days_seen = set()
+        for backup in backups:
+            day = backup["created"].date()
+            if day in days_seen:
+                continue
+            if len(days_seen) >= keep_daily:
+                break
+            days_seen.add(day)
+            keep.add(backup["file"])
+
+        removed = []
+        for backup in backups:
+            if backup["file"] in keep:
+                continue
+            try:
+                os.remove(backup["path"])
+                removed.append(backup["file"])
+            except OSError as e:
+                logger.error(f"刪除舊備份失敗 {backup['file']}: {str(e)}")
+
+        return {"kept": sorted(keep, reverse=True), "removed": removed}
+
+
+# 全局實例
+backup_engine = BackupEngine()
@@ -0,0 +1,128 @@
+# services/change_feed.py
+"""
+打卡記錄變更流
+
+checkin_records 上的觸發器把每次插入、更新與刪除寫入 checkin_changes，
+seq 單調遞增，作為下游（Google Sheets 同步、BI、備份）增量拉取的游標：
+消費者保存最後收到的 seq，下次以 since=seq 只讀取之後的變更。
+
+變更只保留 CHANGE_FEED_RETENTION_DAYS 天（prune 由領導者進程的排程線程每小時執行）。
+游標早於保留範圍時 cursor_expired 返回 True，消費者需要重新匯出全部記錄後從 latest_cursor 繼續。
+"""
+
+import json
+from config import Config
+from models import Database, Schema
+
+# 變更行中記錄的欄位（記錄已刪除時為空）
+RECORD_COLUMNS = [
+    'name', 'date', 'time', 'checkin_type', 'location',
+    'latitude', 'longitude', 'note', 'created_at', 'updated_at'
+]
+
+
+def latest_cursor(user_id=None):
+    """當前最大的變更序號（沒有變更時為 0）"""
+    Schema.ensure_ready()
+    if user_id:
+        row = Database.execute_query(
+            "SELECT COALESCE(MAX(seq), 0) FROM checkin_changes WHERE user_id = ?", (user_id,), 'one'
+        )
+    else:
+        row = Database.execute_query("SELECT COALESCE(MAX(seq), 0) FROM checkin_changes", None, 'one')
+    return row[0]
+
+
+def horizon():
+    """
+    已清理到的變更序號：seq 不大於此值的變更可能已被刪除
+
+    seq 由 AUTOINCREMENT 連續分配，清理總是刪除最舊的一段，因此為現存最小 seq 減一；
+    變更已全部清理時為最後分配的 seq。
+    """
+    row = Database.execute_query("SELECT MIN(seq) FROM checkin_changes", None, 'one')
+    if row and row[0] is not None:
+        return row[0] - 1
+    row = Database.execute_query(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'checkin_changes'", None, 'one'
+    )
+    return row[0] if row else 0
+
+
+def cursor_expired(since):
+    """游標之後的變更是否已有部分被清理（需要重新同步）"""
+    Schema.ensure_ready()
+    return since < horizon()
+
+
+def prune(retention_days=None):
+    """
+    刪除超過保留天數的變更
+
+    changed_at 隨 seq 遞增，從最舊的變更開始找到第一條仍在保留期內的變更，刪除其之前的全部變更。
+
+    Returns:
+        int: 刪除的行數
+    """
+    Schema.ensure_ready()
+    days = Config.CHANGE_FEED_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = f"-{int(days)} days"
+    row = Database.execute_query(
+        "SELECT seq FROM checkin_changes WHERE changed_at >= datetime('now', ?) ORDER BY seq LIMIT 1",
+        (cutoff,), 'one'
+    )
+    if row:
+        return Database.execute_query("DELETE FROM checkin_changes WHERE seq < ?", (row[0],))
+    return Database.execute_query("DELETE FROM checkin_changes")
+
+
+def iter_changes(since=0, limit=None, user_id=None, chunk_size=None):
+    """
+    分批讀取 seq 大於 since 的變更
+
+    同一條記錄的多次變更都會出現，每行攜帶記錄的當前狀態，下游按 id 冪等地覆蓋即可。
+
+    Yields:
+        list: 每批的變更字典
+    """
+    Schema.ensure_ready()
+    limit = min(limit or Config.CHANGE_FEED_LIMIT, Config.CHANGE_FEED_MAX_LIMIT)
+    record_columns = ", ".join(f"r.{column}" for column in RECORD_COLUMNS)
+    query = f'''
+        SELECT c.seq, c.op, c.record_id, c.user_id, c.changed_at, r.id, {record_columns}
+        FROM checkin_changes c
+        LEFT JOIN checkin_records r ON r.id = c.record_id
+        WHERE c.seq > ?{" AND c.user_id = ?" if user_id else ""}
+        ORDER BY c.seq
+        LIMIT ?
+    '''
+    params = (since, user_id, limit) if user_id else (since, limit)
+
+    for rows in Database.iter_query(query, params, chunk_size or Config.EXPORT_CHUNK_SIZE):
+        changes = []
+        for row in rows:
+            seq, op, record_id, owner, changed_at, current_id = row[:6]
+            change = {"seq": seq, "id": record_id, "user_id": owner, "changed_at": changed_at}
+            if current_id is None:
+                # 記錄已被刪除（包括之後才刪除的），只返回刪除事件
+                change["op"] = "delete"
+            else:
+                change["op"] = op
+                change["record"] = dict(zip(RECORD_COLUMNS, row[6:]))
+            changes.append(change)
+        yield changes
+
+
+def ndjson_changes(since=0, limit=None, user_id=None):
+    """
+    以 NDJSON 輸出變更，最後一行為游標：
+    {"cursor": 下次請求的 since, "count": 本次變更數, "has_more": 是否還有更多}
+    """
+    limit = min(limit or Config.CHANGE_FEED_LIMIT, Config.CHANGE_FEED_MAX_LIMIT)
+    cursor = since
+    count = 0
+    for changes in iter_changes(since, limit, user_id):
+        cursor = changes[-1]["seq"]
+        count += len(changes)
+        yield "".join(json.dumps(change, ensure_ascii=False) + "\n" for change in changes)
+    yield json.dumps({"cursor": cursor, "count": count, "has_more": count >= limit}) + "\n"
@@ -2,7 +2,7 @@
 from datetime import datetime, timedelta
 from utils.timezone import get_current_time, get_date_string, get_time_string, get_datetime_string
 from utils.timezone import get_current_time, get_date_string, get_time_string, get_datetime_string
-from models import CheckinRecord, User
+from models import CheckinRecord, User, Database, Schema
 
 def process_checkin(user_id, name, location, note=None, latitude=None, longitude=None, checkin_type="上班"):
     """
@@ -24,25 +24,14 @@ def process_checkin(user_id, name, location, note=None, latitude=None, longitude
             - timestamp: 打卡時間戳
     """
     try:
-        # 保存用戶信息
-        User.create_or_update(user_id, {'name': name, 'display_name': name})
-
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
+        
         # 取得當前日期和時間
         today = get_date_string()
         time_str = get_time_string()
         timestamp = get_datetime_string()
         
-        # 檢查是否已有相同類型的打卡記錄
-        if CheckinRecord.has_checkin_today(user_id, checkin_type, today):
-            return False, f"今天已經{checkin_type}打卡過了", timestamp
-        
-        # 如果是下班打卡，檢查今天是否已經有上班打卡
-        if checkin_type == "下班" and not CheckinRecord.has_checkin_today(user_id, "上班", today):
-            return False, "請先完成上班打卡，才能進行下班打卡", timestamp
-            
-        # 確保數據表存在
-        CheckinRecord.create_table_if_not_exists()
-        
         # 準備打卡數據
         checkin_data = {
             'user_id': user_id,
@@ -56,14 +45,20 @@ def process_checkin(user_id, name, location, note=None, latitude=None, longitude
             'checkin_type': checkin_type
         }
         
-        # 插入打卡記錄
-        record = CheckinRecord.create_or_update(checkin_data)
+        # 在同一個事務中保存用戶信息並寫入打卡記錄；
+        # 重複打卡與「先上班後下班」的順序由 checkin_once 在插入語句中判斷
+        with Database.transaction():
+            User.upsert(user_id, name, name)
+            status = CheckinRecord.checkin_once(checkin_data)
+        
+        if status == CheckinRecord.CHECKIN_DUPLICATE:
+            return False, f"今天已經{checkin_type}打卡過了", timestamp
+        
+        if status == CheckinRecord.CHECKIN_OUT_OF_ORDER:
+            return False, "請先完成上班打卡，才能進行下班打卡", timestamp
         
-        if record:
-            print(f"打卡成功: 用戶={name}, 類型={checkin_type}, 時間={timestamp}")
-            return True, f"{checkin_type}打卡成功", timestamp
-        else:
-            return False, "數據庫操作失敗，請稍後再試", timestamp
+        print(f"打卡成功: 用戶={name}, 類型={checkin_type}, 時間={timestamp}")
+        return True, f"{checkin_type}打卡成功", timestamp
             
     except Exception as e:
         print(f"打卡過程錯誤: {str(e)}")
@@ -118,8 +113,8 @@ def record_checkin(user_id, checkin_data):
         記錄ID或None（失敗時）
     """
     try:
-        # 確保數據表存在
-        CheckinRecord.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
         
         # 獲取當前日期
         current_date = datetime.now().strftime('%Y-%m-%d')
@@ -156,8 +151,8 @@ def get_user_records(user_id, start_date=None, end_date=None, limit=30):
         簽到記錄列表
     """
     try:
-        # 確保數據表存在
-        CheckinRecord.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
         
         # 獲取記錄
         records = CheckinRecord.get_user_records(user_id, start_date, end_date, limit)
@@ -179,8 +174,8 @@ def get_today_records(date=None):
         簽到記錄列表
     """
     try:
-        # 確保數據表存在
-        CheckinRecord.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
         
         # 如果未提供日期，使用今天
         if not date:
@@ -207,8 +202,8 @@ def get_checkin_statistics(user_id, month=None):
         統計信息字典
     """
     try:
-        # 確保數據表存在
-        CheckinRecord.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
         
         # 獲取統計信息
         stats = CheckinRecord.get_statistics(user_id, month)
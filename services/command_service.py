@@ -8,7 +8,7 @@ from services.checkin_service import quick_checkin
 from services.vocabulary_service import get_daily_words, format_daily_words
 from services.user_service import UserService
 from utils.timezone import get_date_string
-from models import ReminderSetting
+from models import ReminderSetting, DailyAttendance, Schema
 import sqlite3
 
 logger = logging.getLogger(__name__)
@@ -274,7 +274,25 @@ class CommandService:
             return 'OK'
             
         report_url = f"{Config.APP_URL}/personal-history?userId={user_id}"
-        send_reply(reply_token, f"📊 您的打卡報表：\n{report_url}")
+        
+        # 本月統計直接讀取每日出勤摘要的範圍聚合
+        try:
+            Schema.ensure_ready()
+            start_date, end_date = DailyAttendance.month_range()
+            stats = DailyAttendance.get_month_summary(user_id, start_date, end_date)
+            hours, minutes = divmod(stats["worked_minutes"], 60)
+            summary = (
+                f"📊 本月打卡統計（{start_date[:7]}）\n"
+                f"打卡天數: {stats['total_days']} 天\n"
+                f"準時: {stats['on_time_days']} 天 / 遲到: {stats['late_days']} 天\n"
+                f"加班: {stats['overtime_days']} 天 / 未完成打卡: {stats['no_checkin_days']} 天\n"
+                f"累計工時: {hours} 小時 {minutes} 分\n\n"
+            )
+        except Exception as e:
+            logger.error(f"獲取打卡統計時出錯: {str(e)}")
+            summary = ""
+        
+        send_reply(reply_token, f"{summary}📊 您的打卡報表：\n{report_url}")
         return 'OK'
     
     @staticmethod
@@ -0,0 +1,251 @@
+# services/event_queue.py
+"""
+Webhook 事件隊列
+
+webhook 只負責把事件放入隊列並立即返回，事件由後台線程池處理。
+每個線程有自己的有界隊列，同一用戶（或群組）的事件總是分配到同一個線程，
+因此同一用戶的「上班」一定在「下班」之前處理。
+"""
+
+import atexit
+import itertools
+import logging
+import queue
+import threading
+import time
+import traceback
+import zlib
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 通知線程退出的哨兵
+_STOP = object()
+
+
+class EventQueue:
+    """有界、按用戶保序的事件處理線程池"""
+
+    def __init__(self, handler=None, workers=None, maxsize=None, name='event'):
+        """
+        Args:
+            handler: 處理單個事件的函數，默認為 EventService.process_event
+            workers: 線程數，0 表示不使用隊列、直接同步處理
+            maxsize: 所有線程隊列的總容量
+            name: 線程名前綴
+        """
+        self._handler = handler
+        self.workers = Config.EVENT_WORKERS if workers is None else workers
+        self.maxsize = Config.EVENT_QUEUE_SIZE if maxsize is None else maxsize
+        self.name = name
+
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()  # next() 在多個提交線程之間是原子的
+        self.is_running = False
+        self.accepting = False
+        self._closed = False
+
+        # 背壓指標
+        self._metrics = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_depth": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_process_ms": 0.0,
+            "max_process_ms": 0.0,
+        }
+
+    @property
+    def handler(self):
+        if self._handler is None:
+            from services.event_service import EventService
+            self._handler = EventService.process_event
+        return self._handler
+
+    def start(self):
+        """啟動處理線程（重複調用無副作用）"""
+        with self._lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            self.accepting = True
+
+            if self.workers <= 0:
+                logger.info(f"[{self.name}] 事件隊列已禁用，事件將同步處理")
+                return
+
+            per_worker = max(1, self.maxsize // self.workers)
+            self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+            self._threads = []
+            for index, q in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._run, args=(q,), name=f"{self.name}-worker-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        atexit.register(self.shutdown)
+        logger.info(f"[{self.name}] 事件隊列已啟動: {self.workers} 個線程，容量 {self.maxsize}")
+
+    @staticmethod
+    def ordering_key(event):
+        """決定事件分配到哪個線程：同一用戶/群組的事件使用相同的鍵"""
+        source = event.get('source', {}) if isinstance(event, dict) else {}
+        return source.get('userId') or source.get('groupId') or source.get('roomId')
+
+    def _shard(self, key):
+        if key is None:
+            return self._queues[next(self._round_robin) % len(self._queues)]
+        return self._queues[zlib.crc32(key.encode('utf-8')) % len(self._queues)]
+
+    def submit(self, event):
+        """
+        放入事件，不阻塞
+
+        Returns:
+            bool: 是否成功放入；隊列已滿或已關閉時返回 False
+        """
+        if not self.is_running and not self._closed:
+            self.start()
+
+        if not self.accepting:
+            self._count("rejected")
+            logger.warning(f"[{self.name}] 隊列正在關閉，拒絕事件")
+            return False
+
+        if self.workers <= 0:
+            self._count("submitted")
+            self._process(event, time.monotonic())
+            return True
+
+        q = self._shard(self.ordering_key(event))
+        try:
+            q.put_nowait((event, time.monotonic()))
+        except queue.Full:
+            self._count("rejected")
+            logger.error(f"[{self.name}] 隊列已滿，丟棄事件: type={event.get('type')}")
+            return False
+
+        with self._lock:
+            self._metrics["submitted"] += 1
+            depth = q.qsize()
+            if depth > self._metrics["max_depth"]:
+                self._metrics["max_depth"] = depth
+        return True
+
+    def submit_many(self, events):
+        """
+        按順序放入多個事件
+
+        Returns:
+            int: 成功放入的事件數
+        """
+        return sum(1 for event in events if self.submit(event))
+
+    def _count(self, key):
+        with self._lock:
+            self._metrics[key] += 1
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            try:
+                if item is _STOP:
+                    return
+                event, enqueued_at = item
+                self._process(event, enqueued_at)
+            finally:
+                q.task_done()
+
+    def _process(self, event, enqueued_at):
+        started = time.monotonic()
+        ok = True
+        try:
+            self.handler(event)
+        except Exception as e:
+            ok = False
+            logger.error(f"[{self.name}] 處理事件出錯: {str(e)}")
+            logger.debug(traceback.format_exc())
+
+        finished = time.monotonic()
+        wait_ms = (started - enqueued_at) * 1000
+        process_ms = (finished - started) * 1000
+        with self._lock:
+            self._metrics["processed" if ok else "failed"] += 1
+            self._metrics["total_wait_ms"] += wait_ms
+            self._metrics["total_process_ms"] += process_ms
+            self._metrics["max_wait_ms"] = max(self._metrics["max_wait_ms"], wait_ms)
+            self._metrics["max_process_ms"] = max(self._metrics["max_process_ms"], process_ms)
+
+    def stats(self):
+        """返回背壓指標：隊列深度、吞吐、拒絕數與等待/處理耗時"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        done = metrics["processed"] + metrics["failed"]
+        depths = [q.qsize() for q in self._queues]
+
+        return {
+            "running": self.is_running,
+            "accepting": self.accepting,
+            "workers": self.workers,
+            "capacity": self.maxsize,
+            "depth": sum(depths),
+            "depth_per_worker": depths,
+            "max_depth": metrics["max_depth"],
+            "submitted": metrics["submitted"],
+            "processed": metrics["processed"],
+            "failed": metrics["failed"],
+            "rejected": metrics["rejected"],
+            "avg_wait_ms": round(metrics["total_wait_ms"] / done, 2) if done else 0.0,
+            "max_wait_ms": round(metrics["max_wait_ms"], 2),
+            "avg_process_ms": round(metrics["total_process_ms"] / done, 2) if done else 0.0,
+            "max_process_ms": round(metrics["max_process_ms"], 2),
+        }
+
+    def shutdown(self, timeout=None):
+        """
+        優雅關閉：停止接收新事件，等待已排隊的事件處理完畢
+
+        Args:
+            timeout: 等待秒數，默認為 Config.EVENT_DRAIN_TIMEOUT
+
+        Returns:
+            int: 超時後仍未處理的事件數
+        """
+        with self._lock:
+            if not self.is_running:
+                return 0
+            self.accepting = False
+            self.is_running = False
+            self._closed = True
+
+        timeout = Config.EVENT_DRAIN_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        for q in self._queues:
+            # 哨兵排在已有事件之後，線程處理完隊列才會退出
+            try:
+                q.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        remaining = 0
+        for q in self._queues:
+            with q.mutex:
+                remaining += sum(1 for item in q.queue if item is not _STOP)
+        if remaining:
+            logger.warning(f"[{self.name}] 關閉超時，仍有 {remaining} 個事件未處理")
+        else:
+            logger.info(f"[{self.name}] 事件隊列已清空並關閉")
+        return remaining
+
+
+# 全局實例
+event_queue = EventQueue()
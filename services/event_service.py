@@ -3,6 +3,7 @@ import traceback
 from services.notification_service import send_reply
 from services.group_service import save_group_message
 from services.command_service import CommandService
+from services.profile_cache import profile_cache
 
 logger = logging.getLogger(__name__)
 
@@ -97,6 +98,10 @@ class EventService:
         reply_token = event.get('replyToken')
         user_id = event.get('source', {}).get('userId')
         
+        # 用戶重新加入時資料可能已改變，使緩存失效並在後台重新獲取
+        if user_id:
+            profile_cache.invalidate(user_id)
+        
         if reply_token and user_id:
             welcome_message = (
                 "👋 感謝您加入打卡系統！\n\n"
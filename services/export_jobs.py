@@ -0,0 +1,312 @@
+# services/export_jobs.py
+"""
+後台匯出任務
+
+- POST /export/jobs 創建任務後立即返回，文件由後台線程池生成，不佔用請求線程
+- 任務狀態與進度存於 export_jobs 表；任務由一個 worker 進程原子地認領並定期刷新心跳，
+  心跳過期（執行的進程已退出）的任務才會重新排隊
+- 生成的文件按內容地址緩存：鍵由 (用戶, 日期範圍, 格式, 分組, 數據版本) 計算，
+  數據未變時相同的匯出直接返回已有文件
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from config import Config
+from models import ExportJob, Schema
+from services.event_queue import EventQueue
+from services.export_service import (
+    write_checkin_workbook,
+    write_checkin_pdf,
+    XLSXWRITER_AVAILABLE,
+    REPORTLAB_AVAILABLE
+)
+from services.export_stream import (
+    iter_checkin_chunks,
+    csv_stream,
+    ndjson_stream,
+    count_checkins,
+    data_version
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 匯出範圍：單個用戶或全體用戶
+SCOPE_USER = 'user'
+SCOPE_ORGANIZATION = 'organization'
+SCOPES = (SCOPE_USER, SCOPE_ORGANIZATION)
+
+
+def _all_users(spec):
+    """匯出參數是否為全體用戶（舊任務沒有 scope，按單個用戶處理）"""
+    return spec.get("scope") == SCOPE_ORGANIZATION
+
+
+def _write_text(stream_func):
+    """把 CSV/NDJSON 流寫入文件的寫入函數"""
+    def write(path, spec, progress=None):
+        total = 0
+
+        def counted():
+            nonlocal total
+            for rows in iter_checkin_chunks(spec["user_id"], spec["date_from"], spec["date_to"],
+                                            all_users=_all_users(spec)):
+                total += len(rows)
+                yield rows
+                if progress:
+                    progress(total)
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for piece in stream_func(counted()):
+                f.write(piece)
+        return total
+    return write
+
+
+def _write_excel(path, spec, progress=None):
+    return write_checkin_workbook(
+        path, spec["user_id"], spec["date_from"], spec["date_to"], spec.get("group_by"), progress=progress,
+        all_users=_all_users(spec)
+    )
+
+
+def _write_pdf(path, spec, progress=None):
+    return write_checkin_pdf(
+        path, spec["user_id"], spec["date_from"], spec["date_to"], progress=progress, all_users=_all_users(spec)
+    )
+
+
+# 支持的格式：副檔名、MIME 類型、寫入函數、依賴是否可用
+FORMATS = {
+    'excel': {
+        'ext': 'xlsx',
+        'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'writer': _write_excel,
+        'available': XLSXWRITER_AVAILABLE
+    },
+    'pdf': {'ext': 'pdf', 'mimetype': 'application/pdf', 'writer': _write_pdf, 'available': REPORTLAB_AVAILABLE},
+    'csv': {'ext': 'csv', 'mimetype': 'text/csv', 'writer': _write_text(csv_stream), 'available': True},
+    'ndjson': {
+        'ext': 'ndjson',
+        'mimetype': 'application/x-ndjson',
+        'writer': _write_text(ndjson_stream),
+        'available': True
+    },
+}
+
+
+def make_spec(user_id=None, date_from=None, date_to=None, group_by=None, scope=SCOPE_USER):
+    """
+    匯出參數
+
+    Args:
+        user_id: scope 為 'user' 時必須提供，只匯出該用戶的記錄
+        scope: 'user' 或 'organization'；全體用戶必須明確指定 'organization'，
+            只應由已檢查管理員權限的路由使用
+
+    Raises:
+        ValueError: scope 不支持，或 scope 為 'user' 但缺少 user_id
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"不支持的匯出範圍: {scope}")
+    if scope == SCOPE_USER and not user_id:
+        raise ValueError("缺少 user_id")
+    if scope == SCOPE_ORGANIZATION:
+        user_id = None
+    return {"scope": scope, "user_id": user_id, "date_from": date_from, "date_to": date_to, "group_by": group_by}
+
+
+class ExportJobManager:
+    """匯出任務的排隊、執行與文件緩存"""
+
+    def __init__(self, workers=None, maxsize=None):
+        self._queue = EventQueue(
+            handler=self._handle,
+            workers=Config.EXPORT_WORKERS if workers is None else workers,
+            maxsize=Config.EXPORT_QUEUE_SIZE if maxsize is None else maxsize,
+            name='export'
+        )
+        self._lock = threading.Lock()
+        self._last_recover = 0.0
+        # 認領任務時寫入 export_jobs.owner，用來區分各個 worker 進程
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_prune = 0.0
+
+    # --- 文件緩存 ---
+
+    @staticmethod
+    def artifact_dir():
+        return os.path.join(Config.EXPORT_DIR, 'artifacts')
+
+    @staticmethod
+    def cache_key(export_format, spec):
+        """內容地址：匯出參數加上當前數據版本的 SHA-256"""
+        payload = {
+            "format": export_format,
+            **spec,
+            "version": data_version(spec["user_id"], spec["date_from"], spec["date_to"], _all_users(spec)),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def artifact_path(self, cache_key, export_format):
+        return os.path.join(self.artifact_dir(), f"{cache_key}.{FORMATS[export_format]['ext']}")
+
+    def cached_artifact(self, export_format, spec):
+        """
+        已生成且數據未變的文件
+
+        Returns:
+            tuple: (cache_key, 文件路徑或 None)
+        """
+        key = self.cache_key(export_format, spec)
+        path = self.artifact_path(key, export_format)
+        return key, (path if os.path.exists(path) else None)
+
+    def build(self, export_format, spec, progress=None):
+        """
+        生成文件（已緩存時直接返回）
+
+        先寫入臨時文件再原子地重命名，並發生成同一文件時不會讀到半成品。
+
+        Returns:
+            tuple: (cache_key, 文件路徑；沒有記錄時為 None)
+        """
+        key, path = self.cached_artifact(export_format, spec)
+        if path:
+            return key, path
+
+        path = self.artifact_path(key, export_format)
+        os.makedirs(self.artifact_dir(), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            count = FORMATS[export_format]['writer'](tmp_path, spec, progress)
+            if not count:
+                return key, None
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.prune()
+        return key, path
+
+    def prune(self):
+        """刪除超過 EXPORT_ARTIFACT_TTL 的文件與已結束的任務記錄（最多每小時一次）"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < 3600:
+                return
+            self._last_prune = now
+
+        ttl = Config.EXPORT_ARTIFACT_TTL
+        try:
+            for name in os.listdir(self.artifact_dir()):
+                path = os.path.join(self.artifact_dir(), name)
+                if now - os.path.getmtime(path) > ttl:
+                    os.remove(path)
+            cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now - ttl))
+            ExportJob.delete_finished_before(cutoff)
+        except Exception as e:
+            logger.error(f"清理匯出文件失敗: {str(e)}")
+
+    # --- 任務 ---
+
+    def _recover(self):
+        """
+        把心跳過期的任務重新排隊（每 EXPORT_JOB_STALE_SECONDS 最多一次）
+
+        其他 worker 進程正在生成的任務會持續刷新心跳，不會被重新排隊。
+        """
+        now = time.time()
+        stale = Config.EXPORT_JOB_STALE_SECONDS
+        with self._lock:
+            if now - self._last_recover < stale:
+                return
+            self._last_recover = now
+        cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now - stale))
+        for job in ExportJob.requeue_stale(cutoff):
+            logger.info(f"重新排隊匯出任務 {job['id']}")
+            self._enqueue(job, recovered=True)
+
+    def _enqueue(self, job, recovered=False):
+        if not self._queue.submit({'source': {'userId': job['requested_by']}, 'job_id': job['id']}):
+            # 重新排隊的任務保持 queued，下次恢復時再試；新任務直接失敗並告知用戶
+            if not recovered:
+                ExportJob.finish(job['id'], ExportJob.FAILED, error="匯出隊列已滿，請稍後再試")
+            return False
+        return True
+
+    def submit(self, requested_by, export_format, spec):
+        """
+        創建匯出任務
+
+        文件已緩存時任務直接以 done 狀態創建；否則放入隊列由後台線程生成。
+
+        Returns:
+            dict: 任務
+        """
+        if export_format not in FORMATS:
+            raise ValueError(f"不支持的匯出格式: {export_format}")
+        if not FORMATS[export_format]['available']:
+            raise RuntimeError(f"{export_format} 匯出所需的庫未安裝")
+
+        Schema.ensure_ready()
+        self._recover()
+
+        key, path = self.cached_artifact(export_format, spec)
+        if path:
+            return ExportJob.create(
+                requested_by, export_format, spec, status=ExportJob.DONE,
+                cache_key=key, artifact=os.path.basename(path)
+            )
+
+        job = ExportJob.create(requested_by, export_format, spec, cache_key=key)
+        self._enqueue(job)
+        return ExportJob.get(job['id'])
+
+    def _handle(self, event):
+        job_id = event['job_id']
+        # 只有把任務從 queued 改為 running 的進程繼續，其他進程（或重複的隊列項）直接跳過
+        if not ExportJob.claim(job_id, self.owner):
+            return
+
+        job = ExportJob.get(job_id)
+        spec = job['params']
+        owner = self.owner
+        try:
+            ExportJob.set_total(job_id, owner, count_checkins(
+                spec["user_id"], spec["date_from"], spec["date_to"], _all_users(spec)
+            ))
+            key, path = self.build(job['format'], spec, progress=lambda n: ExportJob.set_progress(job_id, owner, n))
+            if path:
+                ExportJob.finish(job_id, ExportJob.DONE, owner, cache_key=key, artifact=os.path.basename(path))
+            else:
+                ExportJob.finish(job_id, ExportJob.EMPTY, owner, cache_key=key)
+        except Exception as e:
+            logger.error(f"匯出任務 {job_id} 失敗: {str(e)}")
+            ExportJob.finish(job_id, ExportJob.FAILED, owner, error=str(e))
+
+    def get(self, job_id):
+        """獲取任務，不存在時返回 None"""
+        Schema.ensure_ready()
+        return ExportJob.get(job_id)
+
+    def file_for(self, job):
+        """已完成任務的文件路徑，文件已被清理時返回 None"""
+        if not job or job['status'] != ExportJob.DONE or not job.get('artifact'):
+            return None
+        path = os.path.join(self.artifact_dir(), os.path.basename(job['artifact']))
+        return path if os.path.exists(path) else None
+
+    def stats(self):
+        return self._queue.stats()
+
+
+# 全局實例
+export_jobs = ExportJobManager()
@@ -1,182 +1,320 @@
 # services/export_service.py
-import pandas as pd
 from datetime import datetime
 import os
+import re
 import sqlite3
 import io
+import threading
 from config import Config
+from services.export_stream import iter_checkin_chunks, peek
 from flask import current_app
 import time
 import json
 
+# 嘗試導入 xlsxwriter，如果失敗則設置標誌
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+    print("Warning: xlsxwriter not available. Excel export will be disabled.")
+
 # 嘗試導入 reportlab，如果失敗則設置標誌
 try:
     from reportlab.lib.pagesizes import letter, A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.lib import colors
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.pdfbase.ttfonts import TTFont
     REPORTLAB_AVAILABLE = True
 except ImportError:
     REPORTLAB_AVAILABLE = False
     print("Warning: ReportLab not available. PDF export will be disabled.")
 
-# 嘗試導入 Google API 相關包，如果失敗則設置標誌
-try:
-    from googleapiclient.discovery import build
-    from google.oauth2 import service_account
-    GOOGLE_API_AVAILABLE = True
-except ImportError:
-    GOOGLE_API_AVAILABLE = False
-    print("Warning: Google API packages not available. Google Sheets export will be disabled.")
+# Google Sheets 匯出由 services.sheets_sink 負責
+from services.sheets_sink import GOOGLE_API_AVAILABLE
 
-# 原有的 Excel 導出功能
-def export_checkin_records_to_excel(user_id, date_from=None, date_to=None):
-    # 從數據庫獲取打卡記錄
-    conn = sqlite3.connect(Config.DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    query_params = [user_id]
-    query = '''
-        SELECT cr.id, cr.user_id, cr.name, cr.location, cr.note, 
-               cr.latitude, cr.longitude, cr.date, cr.time, cr.checkin_type
-        FROM checkin_records cr
-        WHERE cr.user_id = ?
-    '''
-    
-    if date_from:
-        query += ' AND cr.date >= ?'
-        query_params.append(date_from)
-    
-    if date_to:
-        query += ' AND cr.date <= ?'
-        query_params.append(date_to)
-    
-    query += ' ORDER BY cr.date DESC, cr.time DESC'
-    
-    c.execute(query, query_params)
-    results = c.fetchall()
-    conn.close()
-    
-    if not results:
+# Excel 欄位（按此順序輸出）與表頭
+EXCEL_COLUMNS = [
+    ('id', '序號'),
+    ('user_id', '用戶ID'),
+    ('name', '姓名'),
+    ('location', '位置'),
+    ('note', '備註'),
+    ('latitude', '緯度'),
+    ('longitude', '經度'),
+    ('date', '日期'),
+    ('time', '時間'),
+    ('checkin_type', '打卡類型')
+]
+
+# 多工作表匯出的分組方式：分組鍵的 SQL 表達式
+EXCEL_GROUP_KEYS = {
+    'user': "user_id",
+    'month': "substr(date, 1, 7)"
+}
+
+_SHEET_NAME_INVALID = re.compile(r'[\[\]:*?/\\]')
+
+
+def _sheet_name(label, used):
+    """生成合法且不重複的工作表名稱（最多 31 個字符）"""
+    base = _SHEET_NAME_INVALID.sub('_', str(label or '未命名')).strip("'")[:31] or '未命名'
+    name = base
+    counter = 2
+    while name.lower() in used:
+        suffix = f"_{counter}"
+        name = base[:31 - len(suffix)] + suffix
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+def _new_sheet(workbook, name, header_format):
+    worksheet = workbook.add_worksheet(name)
+    for col, (_, label) in enumerate(EXCEL_COLUMNS):
+        worksheet.write(0, col, label, header_format)
+    worksheet.freeze_panes(1, 0)
+    return worksheet
+
+
+def write_checkin_workbook(output, user_id=None, date_from=None, date_to=None, group_by=None, progress=None,
+                           all_users=False):
+    """
+    以 xlsxwriter 的 constant_memory 模式把打卡記錄直接從游標寫入 Excel
+
+    每一行寫入後立即刷到臨時文件，內存中只保留一批記錄。
+
+    Args:
+        output: 文件路徑或可寫的二進制文件對象
+        user_id: 只匯出該用戶
+        group_by: None 表示單個工作表；'user' 或 'month' 表示每個用戶/每月一個工作表
+        progress: 可選的回調，每寫完一批以已寫入的記錄數調用
+        all_users: 匯出全部用戶（僅供管理員的全體匯出使用）
+
+    Returns:
+        int: 寫入的記錄數
+    """
+    if group_by and group_by not in EXCEL_GROUP_KEYS:
+        raise ValueError(f"不支持的分組方式: {group_by}")
+
+    columns = [column for column, _ in EXCEL_COLUMNS]
+    if group_by:
+        # constant_memory 模式下每個工作表必須按行順序寫入，因此按分組鍵排序後逐個工作表寫完
+        key_expr = EXCEL_GROUP_KEYS[group_by]
+        query_columns = columns + [f"{key_expr} AS sheet_key"]
+        order_by = f"{key_expr}, date, time"
+    else:
+        query_columns = columns
+        order_by = "date DESC, time DESC"
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9D9D9'})
+    used_names = set()
+    worksheet = None
+    current_key = object()
+    row_index = 0
+    total = 0
+
+    try:
+        for rows in iter_checkin_chunks(user_id, date_from, date_to, columns=query_columns, order_by=order_by,
+                                        all_users=all_users):
+            for row in rows:
+                if group_by and row[-1] != current_key:
+                    current_key = row[-1]
+                    # 按用戶分組時以姓名命名工作表
+                    label = row[2] if group_by == 'user' else current_key
+                    worksheet = _new_sheet(workbook, _sheet_name(label, used_names), header_format)
+                    row_index = 1
+                elif worksheet is None:
+                    worksheet = _new_sheet(workbook, '打卡記錄', header_format)
+                    row_index = 1
+                worksheet.write_row(row_index, 0, row[:len(columns)])
+                row_index += 1
+                total += 1
+            if progress:
+                progress(total)
+
+        if worksheet is None:
+            _new_sheet(workbook, '打卡記錄', header_format)
+    finally:
+        workbook.close()
+    return total
+
+
+def export_checkin_records_to_excel(user_id, date_from=None, date_to=None, group_by=None):
+    """
+    匯出打卡記錄為 Excel
+
+    Returns:
+        io.BytesIO: Excel 文件；沒有記錄或 xlsxwriter 不可用時返回 None
+    """
+    if not XLSXWRITER_AVAILABLE:
         return None
-    
-    # 將結果轉換為 DataFrame
-    records = []
-    for row in results:
-        record = {}
-        for key in row.keys():
-            record[key] = row[key]
-        records.append(record)
-    
-    df = pd.DataFrame(records)
-    
-    # 重命名欄位
-    column_mapping = {
-        'id': '序號',
-        'user_id': '用戶ID',
-        'name': '姓名',
-        'location': '位置',
-        'note': '備註',
-        'latitude': '緯度',
-        'longitude': '經度',
-        'date': '日期',
-        'time': '時間',
-        'checkin_type': '打卡類型'
-    }
-    df = df.rename(columns=column_mapping)
-    
-    # 創建 Excel 文件
+
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='打卡記錄', index=False)
-    
+    if write_checkin_workbook(output, user_id, date_from, date_to, group_by) == 0:
+        return None
+
     output.seek(0)
     return output
 
-# 新增 PDF 導出功能
+# PDF 欄位（按此順序輸出）與表頭
+PDF_COLUMNS = [
+    ('id', '序號'),
+    ('name', '姓名'),
+    ('location', '位置'),
+    ('note', '備註'),
+    ('date', '日期'),
+    ('time', '時間'),
+    ('checkin_type', '打卡類型')
+]
+
+# reportlab 內建的繁體中文 CID 字體，無需字體文件
+_PDF_CID_FONT = 'MSung-Light'
+_pdf_font_name = None
+_pdf_font_lock = threading.Lock()
+
+
+def _pdf_font():
+    """
+    註冊並返回 PDF 使用的中文字體名稱（每個進程只註冊一次）
+
+    設置 PDF_FONT_PATH 時使用該 TrueType 字體，否則使用內建的 CID 字體。
+    """
+    global _pdf_font_name
+    if _pdf_font_name:
+        return _pdf_font_name
+
+    with _pdf_font_lock:
+        if _pdf_font_name:
+            return _pdf_font_name
+        font_path = Config.PDF_FONT_PATH
+        try:
+            if font_path:
+                pdfmetrics.registerFont(TTFont('CheckinCJK', font_path))
+                _pdf_font_name = 'CheckinCJK'
+            else:
+                pdfmetrics.registerFont(UnicodeCIDFont(_PDF_CID_FONT))
+                _pdf_font_name = _PDF_CID_FONT
+        except Exception as e:
+            print(f"Warning: 註冊 PDF 中文字體失敗，改用 Helvetica: {str(e)}")
+            _pdf_font_name = 'Helvetica'
+        return _pdf_font_name
+
+
+def _pdf_table(header, rows, font_name):
+    """一頁的表格；跨頁時重複表頭"""
+    table = Table([header] + rows, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+    ]))
+    return table
+
+
+class _LazyFlowables(list):
+    """
+    按需補充的 flowable 列表
+
+    doc.build 只通過 len()、[0] 與 del [0] 逐個取出 flowable；列表取空時才從生成器取下一頁，
+    因此同一時間只有一頁的表格在內存中，已排版的頁面直接寫入畫布。
+    """
+
+    def __init__(self, pages):
+        super().__init__()
+        self._pages = iter(pages)
+
+    def __len__(self):
+        while not list.__len__(self):
+            page = next(self._pages, None)
+            if page is None:
+                return 0
+            self.extend(page)
+        return list.__len__(self)
+
+
+def write_checkin_pdf(output, user_id, date_from=None, date_to=None, progress=None, all_users=False):
+    """
+    分頁生成打卡記錄 PDF
+
+    記錄從游標分批讀取，每 PDF_ROWS_PER_PAGE 行生成一個獨立的表格並分頁。
+    表格在排版到該頁時才生成（見 _LazyFlowables），內存中只保留一頁的記錄與表格，
+    排版成本與記錄數成線性關係，而不是對一個巨大的表格整體排版。
+
+    Args:
+        output: 文件路徑或可寫的二進制文件對象
+        progress: 可選的回調，每讀完一批以已處理的記錄數調用
+        all_users: 匯出全部用戶（僅供管理員的全體匯出使用）
+
+    Returns:
+        int: 寫入的記錄數；為 0 時不會生成文件
+    """
+    columns = [column for column, _ in PDF_COLUMNS]
+    has_rows, chunks = peek(iter_checkin_chunks(user_id, date_from, date_to, columns=columns, all_users=all_users))
+    if not has_rows:
+        return 0
+
+    font_name = _pdf_font()
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('CheckinTitle', parent=styles['Title'], fontName=font_name)
+    header = [label for _, label in PDF_COLUMNS]
+    per_page = max(1, Config.PDF_ROWS_PER_PAGE)
+    total = 0
+
+    def page_rows():
+        """每次產出一頁的記錄"""
+        nonlocal total
+        rows_of_page = []
+        for rows in chunks:
+            for row in rows:
+                rows_of_page.append(['' if value is None else str(value) for value in row])
+                if len(rows_of_page) == per_page:
+                    yield rows_of_page
+                    rows_of_page = []
+            total += len(rows)
+            if progress:
+                progress(total)
+        if rows_of_page:
+            yield rows_of_page
+
+    def pages():
+        yield [Paragraph(f"打卡記錄 - 生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", title_style)]
+        for index, rows_of_page in enumerate(page_rows()):
+            table = _pdf_table(header, rows_of_page, font_name)
+            yield [PageBreak(), table] if index else [table]
+
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    doc.build(_LazyFlowables(pages()))
+    return total
+
+
 def export_checkin_records_to_pdf(user_id, date_from=None, date_to=None):
+    """
+    匯出打卡記錄為 PDF
+
+    Returns:
+        io.BytesIO: PDF 文件；沒有記錄或 ReportLab 不可用時返回 None
+    """
     # 如果 ReportLab 不可用，返回 None
     if not REPORTLAB_AVAILABLE:
         return None
 
-    # 從數據庫獲取打卡記錄
-    conn = sqlite3.connect(Config.DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    query_params = [user_id]
-    query = '''
-        SELECT cr.id, cr.name, cr.location, cr.note, 
-               cr.date, cr.time, cr.checkin_type
-        FROM checkin_records cr
-        WHERE cr.user_id = ?
-    '''
-    
-    if date_from:
-        query += ' AND cr.date >= ?'
-        query_params.append(date_from)
-    
-    if date_to:
-        query += ' AND cr.date <= ?'
-        query_params.append(date_to)
-    
-    query += ' ORDER BY cr.date DESC, cr.time DESC'
-    
-    c.execute(query, query_params)
-    results = c.fetchall()
-    conn.close()
-    
-    if not results:
-        return None
-    
-    # 準備 PDF 數據
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    
-    # 添加標題
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph(f"打卡記錄 - 生成時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Title']))
-    
-    # 表格列頭
-    column_names = ['序號', '姓名', '位置', '備註', '日期', '時間', '打卡類型']
-    
-    # 表格數據
-    data = [column_names]
-    for row in results:
-        data.append([
-            row['id'],
-            row['name'],
-            row['location'],
-            row['note'],
-            row['date'],
-            row['time'],
-            row['checkin_type']
-        ])
-    
-    # 創建表格
-    table = Table(data)
-    
-    # 設置表格樣式
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ])
-    table.setStyle(table_style)
-    
-    elements.append(table)
-    
-    # 生成 PDF
-    doc.build(elements)
+    if write_checkin_pdf(buffer, user_id, date_from, date_to) == 0:
+        return None
     buffer.seek(0)
     return buffer
 
+
 # 新增 Google Sheets 導出準備功能
 def prepare_google_sheets_export(user_id, date_from=None, date_to=None):
     # 從數據庫獲取打卡記錄
@@ -227,108 +365,3 @@ def prepare_google_sheets_export(user_id, date_from=None, date_to=None):
         ])
     
     return sheets_data
-
-# 新增生成 Google Sheets 的函數（可選，如果您要在後端直接生成）
-def create_google_sheets_export(data, title=None):
-    """
-    使用 Google Sheets API 創建一個新的 Sheet
-    需要設置 Google API 憑證和權限
-    
-    注意：這個功能需要在服務器上配置 Google API 憑證
-    """
-    # 如果 Google API 不可用，返回錯誤信息
-    if not GOOGLE_API_AVAILABLE:
-        return {'success': False, 'message': 'Google API 套件未安裝，無法使用 Google Sheets 匯出功能'}
-
-    try:
-        # 檢查憑證文件是否存在
-        credentials_path = os.environ.get('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
-        if not os.path.exists(credentials_path):
-            return {'success': False, 'message': 'Google API 憑證文件不存在'}
-        
-        # 設置 API 範圍和身份驗證
-        SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_path, scopes=SCOPES)
-        
-        service = build('sheets', 'v4', credentials=credentials)
-        
-        # 創建新的電子表格
-        sheet_title = title or f"打卡記錄 {datetime.now().strftime('%Y-%m-%d')}"
-        spreadsheet = {
-            'properties': {
-                'title': sheet_title
-            }
-        }
-        
-        spreadsheet = service.spreadsheets().create(body=spreadsheet).execute()
-        
-        # 填充數據
-        sheet_id = spreadsheet.get('spreadsheetId')
-        header_range = 'Sheet1!A1:G1'
-        values_range = f"Sheet1!A2:G{len(data['values'])+1}"
-        
-        # 新增列頭
-        header_body = {
-            'values': [data['header']]
-        }
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=header_range,
-            valueInputOption='RAW',
-            body=header_body
-        ).execute()
-        
-        # 新增數據
-        values_body = {
-            'values': data['values']
-        }
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=values_range,
-            valueInputOption='RAW',
-            body=values_body
-        ).execute()
-        
-        # 格式化列頭
-        requests = [{
-            'updateCells': {
-                'rows': {
-                    'values': [{
-                        'userEnteredFormat': {
-                            'backgroundColor': {
-                                'red': 0.5,
-                                'green': 0.5,
-                                'blue': 0.5
-                            },
-                            'textFormat': {
-                                'bold': True
-                            }
-                        }
-                    }]
-                },
-                'fields': 'userEnteredFormat(backgroundColor,textFormat)',
-                'range': {
-                    'sheetId': 0,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1
-                }
-            }
-        }]
-        
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=sheet_id,
-            body={'requests': requests}
-        ).execute()
-        
-        # 返回結果
-        sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
-        return {
-            'success': True, 
-            'spreadsheetId': sheet_id, 
-            'spreadsheetUrl': sheet_url
-        }
-    except Exception as e:
-        return {'success': False, 'message': str(e)}
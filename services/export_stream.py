@@ -0,0 +1,143 @@
+# services/export_stream.py
+"""
+打卡記錄的流式匯出
+
+從 SQLite 游標分批讀取 (fetchmany)，逐批生成 CSV 行或 NDJSON 行，
+可選地再經過增量 gzip 壓縮。整個過程只在內存中保留一批記錄，
+匯出多大都不會一次性載入全部結果。
+"""
+
+import csv
+import io
+import json
+import zlib
+from config import Config
+from models import Database
+
+# 匯出的欄位（按此順序輸出）
+EXPORT_COLUMNS = [
+    'id', 'user_id', 'name', 'date', 'time', 'checkin_type',
+    'location', 'latitude', 'longitude', 'ip', 'device', 'note',
+    'created_at', 'updated_at'
+]
+
+
+def checkin_filters(user_id=None, date_from=None, date_to=None, all_users=False):
+    """
+    生成打卡記錄篩選條件
+
+    Args:
+        user_id: 只篩選該用戶的記錄
+        all_users: 不按用戶篩選（全體匯出），必須明確指定；未指定時缺少 user_id 會拋出 ValueError
+
+    Returns:
+        tuple: (WHERE 子句（無條件時為空字符串）, 參數列表)
+    """
+    conditions = []
+    params = []
+    if not all_users:
+        if not user_id:
+            raise ValueError("缺少 user_id")
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if date_from:
+        conditions.append("date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("date <= ?")
+        params.append(date_to)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+
+def count_checkins(user_id=None, date_from=None, date_to=None, all_users=False):
+    """符合條件的打卡記錄數"""
+    where, params = checkin_filters(user_id, date_from, date_to, all_users)
+    return Database.execute_query(f"SELECT COUNT(*) FROM checkin_records{where}", tuple(params), 'one')[0]
+
+
+def data_version(user_id=None, date_from=None, date_to=None, all_users=False):
+    """
+    符合條件的打卡記錄的數據版本
+
+    由記錄數、最大 id 與最後更新時間組成，範圍內有新增、刪除或修改時隨之改變，
+    用作匯出文件緩存鍵的一部分。
+    """
+    where, params = checkin_filters(user_id, date_from, date_to, all_users)
+    row = Database.execute_query(
+        f"SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(MAX(updated_at), '') FROM checkin_records{where}",
+        tuple(params), 'one'
+    )
+    return f"{row[0]}:{row[1]}:{row[2]}"
+
+
+def iter_checkin_chunks(user_id=None, date_from=None, date_to=None, columns=None, chunk_size=None, order_by=None,
+                        all_users=False):
+    """
+    分批讀取打卡記錄
+
+    Args:
+        user_id: 用戶ID
+        date_from, date_to: 日期範圍（含兩端），可選
+        columns: 要讀取的欄位（可包含 SQL 表達式），默認 EXPORT_COLUMNS
+        chunk_size: 每批行數，默認 Config.EXPORT_CHUNK_SIZE
+        order_by: 排序，默認按日期時間倒序
+        all_users: 讀取所有用戶的記錄（此時忽略 user_id）
+
+    Yields:
+        list: 每批的行（tuple，順序與 columns 一致）
+    """
+    columns = columns or EXPORT_COLUMNS
+    where, params = checkin_filters(user_id, date_from, date_to, all_users)
+    query = f"SELECT {', '.join(columns)} FROM checkin_records{where} ORDER BY {order_by or 'date DESC, time DESC'}"
+    return Database.iter_query(query, tuple(params), chunk_size or Config.EXPORT_CHUNK_SIZE)
+
+
+def _csv_text(rows):
+    output = io.StringIO()
+    csv.writer(output).writerows(rows)
+    return output.getvalue()
+
+
+def csv_stream(chunks, columns=None):
+    """把分批的行轉為 CSV 文本片段：先輸出表頭，之後每批一個片段"""
+    yield _csv_text([columns or EXPORT_COLUMNS])
+    for rows in chunks:
+        yield _csv_text(rows)
+
+
+def ndjson_stream(chunks, columns=None):
+    """把分批的行轉為 NDJSON 片段，每行一個 JSON 對象"""
+    columns = columns or EXPORT_COLUMNS
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+
+def gzip_stream(pieces, level=6):
+    """增量 gzip 壓縮文本片段，每個輸入片段在壓縮後立即產出"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 產生 gzip 格式
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def peek(chunks):
+    """
+    取出第一批以判斷是否有數據
+
+    Returns:
+        tuple: (是否有數據, 包含第一批在內的完整迭代器)
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return False, iter(())
+
+    def rejoined():
+        yield first
+        yield from chunks
+    return True, rejoined()
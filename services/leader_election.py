@@ -0,0 +1,145 @@
+# services/leader_election.py
+"""
+後台任務的領導者選舉
+
+多個工作進程（如 gunicorn 的多個 worker）共用同一個 SQLite 數據庫，
+通過 leader_lease 表中的租約行決定由哪一個進程運行提醒排程器與保活線程：
+- 每個進程定期嘗試取得或續約租約（單條 UPSERT，只有租約過期或本來就是持有者時才會成功）
+- 持有者每隔 LEADER_HEARTBEAT 秒續約一次，租約有效期 LEADER_LEASE_TTL 秒
+- 持有者進程退出時主動釋放；異常死亡時租約過期後由其他進程接手
+"""
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from config import Config
+from models import Database, Schema
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElector:
+    """基於 SQLite 租約行的領導者選舉"""
+
+    def __init__(self, name='background', ttl=None, heartbeat=None):
+        self.name = name
+        self.ttl = Config.LEADER_LEASE_TTL if ttl is None else ttl
+        self.heartbeat = Config.LEADER_HEARTBEAT if heartbeat is None else heartbeat
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.is_leader = False
+        self._elected_callbacks = []
+        self._demoted_callbacks = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_elected(self, callback):
+        """成為領導者時調用"""
+        self._elected_callbacks.append(callback)
+
+    def on_demoted(self, callback):
+        """失去領導者身份時調用"""
+        self._demoted_callbacks.append(callback)
+
+    def try_acquire(self):
+        """
+        嘗試取得或續約租約
+
+        Returns:
+            bool: 本進程是否持有租約
+        """
+        Schema.ensure_ready()
+        now = time.time()
+        Database.execute_query('''
+            INSERT INTO leader_lease (name, holder, expires_at, acquired_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                holder = excluded.holder,
+                expires_at = excluded.expires_at,
+                acquired_at = CASE WHEN leader_lease.holder = excluded.holder
+                                   THEN leader_lease.acquired_at ELSE excluded.acquired_at END
+            WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+        ''', (self.name, self.holder, now + self.ttl, now, now))
+        # 租約被其他進程持有且未過期時 UPSERT 不做任何修改
+        return self._holds_lease()
+
+    def _holds_lease(self):
+        row = Database.execute_query(
+            "SELECT holder, expires_at FROM leader_lease WHERE name = ?", (self.name,), 'one'
+        )
+        return bool(row) and row[0] == self.holder and row[1] > time.time()
+
+    def release(self):
+        """主動釋放租約，讓其他進程立即接手"""
+        try:
+            Database.execute_query(
+                "DELETE FROM leader_lease WHERE name = ? AND holder = ?", (self.name, self.holder)
+            )
+        except Exception as e:
+            logger.error(f"釋放領導者租約失敗: {str(e)}")
+
+    def _set_leader(self, leader):
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        callbacks = self._elected_callbacks if leader else self._demoted_callbacks
+        logger.info(f"[Leader] {self.holder} {'成為' if leader else '不再是'} {self.name} 領導者")
+        print(f"[Leader] {self.holder} {'成為' if leader else '不再是'} {self.name} 領導者")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"[Leader] 回調執行失敗: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                leader = self.try_acquire()
+            except Exception as e:
+                # 無法確認租約時保守地讓出領導權，避免與其他進程同時運行
+                logger.error(f"[Leader] 續約失敗: {str(e)}")
+                leader = False
+            self._set_leader(leader)
+            self._stop.wait(self.heartbeat)
+
+    def start(self):
+        """啟動選舉線程（重複調用無副作用）"""
+        if self._thread is not None:
+            return
+        # 在啟動時生成持有者標識，fork 出的每個進程各不相同
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._thread = threading.Thread(target=self._run, name=f'leader-{self.name}', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止選舉並釋放租約"""
+        self._stop.set()
+        if self.is_leader:
+            self._set_leader(False)
+            self.release()
+
+    def status(self):
+        """當前租約狀態"""
+        row = None
+        try:
+            row = Database.execute_query(
+                "SELECT holder, expires_at, acquired_at FROM leader_lease WHERE name = ?", (self.name,), 'one'
+            )
+        except Exception as e:
+            logger.error(f"讀取領導者租約失敗: {str(e)}")
+        return {
+            "name": self.name,
+            "holder": self.holder,
+            "is_leader": self.is_leader,
+            "current_holder": row[0] if row else None,
+            "expires_in": round(row[1] - time.time(), 1) if row else None,
+        }
+
+
+# 全局實例：管理提醒排程器與保活線程
+background_leader = LeaderElector('background')
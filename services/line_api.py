@@ -0,0 +1,216 @@
+# services/line_api.py
+"""
+LINE Messaging API 客戶端
+
+所有對 api.line.me / api-data.line.me 的請求都通過這裡：
+- 共用一個 requests.Session（連接池 + keep-alive），避免每條消息都重新做 TLS 握手
+- 按端點設置超時
+- 對 429 / 5xx / 連接錯誤做指數退避重試，遵守 Retry-After
+- push/multicast 帶 X-Line-Retry-Key，重試不會重複發送
+- 每次請求結束後調用指標鉤子
+"""
+
+import logging
+import random
+import threading
+import time
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+API_BASE = 'https://api.line.me/v2/bot'
+DATA_API_BASE = 'https://api-data.line.me/v2/bot'
+
+# 端點超時 (連接超時, 讀取超時)，單位秒
+ENDPOINT_TIMEOUTS = {
+    'reply': (3.05, 5),
+    'push': (3.05, 10),
+    'multicast': (3.05, 15),
+    'profile': (3.05, 5),
+    'info': (3.05, 5),
+    'richmenu': (3.05, 10),
+    'richmenu_content': (3.05, 30),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# 可以重試的 HTTP 狀態碼
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# 支持 X-Line-Retry-Key 的端點，重試時 LINE 會去重
+RETRY_KEY_ENDPOINTS = {'push', 'multicast'}
+
+
+class LineApiClient:
+    """共用連接池的 LINE API 客戶端"""
+
+    def __init__(self, max_retries=None, backoff_base=None, backoff_max=None, pool_size=None):
+        self.max_retries = Config.LINE_API_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = Config.LINE_API_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = Config.LINE_API_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.pool_size = Config.LINE_API_POOL_SIZE if pool_size is None else pool_size
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._hooks = []
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """延遲創建的共用 Session"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def add_metrics_hook(self, hook):
+        """
+        註冊指標鉤子
+
+        每次請求（含重試）結束後調用 hook(metric)，metric 包含
+        endpoint, method, status, attempts, elapsed_ms, error
+        """
+        self._hooks.append(hook)
+
+    def _headers(self, extra=None):
+        headers = {'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def _retry_delay(self, attempt, response=None):
+        """計算重試等待時間：優先使用 Retry-After，否則指數退避加隨機抖動"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        delay = self.backoff_base * (2 ** attempt)
+        return min(delay, self.backoff_max) * (0.5 + random.random() / 2)
+
+    def request(self, method, endpoint, url, headers=None, **kwargs):
+        """
+        發送請求
+
+        Args:
+            method: HTTP 方法
+            endpoint: 端點名稱，用於選擇超時與統計，如 'reply'、'push'
+            url: 完整 URL
+            headers: 額外的請求頭
+            **kwargs: 傳給 requests 的其他參數 (json, data, params...)
+
+        Returns:
+            requests.Response: 最後一次嘗試的響應
+
+        Raises:
+            requests.RequestException: 重試用盡後仍然無法連接
+        """
+        kwargs.setdefault('timeout', ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+        request_headers = self._headers(headers)
+        if endpoint in RETRY_KEY_ENDPOINTS:
+            request_headers.setdefault('X-Line-Retry-Key', str(uuid.uuid4()))
+
+        # 非冪等請求（如 reply）只在確定請求未被處理時重試：連接失敗或 429
+        idempotent = method.upper() in ('GET', 'DELETE') or 'X-Line-Retry-Key' in request_headers
+
+        started = time.monotonic()
+        response = None
+        error = None
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+                error = None
+                retryable = response.status_code == 429 or (
+                    idempotent and response.status_code in RETRY_STATUSES
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                error = e
+                sent = isinstance(e, requests.ReadTimeout)
+                retryable = idempotent or not sent
+
+            if not retryable or attempt >= self.max_retries:
+                break
+
+            delay = self._retry_delay(attempt, response)
+            status = response.status_code if response is not None else type(error).__name__
+            logger.warning(f"LINE API {endpoint} 失敗 ({status})，{delay:.2f} 秒後第 {attempt + 1} 次重試")
+            time.sleep(delay)
+            attempt += 1
+
+        self._record({
+            "endpoint": endpoint,
+            "method": method.upper(),
+            "status": response.status_code if response is not None else None,
+            "attempts": attempt + 1,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+            "error": str(error) if error else None,
+        })
+
+        if error is not None:
+            raise error
+        return response
+
+    def _record(self, metric):
+        with self._stats_lock:
+            stats = self._stats.setdefault(metric["endpoint"], {
+                "requests": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0
+            })
+            stats["requests"] += 1
+            stats["retries"] += metric["attempts"] - 1
+            stats["total_ms"] += metric["elapsed_ms"]
+            stats["max_ms"] = max(stats["max_ms"], metric["elapsed_ms"])
+            if metric["error"] or (metric["status"] or 0) >= 400:
+                stats["errors"] += 1
+
+        for hook in list(self._hooks):
+            try:
+                hook(metric)
+            except Exception as e:
+                logger.error(f"LINE API 指標鉤子出錯: {str(e)}")
+
+    def stats(self):
+        """各端點的請求數、錯誤數、重試數與耗時"""
+        with self._stats_lock:
+            return {
+                endpoint: {
+                    **values,
+                    "avg_ms": round(values["total_ms"] / values["requests"], 2) if values["requests"] else 0.0,
+                    "total_ms": round(values["total_ms"], 2),
+                }
+                for endpoint, values in self._stats.items()
+            }
+
+    # --- 常用端點 ---
+
+    def reply(self, reply_token, messages):
+        return self.request('POST', 'reply', f'{API_BASE}/message/reply',
+                            json={'replyToken': reply_token, 'messages': messages})
+
+    def push(self, to, messages):
+        return self.request('POST', 'push', f'{API_BASE}/message/push',
+                            json={'to': to, 'messages': messages})
+
+    def multicast(self, to, messages):
+        return self.request('POST', 'multicast', f'{API_BASE}/message/multicast',
+                            json={'to': list(to), 'messages': messages})
+
+    def get_profile(self, user_id):
+        return self.request('GET', 'profile', f'{API_BASE}/profile/{user_id}')
+
+    def get_bot_info(self):
+        return self.request('GET', 'info', f'{API_BASE}/info')
+
+
+# 全局實例
+line_api = LineApiClient()
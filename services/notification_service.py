@@ -1,19 +1,9 @@
-import requests
 from config import Config
+from services.line_api import line_api
 
 def send_line_message_to_group(message):
     try:
-        response = requests.post(
-            'https://api.line.me/v2/bot/message/push',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-            },
-            json={
-                'to': Config.LINE_GROUP_ID,
-                'messages': [{'type': 'text', 'text': message}]
-            }
-        )
+        response = line_api.push(Config.LINE_GROUP_ID, [{'type': 'text', 'text': message}])
         return response.status_code == 200
     except Exception as e:
         print(f"[通知錯誤] 發送群組訊息失敗: {e}")
@@ -30,17 +20,7 @@ def send_checkin_notification(name, time, location, note=None, latitude=None, lo
 
 def send_reply(reply_token, text):
     try:
-        requests.post(
-            'https://api.line.me/v2/bot/message/reply',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-            },
-            json={
-                'replyToken': reply_token,
-                'messages': [{'type': 'text', 'text': text}]
-            }
-        )
+        line_api.reply(reply_token, [{'type': 'text', 'text': text}])
     except Exception as e:
         print(f"[通知錯誤] 回覆訊息失敗: {e}")
 
@@ -53,17 +33,7 @@ def send_reply_raw(reply_token, messages):
         messages: 消息列表，每個元素都是一個符合 LINE API 消息格式的字典
     """
     try:
-        response = requests.post(
-            'https://api.line.me/v2/bot/message/reply',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-            },
-            json={
-                'replyToken': reply_token,
-                'messages': messages
-            }
-        )
+        response = line_api.reply(reply_token, messages)
         if response.status_code != 200:
             print(f"[通知錯誤] 回覆消息失敗: {response.status_code} {response.text}")
             return False
@@ -76,17 +46,7 @@ def send_reply_raw(reply_token, messages):
 def send_line_notification(user_id, message):
     """發送LINE個人通知"""
     try:
-        response = requests.post(
-            'https://api.line.me/v2/bot/message/push',
-            headers={
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-            },
-            json={
-                'to': user_id,
-                'messages': [{'type': 'text', 'text': message}]
-            }
-        )
+        response = line_api.push(user_id, [{'type': 'text', 'text': message}])
         return response.status_code == 200
     except Exception as e:
         print(f"[通知錯誤] 發送個人通知失敗: {e}")
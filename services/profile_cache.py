@@ -0,0 +1,188 @@
+# services/profile_cache.py
+"""
+LINE 用戶資料緩存
+
+讀取順序：內存 LRU → users 表 → LINE API。
+- 命中且未過期：直接返回
+- 命中但已過期：先返回舊的 display_name，後台線程刷新
+- 內存和數據庫都沒有：同步調用一次 LINE API，結果寫入內存和 users 表
+follow 事件會使該用戶的緩存失效並觸發刷新。
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from config import Config
+from services.event_queue import EventQueue
+from services.line_api import line_api
+
+logger = logging.getLogger(__name__)
+
+
+def _to_epoch(value):
+    """把 users.profile_updated_at (UTC 'YYYY-MM-DD HH:MM:SS') 轉為時間戳"""
+    if not value:
+        return 0.0
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ProfileCache:
+    """display_name 的內存 LRU 緩存，由 users 表持久化"""
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = Config.PROFILE_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = Config.PROFILE_CACHE_TTL if ttl is None else ttl
+        self._entries = OrderedDict()  # user_id -> (display_name, fetched_at)
+        self._lock = threading.Lock()
+        self._refresher = EventQueue(handler=self._refresh_event, workers=1, maxsize=1000, name='profile')
+        self._pending = set()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entry(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+            return entry
+
+    def _put_entry(self, user_id, display_name, fetched_at, hit=False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            self._entries[user_id] = (display_name, fetched_at)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _is_stale(self, fetched_at):
+        return time.time() - fetched_at > self.ttl
+
+    def get_display_name(self, user_id, default=None):
+        """
+        獲取用戶的 LINE 顯示名稱
+
+        Returns:
+            str: 顯示名稱；無法獲取時返回 default
+        """
+        if not user_id:
+            return default
+
+        entry = self._get_entry(user_id)
+        if entry is None:
+            entry = self._load_from_db(user_id)
+
+        if entry is not None:
+            display_name, fetched_at = entry
+            if self._is_stale(fetched_at):
+                self.schedule_refresh(user_id)
+            return display_name
+
+        # 首次見到的用戶，只能同步獲取
+        self._count_miss()
+        display_name = self.refresh(user_id)
+        return display_name if display_name else default
+
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _load_from_db(self, user_id):
+        from models import User, Schema
+        try:
+            Schema.ensure_ready()
+            row = User.get_profile(user_id)
+        except Exception as e:
+            logger.error(f"讀取用戶資料緩存失敗: {str(e)}")
+            return None
+
+        if not row or not row[0]:
+            return None
+        entry = (row[0], _to_epoch(row[1]))
+        self._put_entry(user_id, *entry, hit=True)
+        return entry
+
+    def refresh(self, user_id):
+        """
+        從 LINE 獲取最新資料並寫入緩存與 users 表
+
+        Returns:
+            str: 顯示名稱，獲取失敗時返回 None
+        """
+        try:
+            response = line_api.get_profile(user_id)
+        except Exception as e:
+            logger.error(f"獲取LINE用戶資料時出錯: {str(e)}")
+            return None
+
+        if response.status_code != 200:
+            logger.warning(f"獲取LINE用戶資料失敗: {response.status_code} {response.text}")
+            return None
+
+        display_name = response.json().get('displayName')
+        if not display_name:
+            return None
+
+        self._put_entry(user_id, display_name, time.time())
+        try:
+            from models import User
+            User.save_profile(user_id, display_name)
+        except Exception as e:
+            logger.error(f"保存用戶資料緩存失敗: {str(e)}")
+        return display_name
+
+    def schedule_refresh(self, user_id):
+        """在後台刷新，同一用戶同時只排隊一次"""
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        if not self._refresher.submit({'source': {'userId': user_id}}):
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def _refresh_event(self, event):
+        user_id = event['source']['userId']
+        try:
+            self.refresh(user_id)
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def invalidate(self, user_id, refresh=True):
+        """
+        使用戶的緩存失效（follow 事件時調用）
+
+        Args:
+            refresh: 是否立即在後台重新獲取
+        """
+        with self._lock:
+            self._entries.pop(user_id, None)
+        try:
+            from models import User
+            User.expire_profile(user_id)
+        except Exception as e:
+            logger.error(f"標記用戶資料過期失敗: {str(e)}")
+        if refresh:
+            self.schedule_refresh(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "pending_refresh": len(self._pending),
+            }
+
+
+# 全局實例
+profile_cache = ProfileCache()
@@ -0,0 +1,238 @@
+# services/query_advisor_service.py
+"""
+查詢計劃診斷
+
+對熱點查詢執行 EXPLAIN QUERY PLAN（只生成計劃，不執行查詢），標記大表上的
+全表掃描與臨時排序，並核對模型聲明的索引是否已由遷移創建。
+"""
+
+import os
+import re
+import logging
+from models import Database, Schema
+
+logger = logging.getLogger(__name__)
+
+# 行數達到此值的表才視為「大表」，其上的全表掃描會被標記
+LARGE_TABLE_ROWS = int(os.environ.get('QUERY_ADVISOR_LARGE_TABLE_ROWS', 1000))
+
+# 應用中的熱點查詢（參數一律以 ? 佔位，診斷時綁定 NULL）
+HOT_QUERIES = [
+    ("今日打卡狀態", '''
+        SELECT checkin_type, time FROM checkin_records
+        WHERE user_id = ? AND date = ?
+        ORDER BY time ASC
+    '''),
+    ("是否已打卡", '''
+        SELECT id FROM checkin_records
+        WHERE user_id = ? AND date = ? AND checkin_type = ?
+    '''),
+    ("個人歷史記錄", '''
+        SELECT * FROM checkin_records
+        WHERE user_id = ? AND date >= ?
+        ORDER BY date DESC, time DESC
+    '''),
+    ("全部個人記錄", '''
+        SELECT * FROM checkin_records
+        WHERE user_id = ?
+        ORDER BY date DESC, time DESC
+    '''),
+    # ApiService 與 CheckinRecord.get_user_records 的排序：日期倒序、同日按時間順序。
+    # 方向混合，索引只能覆蓋 date 部分，每位用戶每天只有幾筆記錄，時間部分的臨時排序可以接受
+    ("期間記錄", '''
+        SELECT * FROM checkin_records
+        WHERE user_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date DESC, time ASC
+        LIMIT ?
+    '''),
+    ("月度統計", '''
+        SELECT COUNT(*), SUM(is_late), SUM(is_overtime), SUM(worked_minutes)
+        FROM daily_attendance
+        WHERE user_id = ? AND date >= ? AND date < ?
+    '''),
+    ("當日所有記錄", '''
+        SELECT * FROM checkin_records
+        WHERE date = ?
+        ORDER BY time ASC
+    '''),
+    ("當日打卡數", '''
+        SELECT COUNT(*) FROM checkin_records WHERE date = ?
+    '''),
+    ("匯出記錄", '''
+        SELECT cr.id, cr.user_id, cr.name, cr.location, cr.note,
+               cr.latitude, cr.longitude, cr.date, cr.time, cr.checkin_type
+        FROM checkin_records cr
+        WHERE cr.user_id = ? AND cr.date >= ? AND cr.date <= ?
+        ORDER BY cr.date DESC, cr.time DESC
+    '''),
+    ("提醒資格", '''
+        SELECT rs.user_id, COALESCE(u.name, u.display_name), rs.checkin_time
+        FROM reminder_settings rs
+        JOIN users u ON u.user_id = rs.user_id
+        WHERE rs.checkin_reminder = 1 AND rs.checkin_time <= ? AND (rs.weekend_enabled = 1 OR ? = 0)
+          AND NOT EXISTS (
+              SELECT 1 FROM checkin_records cr
+              WHERE cr.user_id = rs.user_id AND cr.date = ? AND cr.checkin_type = ?
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM reminder_logs rl
+              WHERE rl.user_id = rs.user_id AND rl.reminder_type = ?
+                AND rl.sent_date = ? AND rl.status = 'sent'
+          )
+    '''),
+]
+
+_PLAN_TABLE_RE = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(.*)$')
+_FROM_ALIAS_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_ALIAS_STOPWORDS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'ORDER', 'GROUP', 'LIMIT', 'USING', 'NATURAL'}
+
+
+def _alias_map(sql):
+    """解析 FROM/JOIN 中的表別名，返回 {別名或表名: 表名}"""
+    aliases = {}
+    for table, alias in _FROM_ALIAS_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _ALIAS_STOPWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def _table_rows(conn, table, cache):
+    """
+    獲取表的行數
+
+    優先使用 ANALYZE 產生的 sqlite_stat1 估計值，沒有統計信息時退回 COUNT(*)
+    """
+    if table in cache:
+        return cache[table]
+
+    rows = None
+    try:
+        stats = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table,)).fetchall()
+        estimates = [int(stat[0].split()[0]) for stat in stats if stat[0]]
+        if estimates:
+            rows = max(estimates)
+    except Exception:
+        pass  # 尚未執行過 ANALYZE
+
+    if rows is None:
+        try:
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        except Exception:
+            rows = 0
+
+    cache[table] = rows
+    return rows
+
+
+def explain(sql, conn=None):
+    """
+    獲取查詢計劃
+
+    Returns:
+        list: EXPLAIN QUERY PLAN 每一步的 detail 文本
+    """
+    conn = conn or Database.get_connection()
+    params = (None,) * sql.count('?')
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def analyze_query(sql, conn=None, large_table_rows=None, row_cache=None):
+    """
+    分析單條查詢的計劃
+
+    Returns:
+        dict: 包含 plan（計劃步驟）和 issues（發現的問題）
+    """
+    conn = conn or Database.get_connection()
+    threshold = LARGE_TABLE_ROWS if large_table_rows is None else large_table_rows
+    row_cache = {} if row_cache is None else row_cache
+    aliases = _alias_map(sql)
+
+    plan = explain(sql, conn)
+    issues = []
+    for detail in plan:
+        if detail.startswith('USE TEMP B-TREE'):
+            issues.append({"level": "info", "detail": detail, "message": "需要臨時排序，可考慮讓索引覆蓋排序欄位"})
+            continue
+
+        match = _PLAN_TABLE_RE.match(detail)
+        if not match or match.group(1) != 'SCAN':
+            continue
+
+        table = aliases.get(match.group(2), match.group(2))
+        rows = _table_rows(conn, table, row_cache)
+        if rows < threshold:
+            continue
+
+        if 'INDEX' in match.group(3):
+            issues.append({
+                "level": "warning", "table": table, "rows": rows, "detail": detail,
+                "message": "完整掃描索引，WHERE 條件未能使用索引前綴"
+            })
+        else:
+            issues.append({
+                "level": "error", "table": table, "rows": rows, "detail": detail,
+                "message": "大表全表掃描，缺少可用索引"
+            })
+
+    return {"plan": plan, "issues": issues}
+
+
+def missing_indexes(conn=None):
+    """核對模型聲明的索引，返回數據庫中不存在的索引"""
+    conn = conn or Database.get_connection()
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    missing = []
+    for model in Schema.models():
+        for index_name, spec in getattr(model, 'indexes', {}).items():
+            if index_name not in existing:
+                missing.append({
+                    "table": model.table_name,
+                    "index": index_name,
+                    "columns": spec["columns"],
+                    "unique": spec.get("unique", False)
+                })
+    return missing
+
+
+def run_advisor(large_table_rows=None, extra_sql=None):
+    """
+    對所有熱點查詢（以及可選的自定義查詢）生成診斷報告
+
+    Args:
+        large_table_rows: 大表閾值，默認為 LARGE_TABLE_ROWS
+        extra_sql: 額外要分析的 SELECT 語句
+
+    Returns:
+        dict: 診斷報告
+    """
+    Schema.ensure_ready()
+    conn = Database.get_connection()
+    threshold = LARGE_TABLE_ROWS if large_table_rows is None else large_table_rows
+    row_cache = {}
+
+    queries = list(HOT_QUERIES)
+    if extra_sql:
+        queries.append(("自定義查詢", extra_sql))
+
+    results = []
+    for name, sql in queries:
+        sql = ' '.join(sql.split())
+        try:
+            result = analyze_query(sql, conn, threshold, row_cache)
+        except Exception as e:
+            logger.warning(f"查詢計劃分析失敗 [{name}]: {str(e)}")
+            result = {"plan": [], "issues": [{"level": "error", "message": f"無法分析: {str(e)}"}]}
+        results.append({"name": name, "sql": sql, **result})
+
+    return {
+        "large_table_rows": threshold,
+        "table_rows": row_cache,
+        "missing_indexes": missing_indexes(conn),
+        "queries": results,
+        "issue_count": sum(
+            1 for r in results for issue in r["issues"] if issue["level"] != "info"
+        )
+    }
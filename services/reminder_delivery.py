@@ -0,0 +1,103 @@
+# services/reminder_delivery.py
+"""
+批量提醒發送
+
+把 (user_id, message) 按消息內容分組：
+- 多個用戶收到相同內容時用 multicast，每次最多 500 個 user_id
+- 只有一個收件人的（個性化）消息用 push
+所有請求在有界線程池中併發發送，最後用一次 executemany 寫入全部 reminder_logs。
+"""
+
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from models import ReminderSetting
+from services.line_api import line_api
+
+logger = logging.getLogger(__name__)
+
+# LINE multicast 單次最多的收件人數
+MULTICAST_LIMIT = 500
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def plan_batches(recipients):
+    """
+    把收件人按消息內容分組並切分為請求
+
+    Args:
+        recipients: [(user_id, message), ...]
+
+    Returns:
+        list: [(user_ids, message), ...]，每一項對應一次 multicast 或 push
+    """
+    groups = OrderedDict()
+    seen = set()
+    for user_id, message in recipients:
+        if (user_id, message) in seen:
+            continue
+        seen.add((user_id, message))
+        groups.setdefault(message, []).append(user_id)
+
+    batches = []
+    for message, user_ids in groups.items():
+        for chunk in _chunks(user_ids, MULTICAST_LIMIT):
+            batches.append((chunk, message))
+    return batches
+
+
+def _send_batch(user_ids, message):
+    """發送一批，返回是否成功"""
+    messages = [{'type': 'text', 'text': message}]
+    try:
+        if len(user_ids) == 1:
+            response = line_api.push(user_ids[0], messages)
+        else:
+            response = line_api.multicast(user_ids, messages)
+    except Exception as e:
+        logger.error(f"發送提醒失敗 ({len(user_ids)} 人): {str(e)}")
+        return False
+
+    if response.status_code != 200:
+        logger.error(f"發送提醒失敗 ({len(user_ids)} 人): {response.status_code} {response.text}")
+        return False
+    return True
+
+
+def deliver_reminders(recipients, reminder_type, workers=None):
+    """
+    發送一輪提醒並記錄日誌
+
+    Args:
+        recipients: [(user_id, message), ...]
+        reminder_type: '上班' 或 '下班'，寫入 reminder_logs
+        workers: 併發請求數，默認為 Config.REMINDER_SEND_WORKERS
+
+    Returns:
+        dict: 發送統計 {"requests", "sent", "failed"}
+    """
+    batches = plan_batches(recipients)
+    if not batches:
+        return {"requests": 0, "sent": 0, "failed": 0}
+
+    workers = Config.REMINDER_SEND_WORKERS if workers is None else workers
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as pool:
+        results = list(pool.map(lambda batch: _send_batch(*batch), batches))
+
+    log_entries = []
+    sent = failed = 0
+    for (user_ids, _), success in zip(batches, results):
+        status = 'sent' if success else 'failed'
+        log_entries.extend((user_id, reminder_type, status) for user_id in user_ids)
+        if success:
+            sent += len(user_ids)
+        else:
+            failed += len(user_ids)
+
+    ReminderSetting.log_reminders(log_entries)
+    return {"requests": len(batches), "sent": sent, "failed": failed}
@@ -1,8 +1,8 @@
 # services/rich_menu_service.py
 import os
-import requests
 import time
 from config import Config
+from services.line_api import line_api, API_BASE, DATA_API_BASE
 
 def create_rich_menu():
     rich_menu_data = {
@@ -41,14 +41,7 @@ def create_rich_menu():
     print(f"正在創建Rich Menu...")
     print(f"LIFF_ID: {Config.LIFF_ID}, GROUP_LIFF_ID: {Config.GROUP_LIFF_ID}, APP_URL: {Config.APP_URL}")
 
-    response = requests.post(
-        'https://api.line.me/v2/bot/richmenu',
-        headers={
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-        },
-        json=rich_menu_data
-    )
+    response = line_api.request('POST', 'richmenu', f'{API_BASE}/richmenu', json=rich_menu_data)
 
     if response.status_code == 200:
         rich_menu_id = response.json()["richMenuId"]
@@ -106,12 +99,9 @@ def upload_rich_menu_image(rich_menu_id, image_path=None):
             
         print(f"正在上傳Rich Menu圖片: {image_path}, 大小: {len(image_data)/1024:.2f} KB, 格式: {content_type}")
 
-        response = requests.post(
-            f'https://api-data.line.me/v2/bot/richmenu/{rich_menu_id}/content',
-            headers={
-                'Content-Type': content_type,
-                'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'
-            },
+        response = line_api.request(
+            'POST', 'richmenu_content', f'{DATA_API_BASE}/richmenu/{rich_menu_id}/content',
+            headers={'Content-Type': content_type},
             data=image_data
         )
 
@@ -129,10 +119,7 @@ def set_default_rich_menu(rich_menu_id):
     """設置為預設選單"""
     print(f"正在設置Rich Menu為預設選單: {rich_menu_id}")
     
-    response = requests.post(
-        f'https://api.line.me/v2/bot/user/all/richmenu/{rich_menu_id}',
-        headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-    )
+    response = line_api.request('POST', 'richmenu', f'{API_BASE}/user/all/richmenu/{rich_menu_id}')
     
     if response.status_code == 200:
         print(f"✅ 設置預設Rich Menu成功")
@@ -145,10 +132,7 @@ def delete_all_rich_menus():
     """刪除所有Rich Menu"""
     print("正在獲取所有Rich Menu列表...")
     
-    response = requests.get(
-        'https://api.line.me/v2/bot/richmenu/list',
-        headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-    )
+    response = line_api.request('GET', 'richmenu', f'{API_BASE}/richmenu/list')
     
     if response.status_code != 200:
         print(f"❌ 獲取Rich Menu列表失敗: {response.status_code} {response.text}")
@@ -162,10 +146,7 @@ def delete_all_rich_menus():
         menu_id = menu["richMenuId"]
         print(f"正在刪除Rich Menu: {menu_id}")
         
-        delete_response = requests.delete(
-            f'https://api.line.me/v2/bot/richmenu/{menu_id}',
-            headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-        )
+        delete_response = line_api.request('DELETE', 'richmenu', f'{API_BASE}/richmenu/{menu_id}')
         
         if delete_response.status_code == 200:
             print(f"✅ 刪除Rich Menu成功: {menu_id}")
@@ -180,10 +161,7 @@ def test_rich_menu_process():
     try:
         print("測試Rich Menu API...")
         
-        response = requests.get(
-            'https://api.line.me/v2/bot/richmenu/list',
-            headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-        )
+        response = line_api.request('GET', 'richmenu', f'{API_BASE}/richmenu/list')
         
         if response.status_code == 200:
             menus = response.json().get("richmenus", [])
@@ -1,82 +1,368 @@
 # services/scheduler_service.py
 
+import heapq
+import itertools
 import threading
 import time
-import schedule
-from datetime import datetime
+from datetime import datetime, timedelta, time as dt_time
 import pytz
 from models import ReminderSetting
-from services.notification_service import send_line_notification
+from services.reminder_delivery import deliver_reminders
 from config import Config
 
 class ReminderScheduler:
+    """
+    提醒排程器
+
+    在內存中維護一個按「下次提醒時間」排序的最小堆，每個 (用戶, 提醒類型) 一項。
+    線程睡眠到堆頂的時間點才醒來，每次只處理到期的用戶；
+    用戶修改提醒設置時通過 ReminderSetting 的變更通知只重新計算該用戶；
+    其他進程中的修改由觸發器寫入 reminder_setting_changes，排程線程每
+    REMINDER_CHANGE_POLL_INTERVAL 秒輪詢一次並重新計算變更過的用戶。
+    每日定時的系統任務（如詞彙計劃）以 (None, 任務名) 為鍵放入同一個堆。
+    啟動時補發 REMINDER_CATCHUP_MINUTES 內錯過的時段；已觸發的時段記錄在 _fired 中，
+    之後的定期重建不會再把它們放回堆。
+    """
+
+    # 單次最長睡眠秒數，防止系統時間調整後睡過頭
+    MAX_SLEEP = 300
+
     def __init__(self):
         self.is_running = False
         self.thread = None
         # 直接從 Config 獲取時區
         self.timezone = pytz.timezone(Config.TIMEZONE if hasattr(Config, 'TIMEZONE') else 'Asia/Taipei')
-    
+
+        self._heap = []          # [(due_ts, seq, user_id, reminder_type)]
+        self._current = {}       # (user_id, reminder_type) -> due_ts，堆中與此不符的項已失效
+        self._jobs = {}          # 系統任務名 -> ('HH:MM', 函數)
+        self._periodic = {}      # 維護任務名 -> 函數，隨定期重建每 REMINDER_RESYNC_INTERVAL 秒執行
+        self._fired = {}         # (user_id, reminder_type) -> 最近一次觸發的 due_ts，重建時不再排入這之前的時段
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._last_resync = 0.0
+        self._change_seq = 0     # 已處理到的 reminder_setting_changes 序號
+        self._last_poll = 0.0
+
     def start(self):
         if self.is_running:
             return
-        
+
         self.is_running = True
-        
-        # 安排任務
-        schedule.every(15).minutes.do(self.check_morning_reminders)
-        schedule.every(15).minutes.do(self.check_evening_reminders)
-        
+
+        # 設置變更時只重新計算該用戶
+        ReminderSetting.add_change_listener(self.reschedule)
+        self.rebuild()
+
         # 啟動排程線程
-        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread = threading.Thread(target=self.run, name='reminder-scheduler', daemon=True)
         self.thread.start()
-        
-        print(f"[Scheduler] 提醒排程服務已啟動，使用時區: {self.timezone}")
-    
-    def run(self):
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(60)  # 每分鐘檢查一次排程任務
-    
+
+        reminders = sum(1 for user_id, _ in self._current if user_id is not None)
+        print(f"[Scheduler] 提醒排程服務已啟動，使用時區: {self.timezone}，已排程 {reminders} 項提醒、"
+              f"{len(self._current) - reminders} 項系統任務")
+
+    def stop(self):
+        """停止排程線程（失去領導者身份時調用）"""
+        if not self.is_running:
+            return
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
+        print("[Scheduler] 提醒排程服務已停止")
+
     def get_local_time(self):
         """獲取當前的本地時間（考慮時區）"""
         utc_now = datetime.now(pytz.utc)
         return utc_now.astimezone(self.timezone)
-    
-    def check_morning_reminders(self):
+
+    # --- 排程計算 ---
+
+    @staticmethod
+    def _parse_time(value):
+        """把 'HH:MM' 或 'HH:MM:SS' 轉為 time，格式錯誤返回 None"""
+        try:
+            parts = str(value).split(':')
+            return dt_time(int(parts[0]), int(parts[1]))
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def next_due(self, reminder_time, weekend_enabled, after, grace_minutes=None):
+        """
+        計算下次提醒時間
+
+        Args:
+            reminder_time: 'HH:MM'
+            weekend_enabled: 週末是否提醒
+            after: 帶時區的起算時間
+            grace_minutes: 今天的提醒時間已過去不超過此分鐘數時仍然立即補發
+
+        Returns:
+            datetime: 下次提醒時間，無法計算時返回 None
+        """
+        at = self._parse_time(reminder_time)
+        if at is None:
+            return None
+
+        grace = timedelta(minutes=Config.REMINDER_CATCHUP_MINUTES if grace_minutes is None else grace_minutes)
+        for offset in range(8):
+            day = after.date() + timedelta(days=offset)
+            if day.weekday() >= 5 and not weekend_enabled:
+                continue
+            due = self.timezone.localize(datetime.combine(day, at))
+            if offset == 0 and due < after - grace:
+                continue
+            return due
+        return None
+
+    def _next_unfired(self, key, reminder_time, weekend_enabled, after, grace_minutes=None):
+        """
+        與 next_due 相同，但跳過該鍵已經觸發過的時段（需持有 self._cond）
+
+        補發寬限期只用於進程啟動後補發錯過的提醒；定期重建與設置變更時不會把
+        本進程已觸發（包括發送失敗）的時段重新放回堆，系統任務也不會重複執行。
+        """
+        due = self.next_due(reminder_time, weekend_enabled, after, grace_minutes)
+        fired = self._fired.get(key)
+        if due is not None and fired is not None and due.timestamp() <= fired:
+            after = max(after, datetime.fromtimestamp(fired, self.timezone) + timedelta(minutes=1))
+            due = self.next_due(reminder_time, weekend_enabled, after, grace_minutes=0)
+        return due
+
+    def _schedule_row(self, row, after, grace_minutes=None, only_type=None):
+        """根據一行設置把該用戶的上/下班提醒放入堆（需持有 self._cond）"""
+        user_id, checkin_reminder, checkin_time, checkout_reminder, checkout_time, weekend_enabled = row
+        for reminder_type, enabled, reminder_time in (
+            ('上班', checkin_reminder, checkin_time),
+            ('下班', checkout_reminder, checkout_time),
+        ):
+            if only_type and reminder_type != only_type:
+                continue
+            key = (user_id, reminder_type)
+            due = self._next_unfired(key, reminder_time, weekend_enabled, after, grace_minutes) if enabled else None
+            if due is None:
+                self._current.pop(key, None)
+                continue
+            due_ts = due.timestamp()
+            self._current[key] = due_ts
+            heapq.heappush(self._heap, (due_ts, next(self._seq), user_id, reminder_type))
+
+    def _schedule_job(self, name, after, grace_minutes=None):
+        """把系統任務的下次執行時間放入堆（需持有 self._cond）"""
+        at, _ = self._jobs[name]
+        due = self._next_unfired((None, name), at, True, after, grace_minutes)
+        if due is None:
+            self._current.pop((None, name), None)
+            return
+        due_ts = due.timestamp()
+        self._current[(None, name)] = due_ts
+        heapq.heappush(self._heap, (due_ts, next(self._seq), None, name))
+
+    def add_daily_job(self, name, at, func):
+        """
+        註冊每天 at ('HH:MM') 執行的系統任務
+
+        任務在排程線程中執行，因此只在領導者進程運行；重啟時錯過不超過
+        REMINDER_CATCHUP_MINUTES 的任務會立即補跑，任務應可重複執行。
+        """
+        with self._cond:
+            self._jobs[name] = (at, func)
+            if self.is_running:
+                self._schedule_job(name, self.get_local_time())
+                self._cond.notify_all()
+
+    def add_periodic_task(self, name, func):
+        """
+        註冊維護任務，隨定期重建（每 REMINDER_RESYNC_INTERVAL 秒）在排程線程中執行
+
+        與每日任務一樣只在領導者進程運行，任務應可重複執行。
+        """
+        self._periodic[name] = func
+
+    def run_periodic_tasks(self):
+        for name, func in list(self._periodic.items()):
+            try:
+                result = func()
+                print(f"[Scheduler] 維護任務 {name} 完成: {result}")
+            except Exception as e:
+                print(f"[Scheduler] 維護任務 {name} 出錯: {str(e)}")
+
+    def rebuild(self):
+        """從數據庫完整重建排程（啟動時與定期校正時調用）"""
+        # 先記下變更序號再讀取設置，重建期間的修改會在下次輪詢時再處理一次
+        change_seq = ReminderSetting.latest_change_seq()
+        rows = ReminderSetting.get_schedule_rows()
         now = self.get_local_time()
-        # 只在早上6點到早上10點之間檢查
-        print(f"當前檢查時間: {now}, 時區: {now.tzinfo}")  # 添加這行來調試
-        if 6 <= now.hour <= 10:
-            self.send_reminders('上班')
-    
-    def check_evening_reminders(self):
+        with self._cond:
+            self._heap = []
+            self._current = {}
+            for row in rows:
+                self._schedule_row(row, now)
+            for name in self._jobs:
+                self._schedule_job(name, now)
+            self._last_resync = time.time()
+            self._change_seq = max(self._change_seq, change_seq)
+            self._cond.notify_all()
+
+    def reschedule(self, user_id):
+        """重新計算單個用戶的提醒時間（設置變更時調用）"""
+        rows = ReminderSetting.get_schedule_rows(user_id)
         now = self.get_local_time()
-        # 只在下午5點到晚上8點之間檢查
-        if 17 <= now.hour <= 20:
-            self.send_reminders('下班')
-    
-    def send_reminders(self, reminder_type):
-        print(f"[Scheduler] 檢查{reminder_type}提醒，當前時間: {self.get_local_time().strftime('%Y-%m-%d %H:%M:%S %Z')}")
-        reminder_type_field = f"{reminder_type.lower()}_reminder"
-        users = ReminderSetting.get_users_for_reminder(reminder_type_field)
-        
-        for user in users:
+        with self._cond:
+            if not rows:
+                self._current.pop((user_id, '上班'), None)
+                self._current.pop((user_id, '下班'), None)
+            for row in rows:
+                self._schedule_row(row, now)
+            # 堆頂可能變早，喚醒線程重新計算睡眠時間
+            self._cond.notify_all()
+
+    def poll_changes(self):
+        """重新計算變更日誌中設置有變的用戶（包括其他進程的修改）"""
+        self._last_poll = time.time()
+        seq, user_ids = ReminderSetting.get_changes_since(self._change_seq)
+        if not user_ids:
+            return 0
+        for user_id in user_ids:
+            self.reschedule(user_id)
+        self._change_seq = seq
+        ReminderSetting.prune_changes(seq)
+        return len(user_ids)
+
+    def _pop_due(self, now_ts):
+        """取出所有已到期且仍有效的項（需持有 self._cond）"""
+        due = []
+        while self._heap and self._heap[0][0] <= now_ts:
+            due_ts, _, user_id, reminder_type = heapq.heappop(self._heap)
+            if self._current.get((user_id, reminder_type)) == due_ts:
+                due.append((user_id, reminder_type, due_ts))
+        return due
+
+    def _seconds_until_next(self, now_ts):
+        """距離下一個有效項的秒數（需持有 self._cond）"""
+        while self._heap:
+            due_ts, _, user_id, reminder_type = self._heap[0]
+            if self._current.get((user_id, reminder_type)) == due_ts:
+                return due_ts - now_ts
+            heapq.heappop(self._heap)  # 丟棄失效項
+        return None
+
+    # --- 執行 ---
+
+    def run(self):
+        # stop() 後再次 start() 會創建新線程，舊線程發現自己不是當前線程即退出
+        while self.is_running and self.thread is threading.current_thread():
             try:
-                # 根據提醒類型準備消息
-                if reminder_type == '上班':
-                    message = f"⏰ {user['name']}，早安！您今天還沒有上班打卡，請記得打卡。"
-                else:
-                    message = f"⏰ {user['name']}，下班時間到了！您今天還沒有下班打卡，請記得打卡。"
-                
-                # 發送LINE消息
-                success = send_line_notification(user['user_id'], message)
-                
-                if success:
-                    # 記錄提醒日誌
-                    ReminderSetting.log_reminder(user['user_id'], reminder_type)
-                    print(f"[Scheduler] 已向用戶 {user['user_id']} 發送{reminder_type}提醒")
+                if time.time() - self._last_resync >= Config.REMINDER_RESYNC_INTERVAL:
+                    self.rebuild()
+                    self.run_periodic_tasks()
+                if time.time() - self._last_poll >= Config.REMINDER_CHANGE_POLL_INTERVAL:
+                    self.poll_changes()
+
+                with self._cond:
+                    due = self._pop_due(time.time())
+                    if not due:
+                        wait = self._seconds_until_next(time.time())
+                        max_sleep = min(self.MAX_SLEEP, max(Config.REMINDER_CHANGE_POLL_INTERVAL, 1))
+                        wait = max_sleep if wait is None else min(max(wait, 0), max_sleep)
+                        self._cond.wait(wait)
+                        continue
+
+                self.fire(due)
             except Exception as e:
-                print(f"[Scheduler] 發送提醒給用戶 {user['user_id']} 時出錯: {str(e)}")
+                print(f"[Scheduler] 排程線程出錯: {str(e)}")
+                time.sleep(5)
+
+    def run_job(self, name, due_ts):
+        """執行到期的系統任務，並排到下一天"""
+        at, func = self._jobs[name]
+        try:
+            result = func()
+            print(f"[Scheduler] 系統任務 {name} 完成: {result}")
+        except Exception as e:
+            print(f"[Scheduler] 系統任務 {name} 出錯: {str(e)}")
+
+        now = self.get_local_time()
+        with self._cond:
+            if self._current.get((None, name)) == due_ts:
+                after = datetime.fromtimestamp(due_ts, self.timezone) + timedelta(minutes=1)
+                self._schedule_job(name, max(after, now), grace_minutes=0)
+
+    def fire(self, due):
+        """發送到期的提醒，並把這些用戶排到下一次"""
+        with self._cond:
+            for user_id, reminder_type, due_ts in due:
+                self._fired[(user_id, reminder_type)] = due_ts
+        for _, name, due_ts in [item for item in due if item[0] is None]:
+            self.run_job(name, due_ts)
+        due = [item for item in due if item[0] is not None]
+        if not due:
+            return
+
+        now = self.get_local_time()
+        by_type = {}
+        for user_id, reminder_type, _ in due:
+            by_type.setdefault(reminder_type, []).append(user_id)
+
+        for reminder_type, user_ids in by_type.items():
+            self.send_reminders(reminder_type, user_ids=user_ids, now=now)
+
+        # 從本次提醒時間之後（不補發）計算下一次
+        rows = {}
+        for user_id in {user_id for user_id, _, _ in due}:
+            for row in ReminderSetting.get_schedule_rows(user_id):
+                rows[user_id] = row
+        with self._cond:
+            for user_id, reminder_type, due_ts in due:
+                if self._current.get((user_id, reminder_type)) != due_ts:
+                    continue  # 期間設置已被修改並重新排程
+                self._current.pop((user_id, reminder_type), None)
+                row = rows.get(user_id)
+                if row:
+                    after = datetime.fromtimestamp(due_ts, self.timezone) + timedelta(minutes=1)
+                    self._schedule_row(row, max(after, now), grace_minutes=0, only_type=reminder_type)
+
+    def format_message(self, reminder_type, name=None):
+        """提醒內容；不含姓名時所有人收到相同內容，可以合併為 multicast 發送"""
+        greeting = f"{name}，" if name else ""
+        if reminder_type == '上班':
+            return f"⏰ {greeting}早安！您今天還沒有上班打卡，請記得打卡。"
+        return f"⏰ {greeting}下班時間到了！您今天還沒有下班打卡，請記得打卡。"
+
+    def send_reminders(self, reminder_type, user_ids=None, now=None):
+        """
+        向應該提醒的用戶發送提醒
+
+        user_ids: 只檢查這些用戶；為 None 時檢查所有用戶
+        """
+        now = now or self.get_local_time()
+        print(f"[Scheduler] 檢查{reminder_type}提醒，當前時間: {now.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        users = ReminderSetting.get_users_needing_reminder(reminder_type, now=now, user_ids=user_ids)
+        if not users:
+            return
+
+        personalized = Config.REMINDER_PERSONALIZED
+        recipients = [
+            (user['user_id'], self.format_message(reminder_type, user['name'] if personalized else None))
+            for user in users
+        ]
+
+        try:
+            result = deliver_reminders(recipients, reminder_type)
+            print(f"[Scheduler] {reminder_type}提醒: {result['sent']} 人成功，{result['failed']} 人失敗，"
+                  f"共 {result['requests']} 次請求")
+        except Exception as e:
+            print(f"[Scheduler] 發送{reminder_type}提醒時出錯: {str(e)}")
+
+    def stats(self):
+        """排程狀態：排程項數與下次提醒時間"""
+        with self._cond:
+            wait = self._seconds_until_next(time.time())
+            scheduled = len(self._current)
+        next_at = None
+        if wait is not None:
+            next_at = (self.get_local_time() + timedelta(seconds=wait)).strftime('%Y-%m-%d %H:%M:%S')
+        return {"running": self.is_running, "scheduled": scheduled, "next_due": next_at}
 
 # 全局實例
 reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,391 @@
+# services/sheets_sink.py
+"""
+Google Sheets 匯出
+
+- Sheets API 的 service 對象每個進程只構建一次
+- 表頭、格式與第一批數據在同一次 spreadsheets.batchUpdate 中寫入，
+  之後的數據按行數與估算的請求大小分批 appendCells，避免超過請求體限制
+- sheets_sync 表記錄每個表格已同步到的 checkin_changes 序號（見 services/change_feed），
+  再次同步時按之後的變更更新或刪除表格中對應的行，並追加新記錄
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from config import Config
+from models import Database, Schema
+from services.change_feed import iter_changes, latest_cursor, cursor_expired
+
+# 嘗試導入 Google API 相關包，如果失敗則設置標誌
+try:
+    from googleapiclient.discovery import build
+    from google.oauth2 import service_account
+    GOOGLE_API_AVAILABLE = True
+except ImportError:
+    GOOGLE_API_AVAILABLE = False
+    print("Warning: Google API packages not available. Google Sheets export will be disabled.")
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# 表格的欄位（第一列為打卡記錄 id，同步時按此找到記錄所在的行）與表頭
+SHEET_COLUMNS = [
+    ('id', '序號'),
+    ('name', '姓名'),
+    ('location', '位置'),
+    ('note', '備註'),
+    ('date', '日期'),
+    ('time', '時間'),
+    ('checkin_type', '打卡類型')
+]
+SHEET_TITLE = '打卡記錄'
+
+_HEADER_FORMAT = {
+    'backgroundColor': {'red': 0.5, 'green': 0.5, 'blue': 0.5},
+    'textFormat': {'bold': True}
+}
+
+
+def _cell(value, cell_format=None):
+    """把 Python 值轉為 Sheets 的 CellData"""
+    if value is None:
+        cell = {}
+    elif isinstance(value, bool):
+        cell = {'userEnteredValue': {'boolValue': value}}
+    elif isinstance(value, (int, float)):
+        cell = {'userEnteredValue': {'numberValue': value}}
+    else:
+        cell = {'userEnteredValue': {'stringValue': str(value)}}
+    if cell_format:
+        cell['userEnteredFormat'] = cell_format
+    return cell
+
+
+def _row_data(row):
+    return {'values': [_cell(value) for value in row]}
+
+
+class SheetsSink:
+    """把打卡記錄寫入 Google Sheets"""
+
+    def __init__(self, service=None):
+        """
+        Args:
+            service: 已構建的 Sheets service（測試時可傳入本地假對象），默認按憑證構建並緩存
+        """
+        self._service = service
+        self._lock = threading.Lock()
+
+    def service(self):
+        """獲取 Sheets service，每個進程只構建一次"""
+        if self._service is not None:
+            return self._service
+        with self._lock:
+            if self._service is None:
+                if not GOOGLE_API_AVAILABLE:
+                    raise RuntimeError('Google API 套件未安裝，無法使用 Google Sheets 匯出功能')
+                credentials_path = Config.GOOGLE_CREDENTIALS_FILE
+                if not os.path.exists(credentials_path):
+                    raise RuntimeError('Google API 憑證文件不存在')
+                credentials = service_account.Credentials.from_service_account_file(
+                    credentials_path, scopes=SCOPES)
+                self._service = build('sheets', 'v4', credentials=credentials, cache_discovery=False)
+        return self._service
+
+    # --- 分批 ---
+
+    @staticmethod
+    def batches(rows, max_rows=None, max_bytes=None):
+        """
+        按行數與估算的 JSON 大小切分 RowData
+
+        Yields:
+            list: 每批的 RowData
+        """
+        max_rows = max_rows or Config.SHEETS_BATCH_ROWS
+        max_bytes = max_bytes or Config.SHEETS_MAX_PAYLOAD_BYTES
+        batch = []
+        size = 0
+        for row in rows:
+            row_size = len(json.dumps(row, ensure_ascii=False).encode('utf-8'))
+            if batch and (len(batch) >= max_rows or size + row_size > max_bytes):
+                yield batch
+                batch = []
+                size = 0
+            batch.append(row)
+            size += row_size
+        if batch:
+            yield batch
+
+    def _write(self, spreadsheet_id, sheet_id, row_iter, header_requests=None):
+        """
+        以 batchUpdate 寫入：第一次請求包含表頭與格式，之後每批一個 appendCells
+
+        Returns:
+            tuple: (寫入的行數, 最大的記錄 id, batchUpdate 請求次數)
+        """
+        service = self.service()
+        pending = list(header_requests or [])
+        written = 0
+        max_id = 0
+        calls = 0
+
+        def tracked():
+            nonlocal max_id
+            for row in row_iter:
+                max_id = max(max_id, row[0] or 0)
+                yield _row_data(row)
+
+        for batch in self.batches(tracked()):
+            pending.append({'appendCells': {'sheetId': sheet_id, 'rows': batch, 'fields': 'userEnteredValue'}})
+            service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': pending}).execute()
+            calls += 1
+            written += len(batch)
+            pending = []
+
+        if pending:
+            service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': pending}).execute()
+            calls += 1
+        return written, max_id, calls
+
+    # --- 讀取 ---
+
+    @staticmethod
+    def _rows(user_id, date_from=None, date_to=None, after_id=0):
+        """按時間順序分批讀取要寫入表格的記錄（只讀 id 大於 after_id 的）"""
+        conditions = ["user_id = ?", "id > ?"]
+        params = [user_id, after_id]
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date <= ?")
+            params.append(date_to)
+        columns = ", ".join(column for column, _ in SHEET_COLUMNS)
+        query = (f"SELECT {columns} FROM checkin_records WHERE {' AND '.join(conditions)} "
+                 f"ORDER BY date, time, id")
+        for rows in Database.iter_query(query, tuple(params), Config.EXPORT_CHUNK_SIZE):
+            yield from rows
+
+    @staticmethod
+    def _has_rows(user_id, date_from=None, date_to=None):
+        query = "SELECT 1 FROM checkin_records WHERE user_id = ?"
+        params = [user_id]
+        if date_from:
+            query += " AND date >= ?"
+            params.append(date_from)
+        if date_to:
+            query += " AND date <= ?"
+            params.append(date_to)
+        return Database.execute_query(query + " LIMIT 1", tuple(params), 'one') is not None
+
+    # --- 匯出與同步 ---
+
+    def export(self, user_id, date_from=None, date_to=None, title=None):
+        """
+        創建新的表格並寫入記錄
+
+        Args:
+            date_to: 為 None 時之後新增的記錄都可以通過 sync 追加
+
+        Returns:
+            dict: {'success', 'spreadsheetId', 'spreadsheetUrl', 'rows', 'requests'}；沒有記錄時返回 None
+        """
+        Schema.ensure_ready()
+        if not self._has_rows(user_id, date_from, date_to):
+            return None
+        # 先記下變更序號再讀取記錄，讀取期間的變更會在下次同步時再處理一次
+        last_seq = latest_cursor(user_id)
+
+        service = self.service()
+        spreadsheet = service.spreadsheets().create(body={
+            'properties': {'title': title or f"打卡記錄 {datetime.now().strftime('%Y-%m-%d')}"},
+            'sheets': [{'properties': {
+                'title': SHEET_TITLE,
+                'gridProperties': {'frozenRowCount': 1, 'columnCount': len(SHEET_COLUMNS)}
+            }}]
+        }).execute()
+        spreadsheet_id = spreadsheet['spreadsheetId']
+        sheet_id = spreadsheet['sheets'][0]['properties']['sheetId']
+
+        header = [{
+            'updateCells': {
+                'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+                'rows': [{'values': [_cell(label, _HEADER_FORMAT) for _, label in SHEET_COLUMNS]}],
+                'fields': 'userEnteredValue,userEnteredFormat(backgroundColor,textFormat)'
+            }
+        }]
+        written, max_id, calls = self._write(
+            spreadsheet_id, sheet_id, self._rows(user_id, date_from, date_to), header
+        )
+        self._save_state(spreadsheet_id, sheet_id, user_id, date_from, date_to, max_id, last_seq)
+
+        return {
+            'success': True,
+            'spreadsheetId': spreadsheet_id,
+            'spreadsheetUrl': f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}",
+            'rows': written,
+            'requests': calls + 1
+        }
+
+    @staticmethod
+    def _in_range(record, date_from, date_to):
+        date = record['date']
+        return (not date_from or date >= date_from) and (not date_to or date <= date_to)
+
+    def _pending_changes(self, state):
+        """
+        讀取上次同步之後的變更，按記錄合併為最終狀態
+
+        Returns:
+            tuple: (最新序號, {記錄 id: 表格行（tuple）或 None 表示應從表格刪除})
+        """
+        seq = state['last_seq']
+        latest = {}
+        while True:
+            read = 0
+            for changes in iter_changes(seq, Config.CHANGE_FEED_MAX_LIMIT, state['user_id']):
+                for change in changes:
+                    record = change.get('record')
+                    if record and self._in_range(record, state['date_from'], state['date_to']):
+                        latest[change['id']] = (change['id'],) + tuple(record[column] for column, _ in SHEET_COLUMNS[1:])
+                    else:
+                        # 已刪除，或修改後不再屬於表格的日期範圍
+                        latest[change['id']] = None
+                    seq = change['seq']
+                read += len(changes)
+            if read < Config.CHANGE_FEED_MAX_LIMIT:
+                return seq, latest
+
+    def _sheet_row_indexes(self, spreadsheet_id):
+        """表格中每個記錄 id 所在的行號（0 為表頭）"""
+        result = self.service().spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"'{SHEET_TITLE}'!A2:A"
+        ).execute()
+        indexes = {}
+        for offset, values in enumerate(result.get('values', [])):
+            try:
+                indexes[int(float(values[0]))] = offset + 1
+            except (IndexError, TypeError, ValueError):
+                continue
+        return indexes
+
+    def sync(self, spreadsheet_id):
+        """
+        按上次同步之後的打卡記錄變更更新表格
+
+        修改過的記錄覆蓋表格中對應的行，已刪除（或移出日期範圍）的記錄刪除對應的行，
+        新記錄按時間順序追加到末尾。所有請求在同一組 batchUpdate 中按順序執行：
+        先按原行號覆蓋，再從下往上刪除行（不影響尚未刪除的行號），最後追加。
+
+        Returns:
+            dict: {'success', 'spreadsheetId', 'rows', 'updated', 'deleted', 'requests'}（rows 為追加的行數）；
+                變更日誌已清理到上次同步之後時整表重寫並附帶 'resynced'；未知的表格返回 None
+        """
+        Schema.ensure_ready()
+        state = self.get_state(spreadsheet_id)
+        if not state:
+            return None
+
+        if cursor_expired(state['last_seq']):
+            # 變更日誌已清理到游標之後，無法增量同步：清空表格後按當前記錄重寫
+            return self._rewrite(spreadsheet_id, state)
+
+        seq, latest = self._pending_changes(state)
+        if not latest:
+            return {'success': True, 'spreadsheetId': spreadsheet_id, 'rows': 0, 'updated': 0, 'deleted': 0,
+                    'requests': 0}
+
+        sheet_id = state['sheet_id']
+        indexes = self._sheet_row_indexes(spreadsheet_id)
+        updates = []
+        deletes = []
+        appends = []
+        for record_id, row in latest.items():
+            row_index = indexes.get(record_id)
+            if row is None:
+                if row_index is not None:
+                    deletes.append(row_index)
+            elif row_index is not None:
+                updates.append({'updateCells': {
+                    'start': {'sheetId': sheet_id, 'rowIndex': row_index, 'columnIndex': 0},
+                    'rows': [_row_data(row)],
+                    'fields': 'userEnteredValue'
+                }})
+            else:
+                appends.append(row)
+
+        requests = updates + [
+            {'deleteDimension': {'range': {
+                'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': row_index, 'endIndex': row_index + 1
+            }}}
+            for row_index in sorted(deletes, reverse=True)
+        ]
+        # 日期、時間、id 排序，與首次匯出一致
+        appends.sort(key=lambda row: (row[4] or '', row[5] or '', row[0]))
+
+        service = self.service()
+        calls = 0
+        for batch in self.batches(requests):
+            service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': batch}).execute()
+            calls += 1
+        written, max_id, append_calls = self._write(spreadsheet_id, sheet_id, iter(appends))
+
+        self._save_state(spreadsheet_id, sheet_id, state['user_id'], state['date_from'], state['date_to'],
+                         max(max_id, state['last_id']), seq)
+        return {
+            'success': True,
+            'spreadsheetId': spreadsheet_id,
+            'rows': written,
+            'updated': len(updates),
+            'deleted': len(deletes),
+            'requests': calls + append_calls + 1
+        }
+
+    def _rewrite(self, spreadsheet_id, state):
+        """清空表格中表頭以外的內容，重新寫入範圍內的全部記錄"""
+        last_seq = latest_cursor(state['user_id'])
+        clear = [{'updateCells': {
+            'range': {'sheetId': state['sheet_id'], 'startRowIndex': 1},
+            'fields': 'userEnteredValue'
+        }}]
+        written, max_id, calls = self._write(
+            spreadsheet_id, state['sheet_id'],
+            self._rows(state['user_id'], state['date_from'], state['date_to']), clear
+        )
+        self._save_state(spreadsheet_id, state['sheet_id'], state['user_id'], state['date_from'], state['date_to'],
+                         max_id, last_seq)
+        return {'success': True, 'spreadsheetId': spreadsheet_id, 'rows': written, 'updated': 0, 'deleted': 0,
+                'requests': calls, 'resynced': True}
+
+    @staticmethod
+    def _save_state(spreadsheet_id, sheet_id, user_id, date_from, date_to, last_id, last_seq):
+        Database.execute_query('''
+            INSERT INTO sheets_sync (spreadsheet_id, sheet_id, user_id, date_from, date_to, last_id, last_seq,
+                                     synced_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(spreadsheet_id) DO UPDATE SET
+                last_id = excluded.last_id,
+                last_seq = excluded.last_seq,
+                synced_at = excluded.synced_at
+        ''', (spreadsheet_id, sheet_id, user_id, date_from, date_to, last_id, last_seq,
+              datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    @staticmethod
+    def get_state(spreadsheet_id):
+        """表格的同步狀態，未記錄時返回 None"""
+        row = Database.execute_query(
+            "SELECT spreadsheet_id, sheet_id, user_id, date_from, date_to, last_id, last_seq, synced_at "
+            "FROM sheets_sync WHERE spreadsheet_id = ?", (spreadsheet_id,), 'one'
+        )
+        if not row:
+            return None
+        keys = ['spreadsheet_id', 'sheet_id', 'user_id', 'date_from', 'date_to', 'last_id', 'last_seq', 'synced_at']
+        return dict(zip(keys, row))
+
+
+# 全局實例
+sheets_sink = SheetsSink()
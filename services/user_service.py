@@ -1,6 +1,7 @@
 import logging
-import requests
 from config import Config
+from services.line_api import line_api
+from services.profile_cache import profile_cache
 import sqlite3
 
 logger = logging.getLogger(__name__)
@@ -10,15 +11,27 @@ class UserService:
     
     @staticmethod
     def get_line_profile(user_id):
-        """獲取LINE用戶資料"""
+        """
+        獲取LINE用戶資料（經由緩存）
+        
+        只包含 userId 和 displayName；需要完整資料時使用 fetch_line_profile
+        """
+        if not user_id:
+            return None
+        
+        display_name = profile_cache.get_display_name(user_id)
+        if not display_name:
+            return None
+        return {"userId": user_id, "displayName": display_name}
+    
+    @staticmethod
+    def fetch_line_profile(user_id):
+        """直接從 LINE 獲取完整的用戶資料（不經過緩存）"""
         if not user_id:
             return None
             
         try:
-            profile_response = requests.get(
-                f'https://api.line.me/v2/bot/profile/{user_id}',
-                headers={'Authorization': f'Bearer {Config.MESSAGING_CHANNEL_ACCESS_TOKEN}'}
-            )
+            profile_response = line_api.get_profile(user_id)
             
             if profile_response.status_code == 200:
                 return profile_response.json()
@@ -0,0 +1,201 @@
+# services/vocabulary_import.py
+"""
+詞彙批量匯入
+
+從磁盤或上傳的文件流式讀取詞彙（CSV、JSON 數組、NDJSON），逐行校驗後交給
+Vocabulary.bulk_upsert：在一個事務中分批 executemany，新單詞插入、已存在的單詞更新翻譯與難度。
+整個過程只在內存中保留一批詞彙。
+
+每個詞彙可以是對象 {"english", "chinese", "difficulty"}（也接受 english_word、
+chinese_translation 欄位名），或 [english, chinese, difficulty] 數組；CSV 有表頭時按欄位名讀取，
+沒有表頭時按此順序讀取。difficulty 可省略（默認 2），必須是 1-5 的整數。
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+from config import Config
+from models import Vocabulary, Schema
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'json', 'ndjson')
+
+_EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+_ENGLISH_KEYS = ('english', 'english_word', 'word')
+_CHINESE_KEYS = ('chinese', 'chinese_translation', 'translation')
+
+DEFAULT_DIFFICULTY = 2
+
+
+def detect_format(filename):
+    """按副檔名判斷格式，無法判斷時返回 None"""
+    return _EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+
+
+def _first(item, keys):
+    for key in keys:
+        if item.get(key) not in (None, ''):
+            return item[key]
+    return None
+
+
+def normalize(item):
+    """
+    把一條詞彙轉為 (english, chinese, difficulty)
+
+    Returns:
+        tuple: 格式不正確時返回 None
+    """
+    if isinstance(item, dict):
+        english, chinese, difficulty = _first(item, _ENGLISH_KEYS), _first(item, _CHINESE_KEYS), item.get('difficulty')
+    elif isinstance(item, (list, tuple)) and len(item) in (2, 3):
+        english, chinese = item[0], item[1]
+        difficulty = item[2] if len(item) == 3 else None
+    else:
+        return None
+
+    if not isinstance(english, str) or not isinstance(chinese, str):
+        return None
+    english, chinese = english.strip(), chinese.strip()
+    if not english or not chinese:
+        return None
+
+    if difficulty in (None, ''):
+        difficulty = DEFAULT_DIFFICULTY
+    try:
+        difficulty = int(difficulty)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= difficulty <= 5:
+        return None
+    return english, chinese, difficulty
+
+
+def read_csv(f):
+    """逐行讀取 CSV；第一行包含 english/english_word 欄位時視為表頭"""
+    reader = csv.reader(f)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip().lower() for column in first]
+    if any(key in header for key in _ENGLISH_KEYS):
+        for row in reader:
+            yield dict(zip(header, row))
+    else:
+        yield first
+        yield from reader
+
+
+def read_ndjson(f):
+    """逐行讀取 NDJSON，無法解析的行產出 None（計為跳過）"""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_json(f, buffer_size=64 * 1024):
+    """
+    增量解析頂層 JSON 數組，逐個產出元素
+
+    每次從文件讀取 buffer_size 個字符，用 JSONDecoder.raw_decode 解出完整的元素，
+    不會把整個數組載入內存。
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # 跳過空白與分隔符
+        while position < len(buffer) and buffer[position] in ' \t\r\n,' + ('' if started else '['):
+            if buffer[position] == '[':
+                started = True
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        if position < len(buffer):
+            if not started:
+                raise ValueError("JSON 詞彙文件必須是數組")
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+                item = end = None
+            if end is not None and (end < len(buffer) or eof):
+                yield item
+                position = end
+                continue
+
+        if eof:
+            if started:
+                raise ValueError("JSON 數組不完整")
+            return
+        chunk = f.read(buffer_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+_READERS = {'csv': read_csv, 'json': read_json, 'ndjson': read_ndjson}
+
+
+def import_stream(f, file_format, chunk_size=None):
+    """
+    從文本文件對象匯入詞彙
+
+    Args:
+        f: 文本模式的文件對象
+        file_format: 'csv'、'json' 或 'ndjson'
+        chunk_size: 每次 executemany 的行數，默認 Config.VOCAB_IMPORT_CHUNK_SIZE
+
+    Returns:
+        dict: {"total", "inserted", "updated", "unchanged", "skipped", "duration"}
+    """
+    if file_format not in _READERS:
+        raise ValueError(f"不支持的詞彙文件格式: {file_format}")
+
+    started = time.monotonic()
+    skipped = 0
+
+    def valid_rows():
+        nonlocal skipped
+        for item in _READERS[file_format](f):
+            row = normalize(item)
+            if row is None:
+                skipped += 1
+                continue
+            yield row
+
+    Schema.ensure_ready()
+    result = Vocabulary.bulk_upsert(valid_rows(), chunk_size or Config.VOCAB_IMPORT_CHUNK_SIZE)
+    result["skipped"] = skipped
+    result["duration"] = round(time.monotonic() - started, 3)
+    logger.info(f"詞彙匯入完成: {result}")
+    return result
+
+
+def import_file(path, file_format=None, chunk_size=None):
+    """從文件路徑匯入詞彙，未指定格式時按副檔名判斷"""
+    file_format = file_format or detect_format(path)
+    if not file_format:
+        raise ValueError(f"無法判斷詞彙文件格式: {path}")
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return import_stream(f, file_format, chunk_size)
+
+
+def import_upload(stream, file_format, chunk_size=None):
+    """從上傳的二進制流匯入詞彙（例如 Flask 的 FileStorage.stream）"""
+    with io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') as f:
+        return import_stream(f, file_format, chunk_size)
@@ -7,7 +7,7 @@ import sqlite3
 import os
 from datetime import datetime, timedelta
 # 假設您的模型和配置是這樣導入的，如果不同請自行修改
-from models import Vocabulary, UserVocabulary
+from models import Vocabulary, UserVocabulary, Schema
 # 假設您有一個 Config 模組或物件來儲存 DB_PATH
 # from config import Config
 # 如果沒有 Config，則需要直接定義 db_path 或修改 find_db_path
@@ -64,28 +64,10 @@ def init_vocabulary_database():
             from models.vocabulary import DEFAULT_VOCABULARY
             print(f"ℹ️ 詞彙表為空，添加 {len(DEFAULT_VOCABULARY)} 個默認詞彙...")
             
-            added_count = 0
-            skipped_count = 0
-            for data_tuple in DEFAULT_VOCABULARY:
-                # 解包時處理可能的長度不匹配
-                if len(data_tuple) == 3:
-                    english, chinese, difficulty = data_tuple
-                elif len(data_tuple) == 2:
-                    english, chinese = data_tuple
-                    difficulty = 2  # 默認難度
-                else:
-                    print(f"⚠️ 跳過格式不符的預設詞彙: {data_tuple}")
-                    skipped_count += 1
-                    continue
-                
-                try:
-                    # 使用模型方法添加詞彙
-                    word = Vocabulary.add_word(english, chinese, difficulty)
-                    if word:
-                        added_count += 1
-                except Exception as insert_error:
-                    print(f"⚠️ 添加默認詞彙 '{english}' 時出錯: {insert_error}")
-                    skipped_count += 1
+            # 一個事務內批量寫入（executemany），不再逐個 add_word
+            result = Vocabulary.bulk_upsert(DEFAULT_VOCABULARY)
+            added_count = result["inserted"]
+            skipped_count = result["unchanged"]
             
             # 輸出結果統計
             final_count = Vocabulary.count()
@@ -115,8 +97,8 @@ def get_daily_words(date=None, user_id=None):
     if not user_id:
         print("ℹ️ 未提供用戶ID，返回隨機詞彙")
         try:
-            # 確保數據表存在
-            Vocabulary.create_table_if_not_exists()
+            # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+            Schema.ensure_ready()
             words_from_db = Vocabulary.get_random_words(count=3)
             if words_from_db:
                  return [{
@@ -132,14 +114,14 @@ def get_daily_words(date=None, user_id=None):
 
     # --- 以下是有 user_id 的邏輯 ---
     try:
-        # 確保數據表存在 (雖然 init 做過，這裡再次確保)
-        Vocabulary.create_table_if_not_exists()
-        UserVocabulary.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
 
-        # 查詢用戶今日詞彙 (使用模型方法)
+        # 讀取預先生成的詞彙計劃（services/word_plan_service.py 每晚寫入）：
+        # 活躍用戶在這裡只需一次只讀查詢，不抽詞也不寫入
         words = UserVocabulary.get_user_daily_words(user_id, date)
 
-        # 如果沒有找到詞彙記錄，為用戶分配今日詞彙 (使用模型方法)
+        # 沒有計劃（例如新用戶）時即時分配今日詞彙
         if not words:
             print(f"ℹ️ 用戶 {user_id} 今日尚無詞彙，正在分配...")
             words = UserVocabulary.assign_daily_words(user_id, date)
@@ -243,8 +225,8 @@ def add_vocabulary(english, chinese, difficulty=2):
         新增的詞彙ID，如果失敗則返回 None
     """
     try:
-        # 確保數據表存在
-        Vocabulary.create_table_if_not_exists()
+        # 確保數據表存在（本進程已檢查過則只是一次標誌判斷）
+        Schema.ensure_ready()
 
         # 添加詞彙 (調用模型的方法)
         word = Vocabulary.add_word(english, chinese, difficulty)
@@ -0,0 +1,64 @@
+# services/word_plan_service.py
+"""
+每日詞彙計劃
+
+每晚 WORD_PLAN_TIME 由提醒排程線程（只在領導者進程運行）為所有活躍用戶預先分配次日的詞彙，
+在一個事務中批量寫入。早上打卡時 get_daily_words 只需一次只讀查詢取出計劃，
+回覆路徑上不再抽詞和寫入；沒有計劃的用戶（例如新用戶）仍按原方式即時分配。
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from config import Config
+from models import Database, UserVocabulary, Schema
+from utils.timezone import get_current_time
+
+logger = logging.getLogger(__name__)
+
+
+def plan_date(now=None):
+    """計劃的日期：本地時間的明天"""
+    return ((now or get_current_time()).date() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def active_user_ids(since):
+    """since 當日及之後打過卡或學過詞彙的用戶"""
+    rows = Database.execute_query(
+        """
+        SELECT user_id FROM daily_attendance WHERE date >= ?
+        UNION
+        SELECT user_id FROM user_vocabulary WHERE date >= ?
+        """,
+        (since, since), 'all'
+    ) or []
+    return [row[0] for row in rows]
+
+
+def generate_word_plans(date=None, count=3):
+    """
+    為所有活躍用戶預先分配某日的詞彙（已有計劃的用戶略過，可重複執行）
+
+    Args:
+        date: 'YYYY-MM-DD'，默認明天
+        count: 每人每日詞彙數
+
+    Returns:
+        dict: {"date", "active_users", "planned", "duration"}
+    """
+    started = time.monotonic()
+    Schema.ensure_ready()
+    date = date or plan_date()
+    since = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=Config.WORD_PLAN_ACTIVE_DAYS)).strftime("%Y-%m-%d")
+
+    user_ids = active_user_ids(since)
+    planned = UserVocabulary.assign_many(user_ids, date, count) if user_ids else 0
+
+    result = {
+        "date": date,
+        "active_users": len(user_ids),
+        "planned": planned,
+        "duration": round(time.monotonic() - started, 3),
+    }
+    logger.info(f"詞彙計劃已生成: {result}")
+    return result
@@ -67,8 +67,7 @@ def init_vocabulary():
         if word_count == 0:
             print(f"詞彙表為空，添加 {len(DEFAULT_VOCABULARY)} 個默認詞彙...")
             
-            for english, chinese, difficulty in DEFAULT_VOCABULARY:
-                Vocabulary.add_word(english, chinese, difficulty)
+            Vocabulary.bulk_upsert(DEFAULT_VOCABULARY)
                 
             print("✅ 默認詞彙已添加")
         else:
@@ -2,17 +2,21 @@ import threading
 import time
 import requests
 
-def keep_alive(app_url: str, interval: int):
-    """定期發送請求到指定網址來保持服務活躍"""
-    while True:
+def keep_alive(app_url: str, interval: int, stop_event: threading.Event = None):
+    """定期發送請求到指定網址來保持服務活躍，stop_event 被設置後退出"""
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
         try:
-            response = requests.get(f"{app_url}/ping")
+            response = requests.get(f"{app_url}/ping", timeout=10)
             print(f"[KeepAlive] Ping sent. Status: {response.status_code}")
         except Exception as e:
             print(f"[KeepAlive] Ping failed: {e}")
-        time.sleep(interval)
+        stop_event.wait(interval)
 
 def start_keep_alive_thread(app_url: str, interval: int):
-    thread = threading.Thread(target=keep_alive, args=(app_url, interval), daemon=True)
+    """啟動保活線程，返回用於停止它的 Event"""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=keep_alive, args=(app_url, interval, stop_event), daemon=True)
     thread.start()
     print("[KeepAlive] Background thread started.")
+    return stop_event